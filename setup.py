@@ -86,6 +86,7 @@ setup(
             'terane/outputs/store/backend-msgpack-dump.c',
             'terane/outputs/store/backend-msgpack-load.c',
             'terane/outputs/store/backend-segment.c',
+            'terane/outputs/store/backend-segment-block.c',
             'terane/outputs/store/backend-segment-event.c',
             'terane/outputs/store/backend-segment-field.c',
             'terane/outputs/store/backend-segment-meta.c',
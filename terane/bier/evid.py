@@ -16,6 +16,7 @@
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
 import time, datetime, dateutil.tz, calendar
+from operator import itemgetter
 
 TS_MIN = 0
 TS_MAX = 2**32 - 1
@@ -23,19 +24,45 @@ TS_MAX = 2**32 - 1
 OFFSET_MIN = 1
 OFFSET_MAX = 2**64 - 1
 
-class EVID(object):
+class EVID(tuple):
     """
     An EVID (event identifier) uniquely identifies an event, and also
     provides a stable temporal ordering.
+
+    EVID is an immutable (ts, offset) tuple, so construction, hashing and
+    comparison are all performed by the builtin tuple type.
     """
 
-    def __init__(self, ts, offset):
+    __slots__ = ()
+
+    def __new__(cls, ts, offset):
         if ts > TS_MAX:
             raise OverflowError("ts is out of range")
         if offset > OFFSET_MAX:
             raise OverflowError("offset is out of range")
-        self.ts = int(ts)
-        self.offset = int(offset)
+        return tuple.__new__(cls, (int(ts), int(offset)))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    ts = property(itemgetter(0))
+
+    offset = property(itemgetter(1))
+
+    @classmethod
+    def fromKey(cls, key):
+        """
+        Create a new EVID object from a key read from the store.  The last
+        two items of every key are the ts and offset.  The key isn't
+        validated, so this must only be used for keys which were written
+        from an EVID.
+
+        :param key: The key.
+        :type key: list or tuple
+        :returns: The new EVID object.
+        :rtype: :class:`terane.bier.evid.EVID`
+        """
+        return tuple.__new__(cls, key[-2:])
 
     @classmethod
     def fromDatetime(cls, ts=datetime.datetime.now(), offset=0):
@@ -59,6 +86,23 @@ class EVID(object):
             ts = ts.astimezone(dateutil.tz.tzutc())
         return EVID(int(calendar.timegm(ts.timetuple())), offset)
 
+    @classmethod
+    def fromString(cls, string):
+        """
+        Create a new EVID object from its string representation, which is the
+        ts and offset separated by a colon.
+
+        :param string: The string.
+        :type string: str
+        :returns: The new EVID object.
+        :rtype: :class:`terane.bier.evid.EVID`
+        :raises ValueError: The string is not a valid EVID.
+        """
+        ts,sep,offset = str(string).partition(':')
+        if sep == '':
+            raise ValueError("invalid EVID '%s'" % string)
+        return EVID(int(ts), int(offset))
+
     @classmethod
     def fromEvent(cls, event):
         """
@@ -73,26 +117,15 @@ class EVID(object):
         return EVID(int(calendar.timegm(event.ts.timetuple())), event.offset)
 
     def __str__(self):
-        return "%i:%i" % (self.ts, self.offset)
+        return "%i:%i" % self
 
-    def __eq__(self, other):
-        if not isinstance(other, EVID):
-            return False
-        if self.__cmp__(other) == 0:
-            return True
-        return False
-
-    def __ne__(self, other):
-        if not isinstance(other, EVID):
-            return True
-        if self.__cmp__(other) == 0:
-            return False
-        return True
-
-    def __cmp__(self, other):
-        return cmp((self.ts,self.offset), (other.ts,other.offset))
+    def __repr__(self):
+        return "EVID(%i, %i)" % self
 
     def __add__(self, other):
+        # an integer is treated as an offset
+        if not isinstance(other, EVID):
+            other = EVID(0, other)
         ts = self.ts + other.ts
         offset = self.offset + other.offset
         if offset > OFFSET_MAX:
@@ -103,6 +136,9 @@ class EVID(object):
         return EVID(ts, offset)
 
     def __sub__(self, other):
+        # an integer is treated as an offset
+        if not isinstance(other, EVID):
+            other = EVID(0, other)
         ts = self.ts - other.ts
         offset = self.offset - other.offset
         if offset < 0:
@@ -0,0 +1,228 @@
+# Copyright 2010,2011,2012 Michael Frank <msfrank@syntaxjockey.com>
+#
+# This file is part of Terane.
+#
+# Terane is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Terane is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Terane.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+from collections import deque
+from zope.interface import implements
+from terane.bier.interfaces import IPostingList
+
+class PostingHeap(object):
+    """
+    PostingHeap merges the postings from a sequence of posting lists in
+    chronological (or reverse chronological) order.  The head posting of
+    each posting list is kept in a priority queue keyed by evid, so each
+    posting costs O(log n) in the number of posting lists.  Duplicate evids
+    are only returned once.
+
+    Postings are read from each posting list in blocks of up to blockSize
+    postings using nextPostings(), and buffered until they are merged.
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, postingLists, reverse=False, blockSize=64):
+        """
+        :param postingLists: The posting lists to merge.
+        :type postingLists: list of objects implementing :class:`terane.bier.interfaces.IPostingList`
+        :param reverse: If True, then merge in reverse chronological order.
+        :type reverse: bool
+        :param blockSize: The number of postings to read from a posting list at once.
+        :type blockSize: int
+        """
+        self._postingLists = postingLists
+        self._reverse = reverse
+        self._blockSize = blockSize
+        # buffers contains the postings read from each posting list which
+        # haven't been merged yet
+        self._buffers = [deque() for i in range(len(postingLists))]
+        # heap contains a (key, index, posting) tuple for each posting list
+        # which has a head posting
+        self._heap = []
+        # pending contains the index of each posting list which must be
+        # advanced before the next posting can be returned
+        self._pending = range(len(postingLists))
+        self._lastKey = None
+
+    def _key(self, evid):
+        if self._reverse:
+            return (-evid.ts, -evid.offset)
+        return evid
+
+    def _advance(self, i):
+        buf = self._buffers[i]
+        if len(buf) == 0:
+            buf.extend(self._postingLists[i].nextPostings(self._blockSize))
+            if len(buf) == 0:
+                return
+        posting = buf.popleft()
+        heapq.heappush(self._heap, (self._key(posting[0]), i, posting))
+
+    def _unmerge(self):
+        """
+        Return each head posting in the heap to the front of its buffer.
+        """
+        for key,i,posting in self._heap:
+            self._buffers[i].appendleft(posting)
+        self._heap = []
+        self._pending = range(len(self._postingLists))
+
+    def nextPosting(self):
+        """
+        Returns the next posting, or None if iteration is finished.
+
+        :returns: The next posting, which is a tuple containing the evid, the
+          term value, and the store, or (None,None,None)
+        :rtype: tuple
+        """
+        # posting lists are advanced lazily, so we don't merge the posting
+        # following the last one returned until it is needed
+        for i in self._pending:
+            self._advance(i)
+        self._pending = []
+        heap = self._heap
+        while len(heap) > 0:
+            key,i,posting = heapq.heappop(heap)
+            # if the evid equals the last evid returned, then ignore it
+            if key == self._lastKey:
+                self._advance(i)
+                continue
+            self._lastKey = key
+            self._pending.append(i)
+            return posting
+        return None, None, None
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next postings.  An empty list
+        means iteration is finished.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of tuples containing the evid, the term value, and
+          the store.
+        :rtype: list
+        """
+        postings = []
+        while len(postings) < count:
+            posting = self.nextPosting()
+            if posting[0] == None:
+                break
+            postings.append(posting)
+        return postings
+
+    def skipPosting(self, targetId):
+        """
+        Skips to the targetId, returning the posting or None if the posting
+        doesn't exist.
+
+        :param targetId: The target evid to skip to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The target posting, which is a tuple containing the evid,
+          the term value, and the store, or (None,None,None)
+        :rtype: tuple
+        """
+        targetKey = self._key(targetId)
+        self._unmerge()
+        for i in range(len(self._postingLists)):
+            buf = self._buffers[i]
+            # drop buffered postings preceding the target
+            while len(buf) > 0 and self._key(buf[0][0]) < targetKey:
+                buf.popleft()
+            # if the buffer is empty, then check if the targetId exists in
+            # the posting list.  the target is kept at the front of the
+            # buffer, so it is returned again by nextPosting().
+            if len(buf) == 0:
+                posting = self._postingLists[i].skipPosting(targetId)
+                if posting[0] != None:
+                    buf.append(posting)
+                    return posting
+            # if the buffered posting is the target, we are done
+            elif self._key(buf[0][0]) == targetKey:
+                return buf[0]
+        return None, None, None
+
+    def seekPosting(self, targetId):
+        """
+        Returns the first posting at or after the targetId, or
+        (None,None,None) if there are no more postings.
+
+        :param targetId: The target evid to seek to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: A tuple containing the evid, the term value, and the
+          store, or (None,None,None)
+        :rtype: tuple
+        """
+        targetKey = self._key(targetId)
+        self._unmerge()
+        for i in range(len(self._postingLists)):
+            buf = self._buffers[i]
+            # drop buffered postings preceding the target
+            while len(buf) > 0 and self._key(buf[0][0]) < targetKey:
+                buf.popleft()
+            # if the buffer is empty, then seek in the posting list
+            if len(buf) == 0:
+                posting = self._postingLists[i].seekPosting(targetId)
+                if posting[0] != None:
+                    buf.append(posting)
+        return self.nextPosting()
+
+    def skipPostings(self, targetIds):
+        """
+        Skips to each of the targetIds in turn, returning the postings which
+        exist.  Targets are looked up in the buffered postings of each
+        posting list first, and the rest are skipped to in a single call
+        to the skipPostings() method of the posting list.
+
+        :param targetIds: The target evids to skip to, in iteration order.
+        :type targetIds: list
+        :returns: A list of tuples containing the evid, the term value, and
+          the store.
+        :rtype: list
+        """
+        if len(targetIds) == 0:
+            return []
+        targetKeys = [self._key(targetId) for targetId in targetIds]
+        lastKey = targetKeys[-1]
+        self._unmerge()
+        found = {}
+        for i in range(len(self._postingLists)):
+            buf = self._buffers[i]
+            j = 0
+            while j < len(targetKeys):
+                # drop buffered postings preceding the target
+                while len(buf) > 0 and self._key(buf[0][0]) < targetKeys[j]:
+                    buf.popleft()
+                if len(buf) == 0:
+                    break
+                if self._key(buf[0][0]) == targetKeys[j]:
+                    found.setdefault(targetKeys[j], buf[0])
+                j += 1
+            # drop buffered postings up to and including the last target
+            while len(buf) > 0 and self._key(buf[0][0]) <= lastKey:
+                buf.popleft()
+            # skip to the targets beyond the buffered postings
+            if j < len(targetKeys):
+                for posting in self._postingLists[i].skipPostings(targetIds[j:]):
+                    found.setdefault(self._key(posting[0]), posting)
+        return [found[key] for key in targetKeys if key in found]
+
+    def close(self):
+        for postingList in self._postingLists: postingList.close()
+        self._postingLists = None
+        self._buffers = None
+        self._heap = None
+        self._pending = None
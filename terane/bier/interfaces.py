@@ -92,6 +92,13 @@ class ISchema(Interface):
         :returns: The list of qualified fields.
         :rtype: list
         """
+    def getVersion():
+        """
+        Returns the version of the schema, which changes whenever a field is added.
+
+        :returns: The schema version.
+        :rtype: int
+        """
 
 class IPostingList(Interface):
     def nextPosting():
@@ -110,6 +117,38 @@ class IPostingList(Interface):
         :returns: A tuple containing the evid, the term value, and the store, or (None,None,None)
         :rtype: tuple
         """
+    def seekPosting(targetId):
+        """
+        Returns the first posting at or after the targetId in iteration order, or
+        (None,None,None) if there are no more postings.  The posting is consumed,
+        as if it was returned by nextPosting().
+
+        :param targetId: The target evid to seek to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: A tuple containing the evid, the term value, and the store, or (None,None,None)
+        :rtype: tuple
+        """
+    def nextPostings(count):
+        """
+        Returns a list of up to count of the next postings.  Fewer than count
+        postings may be returned; an empty list means iteration is finished.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of tuples containing the evid, the term value, and the store.
+        :rtype: list
+        """
+    def skipPostings(targetIds):
+        """
+        Skips to each of the targetIds in turn, returning the postings which exist.
+        A posting list which is skipped through should not also be iterated using
+        nextPosting() or nextPostings().
+
+        :param targetIds: The target evids to skip to, in iteration order.
+        :type targetIds: list of :class:`terane.bier.evid.EVID`
+        :returns: A list of tuples containing the evid, the term value, and the store.
+        :rtype: list
+        """
     def close():
         """
         Frees any resources associated with the searcher.
@@ -151,6 +190,16 @@ class IMatcher(Interface):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
+    def matchesTerms(terms):
+        """
+        Returns True if an event containing the specified terms matches, without
+        consulting the index.  This is used to match events as they are written.
+
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
+        """
 
 class ISearcher(Interface):
     def postingsLength(field, term, startId, endId):
@@ -188,18 +237,52 @@ class ISearcher(Interface):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
+    def countPostings(field, term, startId, endId):
+        """
+        Returns the exact number of postings for the term in the specified field
+        within the specified period.  As a special case, if fieldname and term are
+        None, then return the number of documents within the specified period.
+
+        :param field: The field to search within.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :param term: The term to search for.
+        :type term: object
+        :param startId:
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId:
+        :type endId: :class:`terane.bier.evid.EVID`
+        :returns: The number of postings.
+        :rtype: int
+        """
+    def iterTerms(field, startId, endId):
+        """
+        Returns an iterator yielding each term in the specified field which may
+        have postings within the specified period.
+
+        :param field: The field to list terms for.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :param startId:
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId:
+        :type endId: :class:`terane.bier.evid.EVID`
+        :returns: An iterator yielding terms.
+        :rtype: iterator
+        """
     def close():
         """
         Frees any resources associated with the searcher.
         """
 
 class IEventStore(Interface):
-    def getEvent(evid):
+    def getEvent(evid, fields=None):
         """
-        Returns the event specified by evid.
+        Returns the event specified by evid.  If fields is not None, then only
+        the default field and the specified fields are returned.
 
         :param evid: The event identifier.
         :type evid: :class:`terane.bier.evid.EVID`
+        :param fields: The names of the fields to return, or None to return all fields.
+        :type fields: frozenset or None
         :returns: A dict mapping qualified fields to values.
         :rtype: dict
         """
@@ -257,6 +340,12 @@ class IIndex(Interface):
         """
         Returns a dict with Index statistics.
         """
+    def getGeneration():
+        """
+        Returns a value which changes whenever the searchable contents of the
+        index change.  Results computed from an index remain valid as long as
+        its generation is unchanged.
+        """
 
 class IEventFactory(Interface):
     def makeEvent():
@@ -20,6 +20,7 @@ from zope.interface import implements
 from terane.bier.interfaces import IMatcher, IPostingList
 from terane.bier.event import Contract
 from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
 from terane.loggers import getLogger
 
 logger = getLogger('terane.bier.matching')
@@ -66,13 +67,16 @@ class QueryTerm(object):
     def iterMatches(searcher, startId, endId):
         raise NotImplementedError()
 
+    def matchesTerms(self, terms):
+        raise NotImplementedError()
+
 class Term(object):
     """
     The basic query.  In order for an event to match, the term must be present in the
     specified field.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, field, value):
         """
@@ -123,9 +127,83 @@ class Term(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.IPostingList`
         """
-        self._postings = searcher.iterPostings(self.field, self.value, startId, endId)
+        postings = searcher.iterPostings(self.field, self.value, startId, endId)
+        return MatcherPostings(self, postings)
+
+    def matchesTerms(self, terms):
+        """
+        Returns True if the term is present in the specified field.
+
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
+        """
+        return (self.field.fieldname, self.field.fieldtype, self.value) in terms
+
+class Every(Term):
+    def __init__(self):
+        pass
+    def __str__(self):
+        return "<Every>"
+
+    def optimizeMatcher(self, index):
+        """
+        The Every matcher cannot be optimized, so it just returns itself.
+        """
         return self
 
+    def matchesLength(self, searcher, startId, endId):
+        """
+        Returns an estimate of the approximate number of matching postings which will
+        be returned using the specified searcher within the specified period.
+
+        :param searcher: A handle to the index we are searching.
+        :type searcher: An object implementing :class:`terane.bier.ISearcher`
+        :returns: The postings length estimate.
+        :rtype: int
+        """
+        length = searcher.postingsLength(None, None, startId, endId)
+        logger.trace("%s: postingsLength() => %i" % (self, length))
+        return length
+
+
+    def iterMatches(self, searcher, startId, endId):
+        """
+        :param searcher: A handle to the index we are searching.
+        :type searcher: An object implementing :class:`terane.bier.ISearcher`
+        :returns: An object for iterating through events matching the query.
+        :rtype: An object implementing :class:`terane.bier.IPostingList`
+        """
+        postings = searcher.iterPostings(None, None, startId, endId)
+        return MatcherPostings(self, postings)
+
+    def matchesTerms(self, terms):
+        """
+        Every event matches.
+        """
+        return True
+
+class MatcherPostings(object):
+    """
+    The posting list returned by iterMatches() for the Term, Every, OR and NOT
+    matchers, which passes each call through to the underlying posting list.
+    Matchers are never modified once they are optimized, so all of the state of
+    a single execution of a matcher is held in its posting list.
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, matcher, postings):
+        """
+        :param matcher: The matcher which is being executed.
+        :type matcher: An object implementing :class:`terane.bier.IMatcher`
+        :param postings: The underlying posting list.
+        :type postings: An object implementing :class:`terane.bier.IPostingList`
+        """
+        self._matcher = matcher
+        self._postings = postings
+
     def nextPosting(self):
         """
         Returns the next matching posting, or (None,None,None) if there are no
@@ -135,7 +213,7 @@ class Term(object):
         :rtype: tuple
         """
         posting = self._postings.nextPosting()
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
+        logger.trace("%s: nextPosting() => %s" % (self._matcher, posting[0]))
         return posting
 
     def skipPosting(self, targetId):
@@ -149,49 +227,213 @@ class Term(object):
         :rtype: tuple
         """
         posting = self._postings.skipPosting(targetId)
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
+        logger.trace("%s: skipPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
         return posting
 
+    def seekPosting(self, targetId):
+        """
+        Returns the first matching posting at or after targetId, or (None,None,None)
+        if there are no more matching postings.
+
+        :param targetId: The target event identifier.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The posting of the next matching event, or (None,None,None).
+        :rtype: tuple
+        """
+        posting = self._postings.seekPosting(targetId)
+        logger.trace("%s: seekPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
+        return posting
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next matching postings.  An empty
+        list means there are no more matching postings.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = self._postings.nextPostings(count)
+        logger.trace("%s: nextPostings(%i) => %i postings" % (self._matcher, count, len(postings)))
+        return postings
+
+    def skipPostings(self, targetIds):
+        """
+        Returns the postings matching each of the targetIds which the matcher contains.
+
+        :param targetIds: The target event identifiers, in iteration order.
+        :type targetIds: list
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = self._postings.skipPostings(targetIds)
+        logger.trace("%s: skipPostings(%i targets) => %i postings" % (self._matcher, len(targetIds), len(postings)))
+        return postings
+
     def close(self):
         self._postings.close()
         self._postings = None
 
-class Every(Term):
-    def __init__(self):
-        pass
-    def __str__(self):
-        return "<Every>"
+def _nextEach(postingList, count):
+    """
+    Returns a list of up to count postings, by calling nextPosting() repeatedly.
+    """
+    postings = []
+    while len(postings) < count:
+        posting = postingList.nextPosting()
+        if posting[0] == None:
+            break
+        postings.append(posting)
+    return postings
+
+def _seekEach(postingList, intersection, targetIds):
+    """
+    Returns the postings matching each of the targetIds, by calling seekPosting()
+    for each target which isn't passed over by the previous seek.
+    """
+    postings = []
+    posting = (None,None,None)
+    for targetId in targetIds:
+        if posting[0] == None or intersection.precedes(posting[0], targetId):
+            posting = postingList.seekPosting(targetId)
+            if posting[0] == None:
+                break
+        if posting[0] == targetId:
+            postings.append(posting)
+    return postings
 
-    def optimizeMatcher(self, index):
+class Intersection(object):
+    """
+    Intersection finds the evids which are present in every one of a list of
+    posting lists, using a leapfrog join.  The candidate evid is the furthest
+    evid seen so far, and each posting list in turn seeks to the candidate.  If
+    a posting list seeks past the candidate, then it rejects the candidate and
+    its posting becomes the new candidate, so sparse posting lists let the join
+    leap over long runs of postings in the dense ones.
+
+    The posting lists are first visited in the order they are supplied, which
+    should be by estimated length.  Every REORDER_INTERVAL matches, the order is
+    re-evaluated from the observed rate at which each posting list rejects
+    candidates, so the posting list most likely to reject a candidate drives
+    the join, and the posting lists least likely to reject a candidate are
+    visited last.
+    """
+
+    REORDER_INTERVAL = 16
+
+    def __init__(self, iters, reverse):
         """
-        The Every matcher cannot be optimized, so it just returns itself.
+        :param iters: The posting lists to intersect.
+        :type iters: list of objects implementing :class:`terane.bier.interfaces.IPostingList`
+        :param reverse: If True, then iterate in reverse chronological order.
+        :type reverse: bool
         """
-        return self
+        self._iters = iters
+        self._reverse = reverse
+        # heads contains the last posting returned by each posting list
+        self._heads = [None for i in range(len(iters))]
+        self._order = range(len(iters))
+        self._seeks = [0.0 for i in range(len(iters))]
+        self._rejects = [0.0 for i in range(len(iters))]
+        self._lastKey = None
+        self._matches = 0
+        self._finished = False
 
-    def matchesLength(self, searcher, startId, endId):
-        """
-        Returns an estimate of the approximate number of matching postings which will
-        be returned using the specified searcher within the specified period.
+    def _key(self, evid):
+        if self._reverse:
+            return (-evid.ts, -evid.offset)
+        return evid
 
-        :param searcher: A handle to the index we are searching.
-        :type searcher: An object implementing :class:`terane.bier.ISearcher`
-        :returns: The postings length estimate.
-        :rtype: int
+    def precedes(self, evid, targetId):
         """
-        length = searcher.postingsLength(None, None, startId, endId)
-        logger.trace("%s: postingsLength() => %i" % (self, length))
-        return length
+        Returns True if evid comes before targetId in iteration order.
+        """
+        return self._key(evid) < self._key(targetId)
 
+    def _reorder(self):
+        """
+        Sort the posting lists by their observed rejection rates, then decay the
+        observations so the order adapts as the density of postings changes.
+        """
+        rates = [(self._rejects[i] + 1.0) / (self._seeks[i] + 2.0) for i in range(len(self._iters))]
+        self._order.sort(key=lambda i: rates[i], reverse=True)
+        self._seeks = [n / 2.0 for n in self._seeks]
+        self._rejects = [n / 2.0 for n in self._rejects]
 
-    def iterMatches(self, searcher, startId, endId):
+    def next(self, targetId=None):
         """
-        :param searcher: A handle to the index we are searching.
-        :type searcher: An object implementing :class:`terane.bier.ISearcher`
-        :returns: An object for iterating through events matching the query.
-        :rtype: An object implementing :class:`terane.bier.IPostingList`
+        Returns a list containing the posting from each posting list for the next
+        evid present in all of them, or None if there are no more.  If targetId
+        is specified, then the evid must be at or after targetId, and it may be
+        the evid of the last match.
+
+        :param targetId: The evid to seek to, or None.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The list of postings, in the order the posting lists were supplied.
+        :rtype: list
         """
-        self._postings = searcher.iterPostings(None, None, startId, endId)
-        return self
+        if self._finished:
+            return None
+        if self._matches > 0 and self._matches % self.REORDER_INTERVAL == 0:
+            self._reorder()
+        iters = self._iters
+        heads = self._heads
+        order = self._order
+        lastKey = self._lastKey
+        # seeks only move forward, so if the target is at or before the last
+        # match, then the last match is the first match at or after the target.
+        # return it again, so a seek which passed over the target doesn't use
+        # up the match it found.
+        if targetId != None and lastKey != None and self._key(targetId) <= lastKey:
+            return list(heads)
+        # advance the driving posting list, unless its head is still usable
+        first = order[0]
+        head = heads[first]
+        if targetId != None:
+            if head == None or self._key(head[0]) < self._key(targetId):
+                head = iters[first].seekPosting(targetId)
+        elif head == None or (lastKey != None and self._key(head[0]) <= lastKey):
+            head = iters[first].nextPosting()
+        heads[first] = head
+        if head[0] == None:
+            self._finished = True
+            return None
+        candidateId = head[0]
+        candidate = self._key(candidateId)
+        agreed = 1
+        j = 1
+        while agreed < len(iters):
+            i = order[j % len(iters)]
+            j += 1
+            head = heads[i]
+            if head == None or self._key(head[0]) < candidate:
+                head = iters[i].seekPosting(candidateId)
+                heads[i] = head
+                if head[0] == None:
+                    self._finished = True
+                    return None
+                self._seeks[i] += 1
+                # if the posting list seeked past the candidate, then it
+                # rejected the candidate
+                if self._key(head[0]) != candidate:
+                    self._rejects[i] += 1
+            key = self._key(head[0])
+            if key == candidate:
+                agreed += 1
+            else:
+                candidateId = head[0]
+                candidate = key
+                agreed = 1
+        self._lastKey = candidate
+        self._matches += 1
+        return list(heads)
+
+    def close(self):
+        for i in self._iters: i.close()
+        self._iters = None
+        self._heads = None
+
 
 class AND(object):
     """
@@ -199,7 +441,7 @@ class AND(object):
     match all child matchers.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, children):
         """
@@ -207,7 +449,6 @@ class AND(object):
         :type children: list
         """
         self.children = children
-        self._lengths = None
 
     def __str__(self):
         return "<AND [%s]>" % ', '.join([str(child) for child in self.children])
@@ -215,8 +456,9 @@ class AND(object):
     def optimizeMatcher(self, index):
         """
         Optimize the matcher.  If any child matchers are AND operators, then move their
-        children into this matcher.  If any child matchers optimize out, then toss them.
-        If all child matchers optimize out, then we can toss the parent matcher as well.
+        children into the optimized matcher.  If any child matchers optimize out, then
+        toss them.  If all child matchers optimize out, then we can toss the parent
+        matcher as well.  The matcher itself is not modified.
 
         :param index: The index we will be running the query on.
         :type index: Object implementing :class:`terane.bier.IIndex`
@@ -224,7 +466,7 @@ class AND(object):
         :rtype: An object implementing :class:`terane.bier.IMatcher`
         """
         children = []
-        excludes = [] 
+        excludes = []
         for child in self.children:
             # optimize each child query
             child = child.optimizeMatcher(index)
@@ -238,14 +480,22 @@ class AND(object):
             # if the child has been optimized away, then toss it
             elif child != None:
                 children.append(child)
-        self.children = children
         # if there are no children, then we can toss this matcher too
-        if len(self.children) == 0:
+        if len(children) == 0:
             return None
         # if there are any NOT operators, then we wrap this matcher and the combined NOTs in a Sieve.
         if len(excludes) > 0:
-            return Sieve(self, excludes)
-        return self
+            return Sieve(AND(children), excludes)
+        return AND(children)
+
+    def _childLengths(self, searcher, startId, endId):
+        """
+        Returns a list of (length estimate, child) tuples sorted by length.
+        """
+        lengths = []
+        for child in self.children:
+            bisect.insort_right(lengths, (child.matchesLength(searcher, startId, endId),child))
+        return lengths
 
     def matchesLength(self, searcher, startId, endId):
         """
@@ -260,10 +510,7 @@ class AND(object):
         :returns: The postings length estimate.
         :rtype: int
         """
-        self._lengths = []
-        for child in self.children:
-            bisect.insort_right(self._lengths, (child.matchesLength(searcher, startId, endId),child))
-        length = self._lengths[0][0]
+        length = self._childLengths(searcher, startId, endId)[0][0]
         logger.trace("%s: matchesLength() => %i" % (self, length))
         return length
 
@@ -278,11 +525,40 @@ class AND(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        if self._lengths == None:
-            self.matchesLength(searcher, startId, endId)
-        self._smallest = self._lengths[0][1].iterMatches(searcher, startId, endId)
-        self._others = [child[1].iterMatches(searcher, startId, endId) for child in self._lengths[1:]]
-        return self
+        lengths = self._childLengths(searcher, startId, endId)
+        iters = [child.iterMatches(searcher, startId, endId) for length,child in lengths]
+        return ANDPostings(self, Intersection(iters, endId < startId))
+
+    def matchesTerms(self, terms):
+        """
+        Returns True if the terms match all child matchers.
+
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
+        """
+        for child in self.children:
+            if not child.matchesTerms(terms):
+                return False
+        return True
+
+class ANDPostings(object):
+    """
+    The posting list returned by AND.iterMatches().
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, matcher, intersection):
+        """
+        :param matcher: The AND matcher which is being executed.
+        :type matcher: :class:`terane.bier.matching.AND`
+        :param intersection: The intersection of the child posting lists.
+        :type intersection: :class:`terane.bier.matching.Intersection`
+        """
+        self._matcher = matcher
+        self._intersection = intersection
 
     def nextPosting(self):
         """
@@ -292,17 +568,9 @@ class AND(object):
         :returns: The event identifier of the next matching event, or None.
         :rtype: :class:`terane.bier.evid.EVID`
         """
-        while True:
-            posting = self._smallest.nextPosting()
-            if posting[0] == None:
-                break
-            for child in self._others:
-                if child.skipPosting(posting[0])[0] == None:
-                    posting = (None,None,None)
-                    break
-            if posting[0] != None:
-                break
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
+        postings = self._intersection.next()
+        posting = postings[0] if postings != None else (None,None,None)
+        logger.trace("%s: nextPosting() => %s" % (self._matcher, posting[0]))
         return posting
 
     def skipPosting(self, targetId):
@@ -313,20 +581,57 @@ class AND(object):
         :returns: The event identifier matching the targetId, or None.
         :rtype: :class:`terane.bier.evid.EVID`
         """
-        posting = self._smallest.skipPosting(targetId)
-        if posting[0] != None:
-            for child in self._others:
-                posting = child.skipPosting(targetId)
-                if posting[0] == None:
-                    break
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
-        return posting[0]
+        posting = self.seekPosting(targetId)
+        if posting[0] != targetId:
+            posting = (None,None,None)
+        logger.trace("%s: skipPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
+        return posting
+
+    def seekPosting(self, targetId):
+        """
+        Returns the first matching posting at or after targetId, or (None,None,None)
+        if there are no more matching postings.
+
+        :param targetId: The target event identifier.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The posting of the next matching event, or (None,None,None).
+        :rtype: tuple
+        """
+        postings = self._intersection.next(targetId)
+        posting = postings[0] if postings != None else (None,None,None)
+        logger.trace("%s: seekPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
+        return posting
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next matching postings.  An empty
+        list means there are no more matching postings.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = _nextEach(self, count)
+        logger.trace("%s: nextPostings(%i) => %i postings" % (self._matcher, count, len(postings)))
+        return postings
+
+    def skipPostings(self, targetIds):
+        """
+        Returns the postings matching each of the targetIds which the matcher contains.
+
+        :param targetIds: The target event identifiers, in iteration order.
+        :type targetIds: list
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = _seekEach(self, self._intersection, targetIds)
+        logger.trace("%s: skipPostings(%i targets) => %i postings" % (self._matcher, len(targetIds), len(postings)))
+        return postings
 
     def close(self):
-        self._smallest.close()
-        for i in self._others: i.close()
-        self._smallest = None
-        self._others = None
+        self._intersection.close()
+        self._intersection = None
 
 class OR(object):
     """
@@ -334,7 +639,7 @@ class OR(object):
     match at least one of the child queries.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, children):
         """
@@ -349,8 +654,9 @@ class OR(object):
     def optimizeMatcher(self, index):
         """
         Optimize the query.  If any child queries are OR operators, then move their
-        children into this query.  If any child queries optimize out, then toss them.
-        If all child queries optimize out, then we can toss the parent query as well.
+        children into the optimized query.  If any child queries optimize out, then
+        toss them.  If all child queries optimize out, then we can toss the parent
+        query as well.  The query itself is not modified.
 
         :param index: The index we will be running the query on.
         :type index: Object implementing :class:`terane.bier.index.IIndex`
@@ -372,14 +678,13 @@ class OR(object):
             # if the child has been optimized away, then toss it
             elif child != None:
                 children.append(child)
-        self.children = children
         # if there are no children, then we can toss this matcher too
-        if len(self.children) == 0:
+        if len(children) == 0:
             return None
         # if there are any NOT operators, then we wrap this matcher and the combined NOTs in a Sieve.
         if len(excludes) > 0:
-            return Sieve(self, excludes)
-        return self
+            return Sieve(OR(children), excludes)
+        return OR(children)
 
     def matchesLength(self, searcher, startId, endId):
         """
@@ -411,84 +716,23 @@ class OR(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        # smallestPostings contains the smallest posting for each child query, or (None,None,None) 
-        self._smallestPostings = [(None,None,None) for i in range(len(self.children))]
-        # iters contains the iterator (object implementing IPostingList) for each child query
-        self._iters = [child.iterMatches(searcher, startId, endId) for child in self.children]
-        # lastId is the last evid returned by the iterator
-        self._lastId = None
-        # set our cmp function, which determines the next evid to return.  if we are searching in
-        # reverse order, then reverse the meaning if the regular comparison function.
-        if endId < startId:
-            self._cmp = lambda d1,d2: cmp(d2,d1)
-        # otherwise use the normal comparison function
-        else:
-            self._cmp = cmp
-        return self
-
-    def nextPosting(self):
-        """
-        Returns the event identifier of the next event matching the query, or None if there are no
-        more events which match the query.
+        iters = [child.iterMatches(searcher, startId, endId) for child in self.children]
+        # if we are searching in reverse order, then merge in reverse order
+        return MatcherPostings(self, PostingHeap(iters, endId < startId))
 
-        :returns: The event identifier of the next matching event, or None.
-        :rtype: :class:`terane.bier.evid.EVID`
+    def matchesTerms(self, terms):
         """
-        curr = 0
-        # check each child iter for the lowest evid
-        for i in range(len(self.children)):
-            # if None, then get the next posting from the iter
-            if self._smallestPostings[i][0] == None:
-                self._smallestPostings[i] = self._iters[i].nextPosting()
-            # if the posting evid is None, then check the next iter
-            if self._smallestPostings[i][0] == None:
-                continue
-            # if the evid equals the last evid returned, then ignore it
-            if self._lastId != None and self._smallestPostings[i][0] == self._lastId:
-                self._smallestPostings[i] = (None,None,None)
-                continue
-            # we don't compare the first evid with itself
-            if i == 0:
-                continue
-            # if the evid is the current smallest evid, then remember it
-            if self._smallestPostings[curr][0] == None or \
-              self._cmp(self._smallestPostings[i][0], self._smallestPostings[curr][0]) < 0:
-                curr = i
-        # update lastId with the evid
-        posting = self._smallestPostings[curr]
-        self._lastId = posting[0]
-        # forget the evid so we don't return it again
-        self._smallestPostings[curr] = (None,None,None)
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
-        return posting
+        Returns True if the terms match at least one of the child matchers.
 
-    def skipPosting(self, targetId):
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
         """
-        Returns the event identifier matching targetId if the query contains the specified targetId,
-        or None if the targetId is not present.
-
-        :returns: The event identifier matching the targetId, or None.
-        :rtype: :class:`terane.bier.evid.EVID`
-        """
-        posting = None
-        # iterate through each child query
-        for i in range(len(self.children)):
-            posting = self._smallestPostings[i]
-            # if the smallestId equals the targetId, we are done
-            if posting[0] == targetId:
-                break
-            # otherwise check if the targetId exists in the child query
-            if posting[0] == None or self._cmp(posting[0], targetId) < 0:
-                posting = self._iters[i].skipPosting(targetId)
-                self._smallestPostings[i] = posting
-                if posting[0] == targetId:
-                    break    
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
-        return posting
-
-    def close(self):
-        for i in self._iters: i.close()
-        self._iters = None
+        for child in self.children:
+            if child.matchesTerms(terms):
+                return True
+        return False
 
 class NOT(object):
     """
@@ -497,7 +741,7 @@ class NOT(object):
     application logic is done in the Sieve class.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, child):
         """
@@ -518,10 +762,10 @@ class NOT(object):
         :returns: The optimized query.
         :rtype: An object implementing :class:`terane.bier.searching.IQuery`
         """
-        self.child = self.child.optimizeMatcher(index)
-        if self.child == None:
+        child = self.child.optimizeMatcher(index)
+        if child == None:
             return None
-        return self
+        return NOT(child)
 
     def matchesLength(self, searcher, startId, endId):
         """
@@ -541,36 +785,14 @@ class NOT(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        self._iter = self.child.iterMatches(searcher, startId, endId)
-        return self
-
-    def nextPosting(self):
-        """
-        Returns the event identifier of the next event matching the query, or None if there are no
-        more events which match the query.
-
-        :returns: The event identifier of the next matching event, or None.
-        :rtype: :class:`terane.bier.evid.EVID`
-        """
-        posting = self._iter.nextPosting()
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
-        return posting
+        return MatcherPostings(self, self.child.iterMatches(searcher, startId, endId))
 
-    def skipPosting(self, targetId):
+    def matchesTerms(self, terms):
         """
-        Returns the event identifier matching targetId if the query contains
-        the specified targetId, or None if the targetId is not present.
-
-        :returns: The event identifier matching the targetId, or None.
-        :rtype: :class:`terane.bier.evid.EVID`
+        Returns True if the terms match the child matcher.  As with iterMatches(),
+        the negation is applied by the Sieve.
         """
-        posting = self._iter.skipPosting(targetId)
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
-        return posting
-
-    def close(self):
-        self._iter.close()
-        self._iter = None
+        return self.child.matchesTerms(terms)
 
 class Sieve(object):
     """
@@ -578,7 +800,7 @@ class Sieve(object):
     out events if they are present in any of the filter queries.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, source, filters):
         """
@@ -630,9 +852,40 @@ class Sieve(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        self._sourceIter = self.source.iterMatches(searcher, startId, endId)
-        self._filterIter = self.filters.iterMatches(searcher, startId, endId)
-        return self
+        sourceIter = self.source.iterMatches(searcher, startId, endId)
+        filterIter = self.filters.iterMatches(searcher, startId, endId)
+        return SievePostings(self, sourceIter, filterIter)
+
+    def matchesTerms(self, terms):
+        """
+        Returns True if the terms match the source query and none of the filters.
+
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
+        """
+        return self.source.matchesTerms(terms) and not self.filters.matchesTerms(terms)
+
+class SievePostings(object):
+    """
+    The posting list returned by Sieve.iterMatches().
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, matcher, sourceIter, filterIter):
+        """
+        :param matcher: The Sieve matcher which is being executed.
+        :type matcher: :class:`terane.bier.matching.Sieve`
+        :param sourceIter: The posting list of the source query.
+        :type sourceIter: An object implementing :class:`terane.bier.IPostingList`
+        :param filterIter: The posting list of the filter queries.
+        :type filterIter: An object implementing :class:`terane.bier.IPostingList`
+        """
+        self._matcher = matcher
+        self._sourceIter = sourceIter
+        self._filterIter = filterIter
 
     def nextPosting(self):
         """
@@ -652,7 +905,7 @@ class Sieve(object):
             # if the the evid isn't present in the filter, then return it
             if posting[0] != self._filterIter.skipPosting(posting[0])[0]:
                 break
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
+        logger.trace("%s: nextPosting() => %s" % (self._matcher, posting[0]))
         return posting
 
     def skipPosting(self, targetId):
@@ -670,9 +923,72 @@ class Sieve(object):
             # if the targetId is present in the filter, then the skip fails
             if posting[0] == self._filterIter.skipPosting(posting[0])[0]:
                 posting = (None,None,None)
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
+        logger.trace("%s: skipPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
         return posting
 
+    def seekPosting(self, targetId):
+        """
+        Returns the first matching posting at or after targetId, or (None,None,None)
+        if there are no more matching postings.
+
+        :param targetId: The target event identifier.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The posting of the next matching event, or (None,None,None).
+        :rtype: tuple
+        """
+        posting = self._sourceIter.seekPosting(targetId)
+        # loop until we find a evid not in the filter, or there are no more evids
+        while posting[0] != None:
+            if posting[0] != self._filterIter.skipPosting(posting[0])[0]:
+                break
+            posting = self._sourceIter.nextPosting()
+        logger.trace("%s: seekPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
+        return posting
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next postings from the source query
+        which are not present in the filter.  An empty list means there are no
+        more matching postings.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        while True:
+            postings = self._sourceIter.nextPostings(count)
+            if len(postings) == 0:
+                break
+            postings = self._sieve(postings)
+            if len(postings) > 0:
+                break
+        logger.trace("%s: nextPostings(%i) => %i postings" % (self._matcher, count, len(postings)))
+        return postings
+
+    def skipPostings(self, targetIds):
+        """
+        Returns the postings matching each of the targetIds which the source
+        query contains and the filter does not.
+
+        :param targetIds: The target event identifiers, in iteration order.
+        :type targetIds: list
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = self._sourceIter.skipPostings(targetIds)
+        if len(postings) > 0:
+            postings = self._sieve(postings)
+        logger.trace("%s: skipPostings(%i targets) => %i postings" % (self._matcher, len(targetIds), len(postings)))
+        return postings
+
+    def _sieve(self, postings):
+        """
+        Returns the postings whose evids are not present in the filter.
+        """
+        excluded = set([p[0] for p in self._filterIter.skipPostings([p[0] for p in postings])])
+        return [p for p in postings if p[0] not in excluded]
+
     def close(self):
         self._sourceIter.close()
         self._filterIter.close()
@@ -685,7 +1001,7 @@ class Phrase(object):
     child term matchers, and each term must appear in the appropriate position.
     """
 
-    implements(IMatcher, IPostingList)
+    implements(IMatcher)
 
     def __init__(self, field, terms):
         """
@@ -694,8 +1010,6 @@ class Phrase(object):
         """
         self.field = field
         self.terms = terms
-        self._lengths = None
-        self._iters = None
 
     def __str__(self):
         return "<Phrase %s>" % self.terms
@@ -715,6 +1029,17 @@ class Phrase(object):
             return Term(self.field, self.terms[0]).optimizeMatcher(index)
         return self
 
+    def _termLengths(self, searcher, startId, endId):
+        """
+        Returns a list of (length estimate, term, position) tuples sorted by length.
+        """
+        lengths = []
+        for position in range(len(self.terms)):
+            term = self.terms[position]
+            length = searcher.postingsLength(self.field, term, startId, endId)
+            bisect.insort_right(lengths, (length,term,position))
+        return lengths
+
     def matchesLength(self, searcher, startId, endId):
         """
         Returns an estimate of the approximate number of postings which will be returned
@@ -728,12 +1053,7 @@ class Phrase(object):
         :returns: The postings length estimate.
         :rtype: int
         """
-        self._lengths = []
-        for position in range(len(self.terms)):
-            term = self.terms[position]
-            length = searcher.postingsLength(self.field, term, startId, endId)
-            bisect.insort_right(self._lengths, (length,term,position))
-        length = self._lengths[0][0]
+        length = self._termLengths(searcher, startId, endId)[0][0]
         logger.trace("%s: matchesLength() => %i" % (self, length))
         return length
 
@@ -748,10 +1068,68 @@ class Phrase(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        if self._lengths == None:
-            self.matchesLength(searcher, startId, endId)
-        self._iters = [searcher.iterPostings(self.field, v[1], startId, endId) for v in self._lengths]
-        return self
+        lengths = self._termLengths(searcher, startId, endId)
+        iters = [searcher.iterPostings(self.field, term, startId, endId) for length,term,position in lengths]
+        positions = [position for length,term,position in lengths]
+        return PhrasePostings(self, Intersection(iters, endId < startId), positions)
+
+    def matchesTerms(self, terms):
+        """
+        Returns True if every term is present in the field, with the terms in the
+        appropriate positions.
+
+        :param terms: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+        :type terms: dict
+        :returns: True if the event matches, otherwise False.
+        :rtype: bool
+        """
+        positions = []
+        for term in self.terms:
+            meta = terms.get((self.field.fieldname, self.field.fieldtype, term))
+            if meta == None:
+                return False
+            positions.append(meta['pos'])
+        for firstPos in positions[0]:
+            positionsMatch = True
+            for i in range(1, len(positions)):
+                if (firstPos + i) not in positions[i]:
+                    positionsMatch = False
+                    break
+            if positionsMatch == True:
+                return True
+        return False
+
+class PhrasePostings(object):
+    """
+    The posting list returned by Phrase.iterMatches().
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, matcher, intersection, positions):
+        """
+        :param matcher: The Phrase matcher which is being executed.
+        :type matcher: :class:`terane.bier.matching.Phrase`
+        :param intersection: The intersection of the term posting lists.
+        :type intersection: :class:`terane.bier.matching.Intersection`
+        :param positions: The position in the phrase of each intersected term.
+        :type positions: list
+        """
+        self._matcher = matcher
+        self._intersection = intersection
+        self._positions = positions
+
+    def _nextPhrase(self, targetId=None):
+        """
+        Returns the posting of the next event (at or after targetId, if specified)
+        which contains every term, with the terms in the appropriate positions.
+        """
+        postings = self._intersection.next(targetId)
+        while postings != None:
+            if self._positionsMatch(postings) == True:
+                return postings[-1]
+            postings = self._intersection.next()
+        return (None,None,None)
 
     def nextPosting(self):
         """
@@ -761,25 +1139,8 @@ class Phrase(object):
         :returns: The event identifier of the next matching event, or None.
         :rtype: :class:`terane.bier.evid.EVID`
         """
-        def _get():
-            while True:
-                postings = []
-                smallest = 0
-                posting = self._iters[0].nextPosting()
-                if posting == (None, None, None):
-                    return posting
-                postings.append(posting)
-                for i in range(len(self._iters))[1:]:
-                    posting = self._iters[i].skipPosting(postings[0][0])
-                    if posting == (None, None, None):
-                        break
-                    postings.append(posting)
-                if len(postings) != len(self._iters):
-                    continue
-                if self._positionsMatch(postings) == True:
-                    return posting
-        posting = _get()
-        logger.trace("%s: nextPosting() => %s" % (self, posting[0])) 
+        posting = self._nextPhrase()
+        logger.trace("%s: nextPosting() => %s" % (self._matcher, posting[0]))
         return posting
 
     def skipPosting(self, targetId):
@@ -790,30 +1151,62 @@ class Phrase(object):
         :returns: The event identifier matching the targetId, or None.
         :rtype: :class:`terane.bier.evid.EVID`
         """
-        def _skip():
-            postings = []
-            smallest = 0
-            for i in range(len(self._iters)):
-                posting = self._iters[i].skipPosting(targetId)
-                if posting[0] == None:
-                    return (None, None, None)
-                postings.append(posting)
-            if self._positionsMatch(postings) == True:
-                return posting[0]
-            return (None, None, None)
-        posting = _skip()
-        logger.trace("%s: skipPosting(%s) => %s" % (self, targetId, posting[0]))
+        posting = self._nextPhrase(targetId)
+        if posting[0] != targetId:
+            posting = (None,None,None)
+        logger.trace("%s: skipPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
         return posting
 
+    def seekPosting(self, targetId):
+        """
+        Returns the first matching posting at or after targetId, or (None,None,None)
+        if there are no more matching postings.
+
+        :param targetId: The target event identifier.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The posting of the next matching event, or (None,None,None).
+        :rtype: tuple
+        """
+        posting = self._nextPhrase(targetId)
+        logger.trace("%s: seekPosting(%s) => %s" % (self._matcher, targetId, posting[0]))
+        return posting
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next matching postings.  An empty
+        list means there are no more matching postings.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = _nextEach(self, count)
+        logger.trace("%s: nextPostings(%i) => %i postings" % (self._matcher, count, len(postings)))
+        return postings
+
+    def skipPostings(self, targetIds):
+        """
+        Returns the postings matching each of the targetIds which the matcher contains.
+
+        :param targetIds: The target event identifiers, in iteration order.
+        :type targetIds: list
+        :returns: A list of matching postings.
+        :rtype: list
+        """
+        postings = _seekEach(self, self._intersection, targetIds)
+        logger.trace("%s: skipPostings(%i targets) => %i postings" % (self._matcher, len(targetIds), len(postings)))
+        return postings
+
     def _positionsMatch(self, postings):
         """
         Returns True if the posting positions line up, otherwise False.
         """
         positions = []
         for i in range(len(postings)):
-            positions.append((self._lengths[i][2], postings[i][1]['pos']))
+            positions.append((self._positions[i], postings[i][1]['pos']))
         positions = map(lambda x: x[1], sorted(positions))
-        logger.trace("%s: _positionsMatch(%s): positions=%s" % (self, postings[0][0], positions))
+        logger.trace("%s: _positionsMatch(%s): positions=%s" % (self._matcher, postings[0][0], positions))
         for firstPos in positions[0]:
             positionsMatch = True
             for i in range(1, len(positions)):
@@ -825,6 +1218,5 @@ class Phrase(object):
         return False
 
     def close(self):
-        self._lengths = None
-        for i in self._iters: i.close()
-        self._iters = None
+        self._intersection.close()
+        self._intersection = None
@@ -18,12 +18,16 @@
 import datetime
 from pyparsing import ParseBaseException
 from terane.bier.matching import Every
-from terane.bier.searching import Period
+from terane.bier.searching import Period, LRUCache
 from terane.bier.ql.queries import iterQuery, tailQuery
 from terane.loggers import getLogger
 
 logger = getLogger('terane.bier.ql')
 
+# parsed queries, keyed by query string.  matchers are never modified once
+# they are parsed, so the same query can be shared between searches.
+_parsedQueries = LRUCache(256)
+
 class QuerySyntaxError(BaseException):
     """
     There was an error parsing the query synatx.
@@ -54,15 +58,24 @@ def parseIterQuery(string):
     :rtype: tuple
     """
     try:
-        if string.strip() == '':
+        query = _parsedQueries.get(('iter', string))
+        if query != None:
+            where = None
+        elif string.strip() == '':
             query,where = Every(), None
         else:
             query,where = iterQuery.parseString(string, parseAll=True).asList()[0]
+            # relative dates in the WHERE clause are evaluated when the query
+            # is parsed, so only queries without a WHERE clause are cached
+            if where == None:
+                _parsedQueries.put(('iter', string), query)
         if where == None:
             utcnow = datetime.datetime.utcnow()
             onehourago = utcnow - datetime.timedelta(hours=1)
-            where = {'dateFrom': onehourago, 'dateTo': utcnow, 'fromExcl': False, 'toExcl': False}
-        return query, Period(where['dateFrom'], where['dateTo'], where['fromExcl'], where['toExcl'])
+            where = {'dateFrom': onehourago, 'dateTo': utcnow, 'fromExcl': False,
+                'toExcl': False, 'relative': True}
+        return query, Period(where['dateFrom'], where['dateTo'], where['fromExcl'],
+            where['toExcl'], where['relative'])
     except ParseBaseException, e:
         raise QuerySyntaxError(e, string)
 
@@ -77,8 +90,13 @@ def parseTailQuery(string):
     :rtype: tuple
     """
     try:
+        query = _parsedQueries.get(('tail', string))
+        if query != None:
+            return query
         if string.strip() == '':
             return Every()
-        return tailQuery.parseString(string, parseAll=True).asList()[0]
+        query = tailQuery.parseString(string, parseAll=True).asList()[0]
+        _parsedQueries.put(('tail', string), query)
+        return query
     except ParseBaseException, e:
         raise QuerySyntaxError(e, string)
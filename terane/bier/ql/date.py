@@ -90,12 +90,14 @@ relativeDate.setParseAction(lambda tokens: _makeUTC(datetime.datetime.now()) - t
 # <backwardDateRange>     ::= 'TO' <dateSpec> [ 'EXCLUSIVE' ] [ 'FROM' <dateSpec> [ 'EXCLUSIVE' ] ]
 # <subjectDate>           ::= 'DATE' <forwardDateRange> | 'DATE' <backwardDateRange>
 
-dateSpec = relativeDate | absoluteDate
+dateSpec = relativeDate('relative') | absoluteDate
 optionalExclusive = pp.Optional(pp.Literal('EXCLUSIVE'))
 dateFrom = pp.Suppress('FROM') + dateSpec + optionalExclusive
 def parseDateFrom(tokens):
     "Parse DATE lower bound."
     date = {'dateFrom': tokens[0]}
+    if 'relative' in tokens:
+        date['relative'] = True
     if len(tokens) > 1:
         date['fromExcl'] = True
     return date
@@ -104,6 +106,8 @@ dateTo = pp.Suppress('TO') + dateSpec + optionalExclusive
 def parseDateTo(tokens):
     "Parse DATE upper bound."
     date = {'dateTo': tokens[0]}
+    if 'relative' in tokens:
+        date['relative'] = True
     if len(tokens) > 1:
         date['toExcl'] = True
     return date
@@ -111,12 +115,17 @@ dateTo.setParseAction(parseDateTo)
 subjectDate = pp.Suppress('DATE') + dateFrom + pp.Optional(dateTo) | pp.Suppress('DATE') + dateTo + pp.Optional(dateFrom) 
 def parseSubjectDate(tokens):
     "Parse DATE range."
+    # the range is relative if either bound is relative, or if the upper
+    # bound is missing and defaults to now
     date = {
         'dateFrom': datetime.datetime.min,
         'dateTo': _makeUTC(datetime.datetime.now()),
         'fromExcl': False,
-        'toExcl': False
+        'toExcl': False,
+        'relative': True
         }
+    if not 'relative' in tokens[0] and len(tokens) > 1 and not 'relative' in tokens[1]:
+        date['relative'] = False
     date.update(tokens[0])
     if len(tokens) > 1:
         date.update(tokens[1])
@@ -15,10 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
-import time, datetime, calendar, copy
+import time, datetime, calendar
+from collections import OrderedDict
 from twisted.internet.task import cooperate
 from terane.bier.interfaces import IIndex, ISearcher, IPostingList, IEventStore
 from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
+from terane.bier.matching import QueryTerm, Term, Every, AND, OR, NOT, Sieve
 from terane.loggers import getLogger
 
 logger = getLogger('terane.bier.searching')
@@ -26,11 +29,101 @@ logger = getLogger('terane.bier.searching')
 class SearcherError(Exception):
     pass
 
+class LRUCache(object):
+    """
+    A mapping which holds at most maxSize items, discarding the least recently
+    used item when it is full.
+    """
+
+    def __init__(self, maxSize):
+        """
+        :param maxSize: The maximum number of items to hold.
+        :type maxSize: int
+        """
+        self.maxSize = maxSize
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        # reinsert the item, making it the most recently used
+        self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.maxSize:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+def queryKey(query):
+    """
+    Returns a hashable key which identifies the query by its structure.  Unlike
+    the string form of the query, the key includes every attribute of a query
+    term, so queries which differ only in the field type get different keys.
+
+    :param query: The query.
+    :type query: An object implementing :class:`terane.bier.interfaces.IMatcher`
+    :returns: The query key.
+    :rtype: tuple
+    """
+    if isinstance(query, QueryTerm):
+        return ('QueryTerm', query.fieldname, query.fieldtype, query.fieldfunc, query.value)
+    if isinstance(query, AND) or isinstance(query, OR):
+        return (query.__class__.__name__, tuple([queryKey(child) for child in query.children]))
+    if isinstance(query, NOT):
+        return ('NOT', queryKey(query.child))
+    if isinstance(query, Sieve):
+        return ('Sieve', queryKey(query.source), queryKey(query.filters))
+    return (query.__class__.__name__, str(query))
+
+class PlanCache(object):
+    """
+    PlanCache memoizes the optimized, index-specific plan for a query.  Plans
+    are keyed on the query, the index, and the version of the index schema,
+    because optimizing a matcher depends only on the fields in the schema.
+    Matchers are never modified once they are optimized, so a plan can be
+    executed by any number of searches at once.
+    """
+
+    def __init__(self, maxPlans=256):
+        """
+        :param maxPlans: The maximum number of plans to hold.
+        :type maxPlans: int
+        """
+        self._plans = LRUCache(maxPlans)
+
+    def getPlan(self, query, index):
+        """
+        Returns the query optimized for the specified index, or None if the query
+        optimizes out entirely.
+
+        :param query: The query to optimize.
+        :type query: An object implementing :class:`terane.bier.interfaces.IMatcher`
+        :param index: The index the query will be executed on.
+        :type index: An object implementing :class:`terane.bier.interfaces.IIndex`
+        :returns: The optimized query, or None.
+        :rtype: An object implementing :class:`terane.bier.interfaces.IMatcher`
+        """
+        key = (queryKey(query), index, index.getSchema().getVersion())
+        plan = self._plans.get(key, self)
+        if plan is self:
+            plan = query.optimizeMatcher(index)
+            self._plans.put(key, plan)
+        return plan
+
+plans = PlanCache()
+
 class Period(object):
     """
     A time range within which to constain a query.
     """
-    def __init__(self, start, end, startexcl, endexcl):
+    def __init__(self, start, end, startexcl, endexcl, relative=False):
         """
         :param start: The start of the time range.
         :type start: :class:`datetime.datetime`
@@ -40,6 +133,9 @@ class Period(object):
         :type startexcl: bool
         :param endexcl: If True, then the end of the range is exclusive.
         :type endexcl: bool
+        :param relative: If True, then the range was computed relative to the
+          time the query was parsed.
+        :type relative: bool
         """
         if isinstance(start, datetime.datetime):
             self.start = EVID.fromDatetime(start)
@@ -55,6 +151,7 @@ class Period(object):
             raise TypeError("end must be datetime.datetime or terane.bier.evid.EVID")
         self.startexcl = startexcl
         self.endexcl = endexcl
+        self.relative = relative
 
     def __contains__(self, evid):
         if not isinstance(evid, EVID):
@@ -90,19 +187,20 @@ class Period(object):
         return start, end
 
 class ResultSet(object):
-    def __init__(self, searchers, postingLists, start, reverse, fields, limit):
+
+    # the number of postings retrieved in each iteration.  the postings of a
+    # batch are final before their events are fetched from the stores.
+    BATCH_SIZE = 100
+
+    def __init__(self, searchers, postingLists, start, reverse, fields, limit, pageSize=None):
         self._searchers = searchers
-        self._postingLists = postingLists
-        self._currPostings = [(None,None,None) for i in range(len(postingLists))]
+        self._postings = PostingHeap(postingLists, reverse)
         self._start = start
-        self._lastId = None
-        if reverse:
-            self._cmp = lambda x,y: cmp(y,x) 
-        else:
-            self._cmp = cmp
-        self._fields = fields
+        self._fields = frozenset(fields) if fields != None else None
         self._limit = limit
+        self._pageSize = pageSize
         self._count = 0
+        self._pageCount = 0
         self.events = []
         self.fields = []
         self.runtime = 0.0
@@ -111,61 +209,48 @@ class ResultSet(object):
         return self
 
     def next(self):
+        # if the current page is full, then pause iterating without releasing
+        # the searchers, so the next page can be retrieved with nextPage().
+        if self._pageSize != None and self._pageCount == self._pageSize:
+            self.runtime = time.time() - self._start
+            logger.trace("retrieved page of %i events in %f seconds" % (len(self.events),self.runtime))
+            raise StopIteration()
         try:
-            nlists = len(self._postingLists)
-            if nlists == 0:
-                raise StopIteration()
-            # check each child iter for the lowest evid
-            curr = 0
-            for i in range(nlists):
-                # if the postingList is None, then its closed
-                if self._postingLists[i] == None:
-                    continue
-                # if current posting for this posting list was consumed, then
-                # get the next posting from the posting list
-                if self._currPostings[i] == (None,None,None):
-                    self._currPostings[i] = self._postingLists[i].nextPosting()
-                # if the next posting for this posting list is (None,None,None),
-                # then we are done with this posting list
-                if self._currPostings[i] == (None,None,None):
-                    self._postingLists[i] = None
-                    continue
-                # if the evid equals the last evid returned, then ignore it
-                if self._lastId != None and self._currPostings[i][0] == self._lastId:
-                    self._currPostings[i] = (None,None,None)
-                    continue
-                # we don't compare the first evid with itself
-                if i == 0:
-                    continue
-                # if the evid is the current smallest evid, then remember it
-                if self._currPostings[curr] == (None,None,None) or \
-                  self._cmp(self._currPostings[i][0], self._currPostings[curr][0]) < 0:
-                    curr = i
+            # get the next batch of evids in order from all posting lists, never
+            # reading past the limit or the end of the page
+            count = min(self.BATCH_SIZE, self._limit - self._count)
+            if self._pageSize != None:
+                count = min(count, self._pageSize - self._pageCount)
+            postings = self._postings.nextPostings(count)
             # stop iterating if there are no more results
-            if self._currPostings[curr] == (None,None,None):
+            if len(postings) == 0:
                 raise StopIteration()
-            evid,tvalue,store = self._currPostings[curr]
-            # remember the last evid
-            self._lastId = evid
-            # forget the evid so we don't return it again
-            self._currPostings[curr] = (None,None,None)
-            # retrieve the event
-            if not IEventStore.providedBy(store):
-                raise TypeError("store does not implement IEventStore")
-            defaultfield, defaultvalue, fields = store.getEvent(evid)
-            if defaultfield not in self.fields:
-                self.fields.append(defaultfield)
-            # keep a record of all field names found in the results.
-            for fieldname in fields.keys():
-                if fieldname not in self.fields:
-                    self.fields.append(fieldname)
-            # filter out unwanted fields
-            if self._fields != None:
-                fields = dict([(k,v) for k,v in fields.items() if k in self._fields])
-            self.events.append(((evid.ts,evid.offset), defaultfield, defaultvalue, fields))
-            logger.trace("added event %s to resultset" % evid)
+            # retrieve the events from each store in evid order.  only the
+            # requested fields are loaded from the store.  the same event may
+            # be stored in more than one index with the same evid, so events
+            # are keyed by store as well as by evid.
+            evidsByStore = {}
+            for evid,tvalue,store in postings:
+                evidsByStore.setdefault(store, []).append(evid)
+            events = {}
+            for store,evids in evidsByStore.items():
+                if not IEventStore.providedBy(store):
+                    raise TypeError("store does not implement IEventStore")
+                for evid in sorted(evids):
+                    events[(store,evid)] = store.getEvent(evid, self._fields)
+            for evid,tvalue,store in postings:
+                defaultfield, defaultvalue, fields = events[(store,evid)]
+                if defaultfield not in self.fields:
+                    self.fields.append(defaultfield)
+                # keep a record of all field names found in the results.
+                for fieldname in fields.keys():
+                    if fieldname not in self.fields:
+                        self.fields.append(fieldname)
+                self.events.append(((evid.ts,evid.offset), defaultfield, defaultvalue, fields))
+                logger.trace("added event %s to resultset" % str(evid))
             # if we have reached our limit
-            self._count += 1
+            self._count += len(postings)
+            self._pageCount += len(postings)
             if self._count == self._limit:
                 raise StopIteration()
         except:
@@ -174,15 +259,121 @@ class ResultSet(object):
             logger.trace("retrieved %i events in %f seconds" % (len(self.events),self.runtime))
             raise
 
+    def isFinished(self):
+        """
+        Returns True if all results have been retrieved, otherwise False.
+
+        :returns: True if there are no more pages of results.
+        :rtype: bool
+        """
+        return self._postings == None
+
+    def nextPage(self):
+        """
+        Resume iterating the results after a page has been filled.  The events and
+        fields from the previous page are discarded.
+
+        :returns: A CooperativeTask which retrieves the next page of results.
+        :rtype: :class:`twisted.internet.task.CooperativeTask`
+        """
+        if self.isFinished():
+            raise SearcherError("no more results to retrieve")
+        self.events = []
+        self.fields = []
+        self._pageCount = 0
+        self._start = time.time()
+        return cooperate(self)
+
     def close(self):
-        for postingList in self._postingLists:
-            if postingList != None: postingList.close()
-        self._postingLists = None
-        for searcher in self._searchers:
-            searcher.close()
+        if self._postings != None:
+            self._postings.close()
+        self._postings = None
+        if self._searchers != None:
+            for searcher in self._searchers:
+                searcher.close()
         self._searchers = None
 
-def searchIndices(indices, query, period, lastId=None, reverse=False, fields=None, limit=100):
+class CountSet(object):
+    """
+    CountSet counts the events matching a query, and optionally the matching
+    events containing each term of a field.  Events are never retrieved from
+    the stores, and single term queries are counted from the term statistics
+    wherever a segment lies entirely within the period.
+    """
+
+    # the number of postings counted in each iteration
+    BATCH_SIZE = 1000
+
+    def __init__(self, searches, startId, endId, start):
+        """
+        :param searches: A list of (searcher, plan, groupField) tuples, one for each index.
+        :type searches: list
+        """
+        self._searches = searches
+        self._startId = startId
+        self._endId = endId
+        self._start = start
+        self._steps = self._countAll()
+        self.count = 0
+        self.groups = {}
+        self.runtime = 0.0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return self._steps.next()
+        except:
+            self.close()
+            self.runtime = time.time() - self._start
+            logger.trace("counted %i events in %f seconds" % (self.count,self.runtime))
+            raise
+
+    def _countAll(self):
+        for searcher,plan,groupField in self._searches:
+            for count in self._countMatches(searcher, plan):
+                self.count += count
+                yield None
+            if groupField == None:
+                continue
+            # count the matching events containing each term in the field
+            for term in searcher.iterTerms(groupField, self._startId, self._endId):
+                if isinstance(plan, Every):
+                    matcher = Term(groupField, term)
+                else:
+                    matcher = AND([plan, Term(groupField, term)])
+                for count in self._countMatches(searcher, matcher):
+                    if count > 0:
+                        self.groups[term] = self.groups.get(term, 0) + count
+                    yield None
+
+    def _countMatches(self, searcher, matcher):
+        """
+        Yields the number of postings matching the matcher, in batches.
+        """
+        if isinstance(matcher, Every):
+            yield searcher.countPostings(None, None, self._startId, self._endId)
+        elif isinstance(matcher, Term):
+            yield searcher.countPostings(matcher.field, matcher.value, self._startId, self._endId)
+        else:
+            postings = matcher.iterMatches(searcher, self._startId, self._endId)
+            try:
+                while True:
+                    batch = postings.nextPostings(self.BATCH_SIZE)
+                    if len(batch) == 0:
+                        break
+                    yield len(batch)
+            finally:
+                postings.close()
+
+    def close(self):
+        if self._searches != None:
+            for searcher,plan,groupField in self._searches:
+                searcher.close()
+        self._searches = None
+
+def searchIndices(indices, query, period, lastId=None, reverse=False, fields=None, limit=100, pageSize=None):
     """
     Search the specified indices for events matching the specified query.
 
@@ -200,6 +391,8 @@ def searchIndices(indices, query, period, lastId=None, reverse=False, fields=Non
     :type fields: list or None
     :param limit: Only returned the specified number of events.
     :type limit: int
+    :param pageSize: If not None, then pause the search after each pageSize events.
+    :type pageSize: int or None
     :returns: A CooperativeTask which contains a Deferred and manages the search task.
     :rtype: :class:`twisted.internet.task.CooperativeTask`
     """
@@ -211,7 +404,7 @@ def searchIndices(indices, query, period, lastId=None, reverse=False, fields=Non
         endId, startId = period.getRange()
     if lastId != None:
         if not lastId in period:
-            raise SearcherError("lastId %s is not within period" % lastId)
+            raise SearcherError("lastId %s is not within period" % str(lastId))
         startId = lastId
     # search each index separately, then merge the results
     try:
@@ -220,11 +413,10 @@ def searchIndices(indices, query, period, lastId=None, reverse=False, fields=Non
         for index in indices:
             if not IIndex.providedBy(index):
                 raise TypeError("index does not implement IIndex")
-            # we create a copy of the original query, which can possibly be optimized
-            # with index-specific knowledge.
-            _query = copy.deepcopy(query)
+            # the query is optimized with index-specific knowledge.  optimizing
+            # doesn't modify the original query, so the plan is cached.
             try:
-                _query = _query.optimizeMatcher(index)
+                _query = plans.getPlan(query, index)
             except NotImplementedError, e:
                 raise SearcherError(str(e))
             logger.debug("optimized query for index '%s': %s" % (index.name,str(_query)))
@@ -241,7 +433,7 @@ def searchIndices(indices, query, period, lastId=None, reverse=False, fields=Non
             searchers.append(searcher)
             postingLists.append(postingList)
         # return a cooperative task
-        return cooperate(ResultSet(searchers, postingLists, start, reverse, fields, limit))
+        return cooperate(ResultSet(searchers, postingLists, start, reverse, fields, limit, pageSize))
     except BaseException, e:
         if not isinstance(e, SearcherError):
             logger.exception(e)
@@ -249,3 +441,53 @@ def searchIndices(indices, query, period, lastId=None, reverse=False, fields=Non
         for postingList in postingLists: postingList.close()
         for searcher in searchers: searcher.close()
         raise
+
+def countIndices(indices, query, period, groupBy=None):
+    """
+    Count the events in the specified indices matching the specified query.
+
+    :param indices: A list of indices to search.
+    :type indices: A list of objects implementing :class:`terane.bier.index.IIndex`
+    :param query: The programmatic query to use for searching the indices.
+    :type query: An object implementing :class:`terane.bier.searching.IQuery`
+    :param period: The period within which the search is constrained.
+    :type period: :class:`terane.bier.searching.Period`
+    :param groupBy: If not None, then also count the matching events containing
+      each term of the field with this name.
+    :type groupBy: unicode or None
+    :returns: A CooperativeTask which contains a Deferred and manages the count task.
+    :rtype: :class:`twisted.internet.task.CooperativeTask`
+    """
+    start = time.time()
+    startId, endId = period.getRange()
+    try:
+        searches = []
+        for index in indices:
+            if not IIndex.providedBy(index):
+                raise TypeError("index does not implement IIndex")
+            try:
+                _query = plans.getPlan(query, index)
+            except NotImplementedError, e:
+                raise SearcherError(str(e))
+            logger.debug("optimized query for index '%s': %s" % (index.name,str(_query)))
+            # if the query optimized out entirely, then skip to the next index
+            if _query == None:
+                continue
+            # if the index doesn't contain the field, then none of its events
+            # are counted in any group
+            groupField = None
+            if groupBy != None:
+                try:
+                    groupField = index.getSchema().getField(groupBy, None)
+                except KeyError:
+                    pass
+            searcher = index.newSearcher()
+            if not ISearcher.providedBy(searcher):
+                raise TypeError("searcher does not implement ISearcher")
+            searches.append((searcher, _query, groupField))
+        return cooperate(CountSet(searches, startId, endId, start))
+    except BaseException, e:
+        if not isinstance(e, SearcherError):
+            logger.exception(e)
+        for searcher,plan,groupField in searches: searcher.close()
+        raise
@@ -24,6 +24,49 @@ logger = getLogger('terane.bier.writing')
 class WriterError(Exception):
     pass
 
+def _writeEvent(writer, schema, event):
+    """
+    Write the postings and the stored fields of a single event using the
+    specified writer.  The writer must already be in a transaction.
+
+    :returns: The EVID of the new event.
+    :rtype: :class:`terane.bier.evid.EVID`
+    """
+    # create a new event identifier
+    evid = EVID.fromEvent(event)
+    # process the value of each field in the event
+    fields = {}
+    for fieldname, fieldtype, value in event:
+        if not schema.hasField(fieldname, fieldtype):
+            schema.addField(fieldname, fieldtype)
+        field = schema.getField(fieldname, fieldtype)
+        # update the field with the event value
+        for term,meta in field.parseValue(value):
+            writer.newPosting(field, term, evid, meta)
+        fields[fieldname] = value
+    # store the document data
+    writer.newEvent(evid, fields)
+    return evid
+
+def eventTerms(schema, event):
+    """
+    Returns the terms which are indexed for the specified event.  Every field
+    in the event must already be present in the schema.
+
+    :param schema: The schema of the index the event was written to.
+    :type schema: An object implementing :class:`terane.bier.interfaces.ISchema`
+    :param event: The event.
+    :type event: :class:`terane.bier.event.Event`
+    :returns: A dict mapping (fieldname, fieldtype, term) tuples to the term metadata.
+    :rtype: dict
+    """
+    terms = {}
+    for fieldname, fieldtype, value in event:
+        field = schema.getField(fieldname, fieldtype)
+        for term,meta in field.parseValue(value):
+            terms[(field.fieldname, field.fieldtype, term)] = meta
+    return terms
+
 def writeEventToIndex(event, index):
     """
 
@@ -34,6 +77,22 @@ def writeEventToIndex(event, index):
     :returns: The EVID of the new event.
     :rtype: :class:`terane.bier.evid.EVID`
     """
+    return writeEventsToIndex([event], index)[0]
+
+def writeEventsToIndex(events, index):
+    """
+    Write a batch of events to the index.  All of the events are written
+    within a single writer transaction, so either every event in the batch
+    is stored or none of them are.
+
+    :param events: The events to write.
+    :type events: list
+    :param index: The index to write the events to.
+    :type index: An object implementing :class:`terane.bier.interfaces.IIndex`
+    :returns: A list containing the EVID of each new event, in the same order
+      as the supplied events.
+    :rtype: list
+    """
     # verify that the index provides the appropriate interface
     if not IIndex.providedBy(index):
         raise TypeError("index does not implement IIndex")
@@ -50,24 +109,11 @@ def writeEventToIndex(event, index):
 
     # update the index in the context of a writer
     try:   
-        # create a new event identifier
-        evid = EVID.fromEvent(event)
-        # process the value of each field in the event
-        fields = {}
-        for fieldname, fieldtype, value in event:
-            if not schema.hasField(fieldname, fieldtype):
-                schema.addField(fieldname, fieldtype)
-            field = schema.getField(fieldname, fieldtype)
-            # update the field with the event value
-            for term,meta in field.parseValue(value):
-                writer.newPosting(field, term, evid, meta)
-            fields[fieldname] = value
-        # store the document data
-        writer.newEvent(evid, fields)
+        evids = [_writeEvent(writer, schema, event) for event in events]
     # if an exception was raised, then abort the transaction
     except:
         writer.abort()
         raise
-    # otherwise commit the transaction and return the event id
+    # otherwise commit the transaction and return the event ids
     writer.commit()
-    return evid
+    return evids
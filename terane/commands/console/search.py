@@ -29,6 +29,10 @@ from terane.loggers import getLogger
 logger = getLogger('terane.commands.console.search')
 
 class Searcher(Window):
+
+    # the number of results retrieved from the server at a time
+    PAGE_SIZE = 100
+
     def __init__(self, args):
         # configure the searcher
         title = "Search results for '%s'" % args
@@ -37,7 +41,9 @@ class Searcher(Window):
         self._url = "http://%s/XMLRPC" % console.host
         self._user = console.username
         self._pass = console.password
+        self._proxy = None
         self._deferred = None
+        self._cursor = None
         Window.__init__(self, title, self._results)
 
     def startService(self):
@@ -46,22 +52,42 @@ class Searcher(Window):
         self.reload()
 
     def stopService(self):
+        self._cancel()
+        logger.debug("stopped search")
+        Window.stopService(self)
+
+    def _cancel(self):
+        """
+        Cancel the running search, and discard the cursor if the server is
+        holding more results.
+        """
         if self._deferred != None:
             self._deferred.cancel()
         self._deferred = None
-        logger.debug("stopped search")
-        Window.stopService(self)
+        if self._cursor != None:
+            self._proxy.callRemote('closeCursor', self._cursor).addErrback(lambda failure: None)
+        self._cursor = None
 
     @useMainThread
-    def _getResult(self, results):
+    def _getResult(self, result):
         """
-        Append each search result into the ResultsListbox.
+        Append each page of search results into the ResultsListbox, then fetch
+        the next page if there are more results.
         """
         try:
-            self._meta = results.pop(0)
-            for evid,event in results:
-                self._results.append(EVID.fromString(evid), event)
+            self._meta = result['meta']
+            for evid,defaultfield,defaultvalue,fields in result['data']:
+                event = dict(fields)
+                event['default'] = defaultvalue
+                self._results.append(EVID(*evid), event)
             console.redraw()
+            self._cursor = self._meta.get('cursor', None)
+            if self._cursor != None:
+                self._deferred = self._proxy.callRemote('fetchMore', self._cursor)
+                self._deferred.addCallback(self._getResult)
+                self._deferred.addErrback(self._getError)
+            else:
+                self._deferred = None
         except Exception, e:
             logger.exception(e)
 
@@ -85,11 +111,11 @@ class Searcher(Window):
         logger.debug(errtext)
 
     def reload(self):
-        if self._deferred != None:
-            self._deferred.cancel()
+        self._cancel()
         self._results.clear()
-        proxy = Proxy(self._url, user=self._user, password=self._pass, allowNone=True)
-        self._deferred = proxy.callRemote('iter', self._query)
+        self._proxy = Proxy(self._url, user=self._user, password=self._pass, allowNone=True)
+        self._deferred = self._proxy.callRemote('iterEvents', self._query, None, None,
+            console.scrollback, False, None, self.PAGE_SIZE)
         self._deferred.addCallback(self._getResult)
         self._deferred.addErrback(self._getError)
         logger.debug("searching with query '%s'" % self._query)
@@ -46,6 +46,9 @@ def search_main():
         settings.addOption("l", "limit", "search", "limit",
             help="Display the first LIMIT results", metavar="LIMIT"
             )
+        settings.addOption('', "page-size", "search", "page size",
+            help="Retrieve results from the server SIZE at a time", metavar="SIZE"
+            )
         settings.addOption("f", "fields", "search", "display fields",
             help="Display only the specified FIELDS (comma-separated)", metavar="FIELDS"
             )
@@ -37,6 +37,7 @@ class Searcher(object):
         if section.getBoolean("prompt password", False):
             self.password = getpass("Password: ")
         self.limit = section.getInt("limit", 100)
+        self.pageSize = section.getInt("page size", 100)
         self.reverse = section.getBoolean("display reverse", False)
         self.longfmt = section.getBoolean("long format", False)
         self.indices = section.getList(str, "use indices", None)
@@ -55,10 +56,13 @@ class Searcher(object):
             startLogging(None)
 
     def run(self):
-        proxy = Proxy("http://%s/XMLRPC" % self.host, user=self.username,
+        self._proxy = Proxy("http://%s/XMLRPC" % self.host, user=self.username,
             password=self.password, allowNone=True)
-        deferred = proxy.callRemote('iterEvents', self.query, None, self.indices,
-            self.limit, self.reverse, self.fields)
+        self._count = 0
+        self._runtime = 0.0
+        pageSize = self.pageSize if self.pageSize > 0 else None
+        deferred = self._proxy.callRemote('iterEvents', self.query, None, self.indices,
+            self.limit, self.reverse, self.fields, pageSize)
         deferred.addCallback(self.printResult)
         deferred.addErrback(self.printError)
         reactor.run()
@@ -66,21 +70,30 @@ class Searcher(object):
 
     def printResult(self, result):
         logger.debug("XMLRPC result: %s" % pformat(result))
-        if len(result) > 0:
-            meta = result['meta']
-            data = result['data']
-            for evid,defaultfield,defaultvalue,fields in data:
-                ts = datetime.datetime.fromtimestamp(evid[0], dateutil.tz.tzutc())
-                if self.tz:
-                    ts = ts.astimezone(self.tz)
-                print "%s: %s" % (ts.strftime("%d %b %Y %H:%M:%S %Z"), defaultvalue)
-                if self.longfmt:
-                    for fieldname,value in sorted(fields.items(), key=lambda x: x[0]):
-                        if self.fields and fieldname not in self.fields:
-                            continue
-                        print "\t%s=%s" % (fieldname,value)
+        meta = result['meta']
+        data = result['data']
+        # print each page of results as it arrives
+        for evid,defaultfield,defaultvalue,fields in data:
+            ts = datetime.datetime.fromtimestamp(evid[0], dateutil.tz.tzutc())
+            if self.tz:
+                ts = ts.astimezone(self.tz)
+            print "%s: %s" % (ts.strftime("%d %b %Y %H:%M:%S %Z"), defaultvalue)
+            if self.longfmt:
+                for fieldname,value in sorted(fields.items(), key=lambda x: x[0]):
+                    if self.fields and fieldname not in self.fields:
+                        continue
+                    print "\t%s=%s" % (fieldname,value)
+        self._count += len(data)
+        self._runtime += meta['runtime']
+        # if there are more results, then fetch the next page
+        if meta.get('cursor', None) != None:
+            deferred = self._proxy.callRemote('fetchMore', meta['cursor'])
+            deferred.addCallback(self.printResult)
+            deferred.addErrback(self.printError)
+            return
+        if self._count > 0:
             print ""
-            print "found %i matches in %f seconds." % (len(data), meta['runtime'])
+            print "found %i matches in %f seconds." % (self._count, self._runtime)
         else:
             print "no matches found."
         reactor.stop()
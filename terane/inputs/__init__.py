@@ -15,9 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
+from zope.interface import implements
 from twisted.application.service import IService, Service
 from terane.plugins import ILoadable
-from terane.signals import Signal
+from terane.signals import Signal, ICopyable
 from terane.bier.event import Event
 
 class IInput(IService, ILoadable):
@@ -28,6 +29,25 @@ class IInput(IService, ILoadable):
     def getDispatcher():
         "Return an Dispatcher which the input uses to signal new events."
 
+class ReceivedEvents(object):
+    """
+    A batch of events received by an input, as signaled by the dispatcher of
+    the input.  Emitting a whole batch at once lets a route reconnect to the
+    dispatcher and schedule filtering once per batch, rather than per event.
+    """
+
+    implements(ICopyable)
+
+    def __init__(self, events):
+        """
+        :param events: The received events.
+        :type events: list
+        """
+        self.events = events
+
+    def copy(self):
+        return ReceivedEvents([event.copy() for event in self.events])
+
 class Input(Service):
     """
     The Input base implementation.
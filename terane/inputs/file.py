@@ -15,19 +15,404 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, sys, socket
+import os, sys, socket, time, glob, errno
+from collections import OrderedDict
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred
+from twisted.internet.task import cooperate, LoopingCall, TaskStopped
+from twisted.python.filepath import FilePath
 from zope.interface import implements
 from terane.plugins import Plugin, IPlugin
-from terane.inputs import Input, IInput
+from terane.inputs import Input, IInput, ReceivedEvents
 from terane.registry import getRegistry
 from terane.signals import Signal
+from terane.settings import ConfigureError
 from terane.bier.event import Contract, Assertion
 from terane.loggers import getLogger
 
+try:
+    from twisted.internet import inotify
+except ImportError:
+    inotify = None
+
 logger = getLogger('terane.inputs.file')
 
+class FileNotifier(object):
+    """
+    FileNotifier shares a single inotify instance between every FileInput, and
+    calls back each input watching a file when the file is modified, moved,
+    replaced or deleted.
+    """
+
+    def __init__(self):
+        self._inotify = None
+        self._callbacks = {}
+
+    def watch(self, path, callback):
+        """
+        Watch the file at path.  If the path is already watched, then the watch
+        is replaced, so it follows the file currently at path.
+
+        :param path: The path of the file to watch.
+        :type path: str
+        :param callback: A callable which receives the inotify event mask.
+        :type callback: callable
+        :raises Exception: inotify is not available, or the file couldn't be watched.
+        """
+        if inotify == None:
+            raise Exception("inotify is not available")
+        if self._inotify == None:
+            self._inotify = inotify.INotify()
+            self._inotify.startReading()
+        filepath = FilePath(path)
+        try:
+            self._inotify.ignore(filepath)
+        except KeyError:
+            pass
+        # IN_ATTRIB catches the link count changing when the file is replaced
+        mask = inotify.IN_MODIFY | inotify.IN_ATTRIB | inotify.IN_MOVE_SELF | inotify.IN_DELETE_SELF
+        self._inotify.watch(filepath, mask, callbacks=[self._notify])
+        callbacks = self._callbacks.setdefault(filepath.path, [])
+        if not callback in callbacks:
+            callbacks.append(callback)
+
+    def unwatch(self, path, callback):
+        """
+        Stop calling back the callback when the file at path changes.
+
+        :param path: The path of the watched file.
+        :type path: str
+        :param callback: The callback passed to watch().
+        :type callback: callable
+        """
+        if inotify == None:
+            return
+        filepath = FilePath(path)
+        callbacks = self._callbacks.get(filepath.path, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if len(callbacks) == 0:
+            self._callbacks.pop(filepath.path, None)
+            if self._inotify != None:
+                try:
+                    self._inotify.ignore(filepath)
+                except KeyError:
+                    pass
+        # release the inotify instance when nothing is watched
+        if len(self._callbacks) == 0 and self._inotify != None:
+            self._inotify.loseConnection()
+            self._inotify = None
+
+    def _notify(self, ignored, filepath, mask):
+        logger.trace("inotify event %s on %s" % (inotify.humanReadableMask(mask), filepath.path))
+        for callback in list(self._callbacks.get(filepath.path, [])):
+            callback(mask)
+
+notifier = FileNotifier()
+
+class Checkpoints(object):
+    """
+    Checkpoints stores the read position of each tailed file in a checkpoint
+    file, keyed by the device and inode of the file, so an input can resume
+    reading where it stopped after the server is restarted.
+    """
+
+    def __init__(self, name, path):
+        """
+        :param name: The name of the input, used for logging.
+        :type name: str
+        :param path: The path of the checkpoint file.
+        :type path: str
+        """
+        self.name = name
+        self.path = path
+        self._positions = {}
+        self._paths = set()
+        self._saved = {}
+        self.loaded = False
+
+    def load(self):
+        """
+        Load the checkpoints from the checkpoint file.  If the checkpoint file
+        exists, then self.loaded is set to True.
+        """
+        self._positions = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.loaded = True
+                for line in f:
+                    try:
+                        dev,ino,position,path = line.rstrip('\n').split(' ', 3)
+                        self._positions[(int(dev),int(ino))] = (int(position),path)
+                    except ValueError:
+                        logger.warning("[input:%s] ignoring invalid checkpoint '%s'" % (self.name,line.strip()))
+            logger.debug("[input:%s] loaded %i checkpoints from %s" % (self.name,len(self._positions),self.path))
+        except (IOError,OSError), e:
+            if e.errno != errno.ENOENT:
+                logger.warning("[input:%s] failed to load checkpoints: %s" % (self.name,e.strerror))
+        self._paths = set([path for position,path in self._positions.values()])
+        self._saved = dict(self._positions)
+
+    def getPosition(self, path, stats):
+        """
+        Return the checkpointed position of the file with the specified stats.
+        If there is no checkpoint for the file, but there is one for a different
+        file at the same path, then the file was replaced while the input was
+        stopped, so it is read from the beginning.
+
+        :param path: The path of the file.
+        :type path: str
+        :param stats: The stats of the file.
+        :type stats: posix.stat_result
+        :returns: The position to resume reading from, or None if the file was
+          not checkpointed.
+        :rtype: int or None
+        """
+        checkpoint = self._positions.get((stats.st_dev,stats.st_ino))
+        if checkpoint != None:
+            return checkpoint[0]
+        if path in self._paths:
+            return 0
+        return None
+
+    def save(self, files):
+        """
+        Write the positions of the specified files to the checkpoint file.
+        Checkpoints for files which aren't open yet are kept as long as their
+        path still refers to the same file, and the rest are discarded.  The
+        file is only written if a position changed, and is replaced atomically
+        so a crash never leaves a partially written checkpoint file.
+
+        :param files: The files to checkpoint.
+        :type files: iterable of :class:`terane.inputs.file.TailedFile`
+        """
+        positions = {}
+        for tailed in files:
+            if tailed.prevstats != None:
+                key = (tailed.prevstats.st_dev,tailed.prevstats.st_ino)
+                positions[key] = (tailed.position,tailed.path)
+        for key,(position,path) in self._positions.items():
+            if key in positions:
+                continue
+            try:
+                stats = os.stat(path)
+                if (stats.st_dev,stats.st_ino) == key:
+                    positions[key] = (position,path)
+            except (IOError,OSError):
+                pass
+        self._positions = positions
+        if positions == self._saved:
+            return
+        try:
+            tmppath = self.path + '.tmp'
+            with open(tmppath, 'w') as f:
+                for (dev,ino),(position,path) in sorted(positions.items()):
+                    f.write("%i %i %i %s\n" % (dev,ino,position,path))
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmppath, self.path)
+            self._saved = positions
+            logger.trace("[input:%s] saved %i checkpoints" % (self.name,len(positions)))
+        except (IOError,OSError), e:
+            logger.warning("[input:%s] failed to save checkpoints: %s" % (self.name,e.strerror))
+
+class TailedFile(object):
+    """
+    TailedFile tracks the state of a single tailed file: the open file object,
+    the file statistics from the last check, and the position of the next byte
+    to read.  The file may be closed and reopened without losing its position,
+    as long as the path still refers to the same file.
+    """
+
+    def __init__(self, name, path, linemax, write, fromEnd=True, checkpoints=None):
+        """
+        :param name: The name of the input tailing the file, used for logging.
+        :type name: str
+        :param path: The path of the file.
+        :type path: str
+        :param linemax: The maximum length of a single line, in bytes.
+        :type linemax: int
+        :param write: A callable which receives a list of the lines read in
+          each pass over the file.
+        :type write: callable
+        :param fromEnd: If True, then start reading from the end of the file the
+          first time it is opened, otherwise start from the beginning.
+        :type fromEnd: bool
+        :param checkpoints: If specified, then resume reading from the
+          checkpointed position the first time the file is opened.
+        :type checkpoints: :class:`terane.inputs.file.Checkpoints`
+        """
+        self.name = name
+        self.path = path
+        self.file = None
+        self.prevstats = None
+        self.position = None
+        self._linemax = linemax
+        self._write = write
+        self._fromEnd = fromEnd
+        self._checkpoints = checkpoints
+        self._skipcount = 0
+        self._errno = None
+
+    def _error(self, errno, errstr):
+        if errno != self._errno:
+            logger.warning("[input:%s] failed to tail %s: %s" % (self.name,self.path,errstr))
+            self._errno = errno
+
+    def open(self):
+        """
+        Open the file at self.path.  If the path refers to the same file as
+        the last time it was open, then resume reading from the saved position.
+        If the file was rotated, then start reading from the beginning of the
+        new file.
+
+        :returns: True if the file was opened, otherwise False.
+        :rtype: bool
+        """
+        try:
+            logger.trace("[input:%s] opening %s" % (self.name,self.path))
+            f = open(self.path, 'r')
+            currstats = os.fstat(f.fileno())
+        except (IOError,OSError), (errno, errstr):
+            self._error(errno, errstr)
+            return False
+        prevstats = self.prevstats
+        # if this is the first file open, then resume from the checkpoint if
+        # there is one, otherwise start reading from the end of the file,
+        # unless we were asked to read the whole file
+        if prevstats == None:
+            position = None
+            if self._checkpoints != None:
+                position = self._checkpoints.getPosition(self.path, currstats)
+            if position != None:
+                logger.debug("[input:%s] resuming %s at position %i" % (self.name,self.path,position))
+                self.position = position
+            elif self._fromEnd == True:
+                self.position = currstats.st_size
+            else:
+                self.position = 0
+            self._skipcount = 0
+        # if the file was rotated, start reading from the beginning of the file
+        elif prevstats.st_dev != currstats.st_dev or prevstats.st_ino != currstats.st_ino:
+            self.position = 0
+            self._skipcount = 0
+        self.file = f
+        self.prevstats = currstats
+        return True
+
+    def close(self):
+        """
+        Close the file, keeping the position so reading can resume when the
+        file is reopened.
+        """
+        if self.file:
+            self.file.close()
+        self.file = None
+
+    def tail(self, loopchunk):
+        """
+        Read new lines from the open file, passing the complete lines to the
+        write callback as a list.  If the file was rotated, then the remainder of the
+        old file is read and self.file is set to None, so the new file is
+        opened on the next call to open().
+
+        :param loopchunk: The maximum number of bytes to read.
+        :type loopchunk: int
+        :returns: True if there is more data to read immediately, otherwise False.
+        :rtype: bool
+        """
+        # get the current file statistics
+        try:
+            logger.trace("[input:%s] checking %s for modification" % (self.name,self.path))
+            _currstats = os.stat(self.path)
+        except (IOError,OSError), (errno, errstr):
+            self._error(errno, errstr)
+            return False
+
+        # check if the file inode and/or underlying block device changed
+        f = self.file
+        try:
+            if self.prevstats.st_dev != _currstats.st_dev:
+                raise Exception("[input:%s] vfs device changed" % self.name)
+            if self.prevstats.st_ino != _currstats.st_ino:
+                raise Exception("[input:%s] vfs inode changed" % self.name)
+        except Exception, e:
+            logger.info(str(e))
+            _currstats = os.fstat(f.fileno())
+            self.file = None
+            
+        # check if the file has shrunk
+        if self.position > _currstats.st_size:
+            logger.info("[input:%s] file shrank by %i bytes" %
+                (self.name, self.position - _currstats.st_size))
+            # reset position to the new end of the file
+            self.position = _currstats.st_size
+            return False
+
+        # calculate the total bytes available to read
+        toread = _currstats.st_size - self.position
+        # calculate the bytes we will read this loop iteration
+        if toread > loopchunk:
+            toread = loopchunk
+            loopimmediately = True
+        else:
+            loopimmediately = False
+        # read the whole chunk with a single system call.  we don't read
+        # through the file object, so its buffer never holds stale data.
+        fd = f.fileno()
+        os.lseek(fd, self.position, os.SEEK_SET)
+        data = os.read(fd, toread)
+        # split the chunk into lines in a single pass
+        lines = []
+        linemax = self._linemax
+        start = 0
+        end = len(data)
+        while start < end:
+            newline = data.find('\n', start, start + linemax)
+            # if the line is newline-terminated
+            if newline >= 0:
+                line = data[start:newline + 1]
+                start = newline + 1
+                # if we weren't ignoring the current line, then write it
+                if self._skipcount == 0:
+                    lines.append(line)
+                else:
+                    self._skipcount += len(line)
+                    logger.debug("[input:%s] dropped long line (%i bytes)" %
+                        (self.name,self._skipcount))
+                    # we found the start of the new event, so stop ignoring data
+                    self._skipcount = 0
+            # the line exceeds the maximum acceptable length for an event.
+            # we enable ignore mode (if its not already enabled) by adding
+            # the length of the line to _skipcount.  data will thus be dropped
+            # until we reach the next newline.
+            elif end - start >= linemax:
+                self._skipcount += linemax
+                start += linemax
+            # we have reached the end of the data, and the last line did not
+            # end with a newline.  if we switched to reading from a new file
+            # (e.g. the file was rotated), and we are not currently in ignore
+            # mode due to a long line, then we consider this data a full event
+            # and write it.  if we are still in ignore mode, then the data is
+            # dropped.  when we open the new file on the next call to open(),
+            # _skipcount is reset to 0.
+            elif self.file == None:
+                if self._skipcount == 0:
+                    lines.append(data[start:])
+                start = end
+            # otherwise the event has not been completely written to disk yet,
+            # so leave it to be read again on the next pass.
+            else:
+                break
+        # advance past the data we consumed
+        self.position += start
+        if len(lines) > 0:
+            self._write(lines)
+
+        # save the old file stats
+        self.prevstats = _currstats
+        return loopimmediately
+
 class FileInput(Input):
 
     implements(IInput)
@@ -39,11 +424,11 @@ class FileInput(Input):
         self._dispatcher = Signal()
         self._delayed = None
         self._deferred = None
-        self._file = None
-        self._prevstats = None
-        self._position = None
-        self._skipcount = 0
-        self._errno = None
+        self._tailed = None
+        self._checkpoints = None
+        self._checkpointer = None
+        self._watching = False
+        self._watched = False
         self._contract = Contract().sign() 
 
     def configure(self, section):
@@ -53,6 +438,8 @@ class FileInput(Input):
         logger.debug("[input:%s] path is %s" % (self.name,self._path))
         self._interval = section.getInt('polling interval', 5)
         logger.debug("[input:%s] polling interval is %i seconds" % (self.name,self._interval))
+        self._useInotify = section.getBoolean('use inotify', True)
+        logger.debug("[input:%s] use inotify is %s" % (self.name,self._useInotify))
         self._linemax = section.getInt('maximum line length', 1024 * 1024)
         logger.debug("[input:%s] maximum line length is %i bytes" % (self.name,self._linemax))
         self._loopchunk = section.getInt('loop chunk length', 1024 * 1024)
@@ -61,6 +448,13 @@ class FileInput(Input):
         if self._loopchunk < self._linemax:
             self._loopchunk = self._linemax
         logger.debug("[input:%s] loop chunk length is %i bytes" % (self.name,self._loopchunk))
+        self._checkpointfile = section.getPath('checkpoint file', None)
+        if self._checkpointfile != None:
+            logger.debug("[input:%s] checkpoint file is %s" % (self.name,self._checkpointfile))
+        self._checkpointinterval = section.getInt('checkpoint interval', 5)
+        if self._checkpointinterval < 1:
+            raise ConfigureError("[input:%s] checkpoint interval must be at least 1" % self.name)
+        logger.debug("[input:%s] checkpoint interval is %i seconds" % (self.name,self._checkpointinterval))
 
     def getContract(self):
         return self._contract
@@ -70,15 +464,25 @@ class FileInput(Input):
 
     def startService(self):
         Input.startService(self)
-        self._check()
-        self._schedule(False)
+        self._hostname = socket.gethostname()
+        if self._checkpointfile != None:
+            self._checkpoints = Checkpoints(self.name, self._checkpointfile)
+            self._checkpoints.load()
+            self._checkpointer = LoopingCall(self._saveCheckpoints)
+            self._checkpointer.start(self._checkpointinterval, False)
+        self._tailed = TailedFile(self.name, self._path, self._linemax,
+            self._write, checkpoints=self._checkpoints)
+        self._open()
+        # tail immediately, in case we are catching up from a checkpoint
+        self._schedule(True)
         logger.debug("[input:%s] started input" % self.name)
 
     def _schedule(self, value):
         """
         Schedule the next check of self._path for new data.  If value is True,
-        then schedule the next loop immediately, otherwise, pause for one loop
-        interval.
+        then schedule the next loop immediately.  Otherwise, if the file is
+        watched with inotify, then wait until the file changes, or else pause
+        for one loop interval.
 
         :param value: A boolean indicating whether or not to loop immediately.
         :type value: bool
@@ -91,10 +495,44 @@ class FileInput(Input):
         self._deferred.addErrback(self._scheduleError)
         if value == True:
             self._delayed = reactor.callLater(0.00000001, self._deferred.callback, None)
+        elif self._watching == True:
+            self._delayed = None
         else:
             self._delayed = reactor.callLater(self._interval, self._deferred.callback, None)
         logger.trace("[input:%s] rescheduled tail" % self.name)
 
+    def _watch(self):
+        """
+        Watch self._path with inotify, if it is available.  If the file can't be
+        watched, then fall back to polling.
+        """
+        if self._useInotify == False:
+            return
+        try:
+            notifier.watch(self._path, self._notified)
+            self._watching = True
+            self._watched = True
+            logger.trace("[input:%s] watching file with inotify" % self.name)
+        except Exception, e:
+            logger.debug("[input:%s] falling back to polling: %s" % (self.name,str(e)))
+            self._watching = False
+
+    def _notified(self, mask):
+        """
+        Called by the notifier when the watched file changes.  Schedules the
+        next tail immediately.  If the file was moved or deleted, then poll
+        until the file is reopened, since nothing is watching the new file yet.
+        """
+        if mask & (inotify.IN_MOVE_SELF | inotify.IN_DELETE_SELF):
+            logger.trace("[input:%s] watched file was moved or deleted" % self.name)
+            self._watching = False
+        if self._deferred == None:
+            return
+        if self._delayed == None:
+            self._delayed = reactor.callLater(0, self._deferred.callback, None)
+        elif self._delayed.active():
+            self._delayed.reset(0)
+
     def _tailError(self, failure):
         logger.debug("[input:%s] error tailing file: %s" % (self.name,str(failure)))
         self._schedule(False)
@@ -104,38 +542,15 @@ class FileInput(Input):
         logger.debug("[input:%s] error scheduling tail: %s" % (self.name,str(failure)))
         return failure
 
-    def _check(self):
+    def _open(self):
         """
-        Return file statistics about self._path.  If there was an error, None is
-        returned and self._errno is set.
-
-        :returns: A tuple with the file statistics, or None if there was an error.
-        :rtype: tuple or None
+        Open self._path, and watch it with inotify if it was opened.
         """
-        try:
-            logger.trace("[input:%s] checking for file modification" % self.name)
-            # open the file if necessary
-            if self._file == None:
-                self._file = open(self._path, 'r')
-                currstats = os.stat(self._path)
-                # if this is the first file open, then start reading from
-                # the end of the file
-                if self._prevstats == None:
-                    self._position = currstats.st_size
-                # otherwise start reading from the beginning of the file
-                else:
-                    self._position = 0
-                self._skipcount = 0
-                self._prevstats = currstats
-            # get the current file stats
-            else:
-                currstats = os.stat(self._path)
-            return currstats
-        except (IOError,OSError), (errno, errstr):
-            if errno != self._errno:
-                logger.warning("[input:%s] failed to tail file: %s" % (self.name,errstr))
-                self._errno = errno
-            return None
+        if self._tailed.open():
+            self._watch()
+
+    def _saveCheckpoints(self):
+        self._checkpoints.save([self._tailed])
 
     def _tail(self, unused):
         """
@@ -147,129 +562,294 @@ class FileInput(Input):
           False to indicate we should pause for one loop interval.
         :rtype: bool
         """
-        # get the current file statistics
-        _currstats = self._check()
-        if _currstats == None:
-            return False
+        # open the file if necessary
+        if self._tailed.file == None:
+            self._open()
+            if self._tailed.file == None:
+                return False
+        loopimmediately = self._tailed.tail(self._loopchunk)
+        # if the file was rotated, then the watch follows the old file, so
+        # poll until the new file is opened
+        if self._tailed.file == None:
+            self._watching = False
+        return loopimmediately
 
-        # check if the file inode and/or underlying block device changed
-        f = self._file
-        try:
-            if self._prevstats.st_dev != _currstats.st_dev:
-                raise Exception("[input:%s] vfs device changed" % self.name)
-            if self._prevstats.st_ino != _currstats.st_ino:
-                raise Exception("[input:%s] vfs inode changed" % self.name)
-        except Exception, e:
-            logger.info(str(e))
-            _currstats = os.fstat(self._file.fileno())
-            self._file = None
-            
-        # check if the file has shrunk
-        if self._position > _currstats.st_size:
-            logger.info("[input:%s] file shrank by %i bytes" %
-                (self.name, self._position - _currstats.st_size))
-            # reset position to the new end of the file
-            self._position = _currstats.st_size
-            return False
+    def _write(self, lines):
+        field_message = self._contract.field_message
+        field_hostname = self._contract.field_hostname
+        field_input = self._contract.field_input
+        events = []
+        for line in lines:
+            # ignore lines consisting entirely of whitespace
+            line = line.strip()
+            if line == '':
+                continue
+            logger.trace("[input:%s] received line: %s" % (self.name,line))
+            event = self._evfactory.makeEvent()
+            event[field_message] = line
+            event[field_hostname] = self._hostname
+            event[field_input] = self.name
+            events.append(event)
+        if len(events) > 0:
+            self._dispatcher.emitSignal(ReceivedEvents(events))
 
-        # calculate the total bytes available to read
-        toread = _currstats.st_size - self._position
-        # calculate the bytes we will read this loop iteration
-        if toread > self._loopchunk:
-            toread = self._loopchunk
-            loopimmediately = True
+    def stopService(self):
+        if not self.running:
+            return
+        if self._delayed and self._delayed.active():
+            self._delayed.cancel()
+        self._delayed = None
+        # only unwatch if _watch() registered a watch
+        if self._watched == True:
+            notifier.unwatch(self._path, self._notified)
+        self._watched = False
+        self._watching = False
+        if self._checkpointer != None:
+            self._checkpointer.stop()
+            self._checkpointer = None
+            self._saveCheckpoints()
+        self._tailed.close()
+        self._tailed = None
+        self._checkpoints = None
+        self._deferred = None
+        Input.stopService(self)
+        logger.debug("[input:%s] stopped input" % self.name)
+
+class GlobInput(Input):
+    """
+    GlobInput tails every file matching a glob pattern.  All of the files share
+    a single timer and read loop, and at most 'maximum open files' files are
+    kept open at once.  Files which have not been read recently are closed,
+    and their positions are saved so reading resumes when they grow again.
+    """
+
+    implements(IInput)
+
+    def __init__(self, plugin, name, evfactory):
+        self._plugin = plugin
+        self.setName(name)
+        self._evfactory = evfactory
+        self._dispatcher = Signal()
+        self._delayed = None
+        self._task = None
+        self._more = False
+        self._files = {}
+        self._opened = OrderedDict()
+        self._lastscan = None
+        self._checkpoints = None
+        self._checkpointer = None
+        self._contract = Contract().addAssertion(u'file', u'literal',
+            expects=False, guarantees=True, ephemeral=False).sign()
+
+    def configure(self, section):
+        self._glob = section.getString('file glob', None)
+        if self._glob == None:
+            raise ConfigureError("[input:%s] missing required parameter 'file glob'" % self.name)
+        logger.debug("[input:%s] glob is %s" % (self.name,self._glob))
+        self._interval = section.getInt('polling interval', 5)
+        logger.debug("[input:%s] polling interval is %i seconds" % (self.name,self._interval))
+        self._rescan = section.getInt('rescan interval', 30)
+        logger.debug("[input:%s] rescan interval is %i seconds" % (self.name,self._rescan))
+        self._maxopen = section.getInt('maximum open files', 64)
+        if self._maxopen < 1:
+            raise ConfigureError("[input:%s] maximum open files must be at least 1" % self.name)
+        logger.debug("[input:%s] maximum open files is %i" % (self.name,self._maxopen))
+        self._linemax = section.getInt('maximum line length', 1024 * 1024)
+        logger.debug("[input:%s] maximum line length is %i bytes" % (self.name,self._linemax))
+        self._loopchunk = section.getInt('loop chunk length', 1024 * 1024)
+        # loop chunk length has to be at least as big as maximum
+        # line length, otherwise we could lose data.
+        if self._loopchunk < self._linemax:
+            self._loopchunk = self._linemax
+        logger.debug("[input:%s] loop chunk length is %i bytes" % (self.name,self._loopchunk))
+        self._checkpointfile = section.getPath('checkpoint file', None)
+        if self._checkpointfile != None:
+            logger.debug("[input:%s] checkpoint file is %s" % (self.name,self._checkpointfile))
+        self._checkpointinterval = section.getInt('checkpoint interval', 5)
+        if self._checkpointinterval < 1:
+            raise ConfigureError("[input:%s] checkpoint interval must be at least 1" % self.name)
+        logger.debug("[input:%s] checkpoint interval is %i seconds" % (self.name,self._checkpointinterval))
+
+    def getContract(self):
+        return self._contract
+
+    def getDispatcher(self):
+        return self._dispatcher
+
+    def startService(self):
+        Input.startService(self)
+        self._hostname = socket.gethostname()
+        if self._checkpointfile != None:
+            self._checkpoints = Checkpoints(self.name, self._checkpointfile)
+            self._checkpoints.load()
+            self._checkpointer = LoopingCall(self._saveCheckpoints)
+            self._checkpointer.start(self._checkpointinterval, False)
+        self._loop()
+        logger.debug("[input:%s] started input" % self.name)
+
+    def _schedule(self, value):
+        """
+        Schedule the next pass over the matched files.  If value is True, then
+        schedule the next pass immediately, otherwise, pause for one loop interval.
+
+        :param value: A boolean indicating whether or not to loop immediately.
+        :type value: bool
+        """
+        if self._delayed and self._delayed.active():
+            raise Exception("[input:%s] attempted to reschedule twice" % self.name)
+        if value == True:
+            self._delayed = reactor.callLater(0.00000001, self._loop)
         else:
-            loopimmediately = False
-        # seek to the next byte to read
-        f.seek(self._position)
-        # loop reading lines until EOF or incomplete line
-        while True:
-        
-            # save the current position as the start of a new line
-            self._position = f.tell()
-            # if we have no more bytes to read, then break from the loop
-            if toread == 0:
-                break
+            self._delayed = reactor.callLater(self._interval, self._loop)
+        logger.trace("[input:%s] rescheduled tail" % self.name)
 
-            # calculate the amount of bytes to read for this line
-            if toread > self._linemax:
-                bufsize = self._linemax
-            else:
-                bufsize = toread
-            line = f.readline(bufsize)
-            toread -= len(line)
-
-            # check if the line is incomplete (not newline-terminated).
-            # this could occur for three reasons:
-            #
-            # 1. we have reached the end of the file, and the last line did
-            #    not end with a newline.  if we switched to reading from a new
-            #    file (e.g. the file was rotated), and we are not currently in
-            #    ignore mode (_skipcount is greater than 0) due to a long line,
-            #    then we consider this data a full event and write it.  if we
-            #    are still in ignore mode, then the data is dropped.  when we
-            #    open the new file on the next iteration of _tail(), _skipcount
-            #    is reset to 0.
-            # 2. the line exceeds the maximum acceptable length for an event.
-            #    we enable ignore mode (if its not already enabled) by adding
-            #    the length of the line to _skipcount.  data will thus be dropped
-            #    until we reach the next newline.
-            # 3. we have reached the end of the file, and the last line did
-            #    not end with a newline.  if we are still reading from this
-            #    file (self._file is not None), then we return to the top of the
-            #    loop without writing data.
-            if not line.endswith('\n'):
-                # case 1: we switched to reading from a new file
-                if self._file == None and self._skipcount == 0:
-                    self._write(line)
-                # case 2: line exceeds _linemax, drop data until the next newline
-                elif len(line) == self._linemax:
-                    self._skipcount += len(line)
-                # case 3: event has not been completely written to disk yet
-                else:
-                    continue
-            # if the line is newline-terminated
-            else:
-                # if we weren't ignoring the current line, then write it
-                if self._skipcount == 0:
-                    self._write(line)
-                else:
-                    self._skipcount += len(line)
-                    logger.debug("[input:%s] dropped long line (%i bytes)" %
-                        (self.name,self._skipcount))
-                    # we found the start of the new event, so stop ignoring data
-                    self._skipcount = 0
+    def _loop(self):
+        """
+        Rescan the glob if the rescan interval has passed, then tail each of
+        the matched files cooperatively.
+        """
+        now = time.time()
+        if self._lastscan == None or now - self._lastscan >= self._rescan:
+            self._scan()
+            self._lastscan = now
+        self._more = False
+        self._task = cooperate(self._tailFiles())
+        d = self._task.whenDone()
+        d.addCallbacks(self._loopDone, self._loopError)
 
-        # save the old file stats
-        self._prevstats = _currstats
-        return loopimmediately
+    def _loopDone(self, unused):
+        self._task = None
+        self._schedule(self._more)
 
-    def _write(self, line):
-        # ignore lines consisting entirely of whitespace
-        line = line.strip()
-        if line.isspace():
+    def _loopError(self, failure):
+        self._task = None
+        if failure.check(TaskStopped):
             return
-        logger.trace("[input:%s] received line: %s" % (self.name,line))
-        event = self._evfactory.makeEvent()
-        event[self._contract.field_message] = line
-        event[self._contract.field_hostname] = socket.gethostname()
-        event[self._contract.field_input] = self.name
-        self._dispatcher.emitSignal(event)
+        logger.debug("[input:%s] error tailing files: %s" % (self.name,str(failure)))
+        self._schedule(False)
+
+    def _scan(self):
+        """
+        Match the glob against the filesystem, starting to tail new files and
+        forgetting files which no longer exist.  Files which exist when the
+        input starts are read from the end, like FileInput, unless they were
+        checkpointed, while files which appear later are read from the beginning.
+        """
+        paths = set([path for path in glob.glob(self._glob) if os.path.isfile(path)])
+        # if the input was checkpointed before, then files without a
+        # checkpoint appeared while the input was stopped
+        fromEnd = self._lastscan == None
+        if self._checkpoints != None and self._checkpoints.loaded == True:
+            fromEnd = False
+        for path in paths.difference(self._files):
+            logger.debug("[input:%s] tailing %s" % (self.name,path))
+            write = lambda lines, path=path: self._write(lines, path)
+            self._files[path] = TailedFile(self.name, path, self._linemax,
+                write, fromEnd, self._checkpoints)
+        for path in set(self._files).difference(paths):
+            logger.debug("[input:%s] no longer tailing %s" % (self.name,path))
+            self._files.pop(path).close()
+            self._opened.pop(path, None)
+
+    def _saveCheckpoints(self):
+        self._checkpoints.save(self._files.values())
+
+    def _reopen(self, tailed):
+        """
+        Open a closed file if there is new data to read from it, first closing
+        the least recently read file if the maximum number of open files has
+        been reached.
+
+        :returns: True if the file was opened, otherwise False.
+        :rtype: bool
+        """
+        prevstats = tailed.prevstats
+        if prevstats != None:
+            try:
+                currstats = os.stat(tailed.path)
+            except (IOError,OSError):
+                return False
+            # don't spend a file descriptor on a file which hasn't changed
+            if (currstats.st_dev == prevstats.st_dev and currstats.st_ino == prevstats.st_ino
+              and currstats.st_size == tailed.position):
+                return False
+        while len(self._opened) >= self._maxopen:
+            path,lru = self._opened.popitem(last=False)
+            logger.trace("[input:%s] closing idle file %s" % (self.name,path))
+            lru.close()
+        if not tailed.open():
+            return False
+        self._opened[tailed.path] = tailed
+        return True
+
+    def _tailFiles(self):
+        """
+        Return a generator which tails each matched file, yielding after each
+        file so a large number of files doesn't block the reactor.
+        """
+        for path in sorted(self._files):
+            tailed = self._files.get(path)
+            if tailed == None:
+                continue
+            if tailed.file == None and not self._reopen(tailed):
+                yield None
+                continue
+            position = tailed.position
+            if tailed.tail(self._loopchunk):
+                self._more = True
+            # the file was rotated, and will be reopened on the next pass
+            if tailed.file == None:
+                del self._opened[path]
+            # move the file to the most recently read end of the open files
+            elif tailed.position != position:
+                self._opened[path] = self._opened.pop(path)
+            yield None
+
+    def _write(self, lines, path):
+        field_message = self._contract.field_message
+        field_hostname = self._contract.field_hostname
+        field_input = self._contract.field_input
+        field_file = self._contract.field_file
+        events = []
+        for line in lines:
+            # ignore lines consisting entirely of whitespace
+            line = line.strip()
+            if line == '':
+                continue
+            logger.trace("[input:%s] received line from %s: %s" % (self.name,path,line))
+            event = self._evfactory.makeEvent()
+            event[field_message] = line
+            event[field_hostname] = self._hostname
+            event[field_input] = self.name
+            event[field_file] = path
+            events.append(event)
+        if len(events) > 0:
+            self._dispatcher.emitSignal(ReceivedEvents(events))
 
     def stopService(self):
         if not self.running:
             return
         if self._delayed and self._delayed.active():
             self._delayed.cancel()
-        if self._file:
-            self._file.close()
-        self._file = None
-        self._prevstats = None
-        self._position = None
-        self._deferred = None
+        self._delayed = None
+        if self._task != None:
+            self._task.stop()
+        if self._checkpointer != None:
+            self._checkpointer.stop()
+            self._checkpointer = None
+            self._saveCheckpoints()
+        self._checkpoints = None
+        for tailed in self._files.values():
+            tailed.close()
+        self._files = {}
+        self._opened.clear()
+        self._lastscan = None
         Input.stopService(self)
         logger.debug("[input:%s] stopped input" % self.name)
 
 class FileInputPlugin(Plugin):
     implements(IPlugin)
-    components = [(FileInput, IInput, 'file')]
+    components = [
+        (FileInput, IInput, 'file'),
+        (GlobInput, IInput, 'glob'),
+        ]
@@ -129,9 +129,9 @@ class Logger(object):
         kwds = {'logger': self, 'level': level}
         msg(message, **kwds)
 
-    def exception(self, exception):
+    def exception(self, exception, level=DEBUG):
         type_, value_, traceback_ = sys.exc_info()
-        kwds = {'logger': self, 'level': DEBUG}
+        kwds = {'logger': self, 'level': level}
         err(exception, traceback.format_tb(traceback_), **kwds)
 
     def trace(self, message, **kwds):
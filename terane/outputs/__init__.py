@@ -16,8 +16,9 @@
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
 from twisted.application.service import IService, Service
-from zope.interface import Interface
+from zope.interface import Interface, implements
 from terane.plugins import ILoadable
+from terane.signals import ICopyable
 
 class IOutput(IService, ILoadable):
     def configure(section):
@@ -30,6 +31,36 @@ class IOutput(IService, ILoadable):
 class ISearchable(Interface):
     def getIndex():
         "Return the Index."
+    def getDispatcher():
+        "Return a Signal which the output uses to signal committed events."
+
+class CommittedEvents(object):
+    """
+    A batch of events which were committed to a searchable index, as signaled
+    by the dispatcher of an ISearchable output.  Receivers must not modify the
+    events, so the batch is shared between receivers rather than copied.
+    """
+
+    implements(ICopyable)
+
+    def __init__(self, name, index, evids, events):
+        """
+        :param name: The name of the index.
+        :type name: str
+        :param index: The index the events were committed to.
+        :type index: An object implementing :class:`terane.bier.interfaces.IIndex`
+        :param evids: The EVID of each event.
+        :type evids: list
+        :param events: The committed events.
+        :type events: list
+        """
+        self.name = name
+        self.index = index
+        self.evids = evids
+        self.events = events
+
+    def copy(self):
+        return self
 
 class Output(Service):
     """
@@ -17,15 +17,21 @@
 
 import os, fcntl
 from twisted.internet import reactor
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 from twisted.application.service import MultiService
 from zope.interface import implements
 from terane.plugins import Plugin, IPlugin
 from terane.bier.event import Contract
-from terane.bier.writing import writeEventToIndex
-from terane.outputs import Output, IOutput, ISearchable
+from terane.bier.writing import writeEventsToIndex
+from terane.outputs import Output, IOutput, ISearchable, CommittedEvents
 from terane.outputs.store.env import Env
 from terane.outputs.store.index import Index
 from terane.outputs.store.logfd import LogFD
+from terane.settings import ConfigureError
+from terane.signals import Signal
+from terane.stats import getStat
 from terane.loggers import getLogger
 
 logger = getLogger('terane.outputs.store')
@@ -39,7 +45,14 @@ class StoreOutput(Output):
         self.setName(name)
         self._fieldstore = fieldstore
         self._index = None
+        self._batch = []
+        self._delayed = None
+        self._threadpool = None
+        self._mergepool = None
+        self._merging = None
+        self._mergeChecked = None
         self._contract = Contract().sign()
+        self._dispatcher = Signal()
 
     def configure(self, section):
         self._indexName = section.getString("index name", self.name)
@@ -49,14 +62,56 @@ class StoreOutput(Output):
         self._segRotation = section.getInt("segment rotation policy", 0)
         self._segRetention = section.getInt("segment retention policy", 0)
         self._segOptimize = section.getBoolean("optimize segments", False)
+        self._blockSize = section.getInt("posting block size", 128)
+        if self._blockSize < 1:
+            raise ConfigureError("[output:%s] 'posting block size' must be greater than 0" % self.name)
+        self._batchSize = section.getInt("batch size", 1)
+        if self._batchSize < 1:
+            raise ConfigureError("[output:%s] 'batch size' must be greater than 0" % self.name)
+        self._batchLatency = section.getFloat("batch latency", 1.0)
+        if self._batchLatency < 0.0:
+            raise ConfigureError("[output:%s] 'batch latency' cannot be negative" % self.name)
+        self._threadedWrites = section.getBoolean("threaded writes", False)
+        self._mergeSegments = section.getBoolean("merge segments", False)
+        self._mergeFactor = section.getInt("merge factor", 10)
+        if self._mergeFactor < 2:
+            raise ConfigureError("[output:%s] 'merge factor' must be at least 2" % self.name)
+        # optimizing rewrites a whole segment, so it must not run in the reactor
+        if self._segOptimize and not self._threadedWrites and not self._mergeSegments:
+            raise ConfigureError("[output:%s] 'optimize segments' requires 'threaded writes' or 'merge segments'" % self.name)
+        self.batchcommits = getStat("terane.output.%s.batchcommits" % self.name, 0)
+        self.batchedevents = getStat("terane.output.%s.batchedevents" % self.name, 0)
+        self.mergedsegments = getStat("terane.output.%s.mergedsegments" % self.name, 0)
         
     def startService(self):
         self._index = Index(self._plugin._env, self._indexName, self._fieldstore)
         logger.debug("[output:%s] opened index '%s'" % (self.name,self._indexName))
+        # if threaded writes are enabled, then start the writer thread
+        if self._threadedWrites:
+            self._threadpool = ThreadPool(1, 1, "terane.output.%s.writer" % self.name)
+            self._threadpool.start()
+            logger.debug("[output:%s] started writer thread" % self.name)
+        # if segment merging is enabled, then start the merge thread
+        if self._mergeSegments:
+            self._mergepool = ThreadPool(1, 1, "terane.output.%s.merger" % self.name)
+            self._mergepool.start()
+            logger.debug("[output:%s] started merge thread" % self.name)
         Output.startService(self)
 
     def stopService(self):
         if self._index != None:
+            # write any events which are still waiting in the batch queue
+            self._flushBatch()
+            # wait for the writer thread to finish any queued batches
+            if self._threadpool != None:
+                self._threadpool.stop()
+                self._threadpool = None
+                logger.debug("[output:%s] stopped writer thread" % self.name)
+            # wait for any running merge to finish
+            if self._mergepool != None:
+                self._mergepool.stop()
+                self._mergepool = None
+                logger.debug("[output:%s] stopped merge thread" % self.name)
             self._index.close()
         logger.debug("[output:%s] closed index '%s'" % (self.name,self._indexName))
         self._index = None
@@ -69,14 +124,133 @@ class StoreOutput(Output):
         # if the output is not running, discard any received events
         if not self.running:
             return
-        # store the event in the index
-        writeEventToIndex(event, self._index)
-        # rotate the index segments if necessary
-        self._index.rotateSegments(self._segRotation, self._segRetention)
-    
+        # queue the event, and write out the batch if it is full
+        self._batch.append(event)
+        if len(self._batch) >= self._batchSize:
+            self._flushBatch()
+        # otherwise make sure the batch is written within the batch latency
+        elif self._delayed == None:
+            self._delayed = reactor.callLater(self._batchLatency, self._flushBatch)
+
+    def _flushBatch(self):
+        """
+        Write all queued events to the index in a single transaction.  If
+        threaded writes are enabled, then the batch is handed to the writer
+        thread.
+
+        :returns: A Deferred which fires with the list of EVIDs written, or
+          None if the batch queue was empty.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+        if self._delayed != None and self._delayed.active():
+            self._delayed.cancel()
+        self._delayed = None
+        if len(self._batch) == 0:
+            return None
+        events = self._batch
+        self._batch = []
+        if self._threadpool != None:
+            d = deferToThreadPool(reactor, self._threadpool, self._writeBatch, events)
+        else:
+            d = maybeDeferred(self._writeBatch, events)
+        d.addCallbacks(self._batchCommitted, self._batchFailed,
+            callbackArgs=(events,), errbackArgs=(len(events),))
+        return d
+
+    def _writeBatch(self, events):
+        """
+        Store the events in the index, then rotate the index segments if
+        necessary.  If threaded writes are enabled, then this method is run
+        in the writer thread.
+
+        :returns: A tuple containing the list of EVIDs written, and the sealed
+          segment if the index was rotated, otherwise None.
+        :rtype: tuple
+        """
+        evids = writeEventsToIndex(events, self._index)
+        sealed = self._index.rotateSegments(self._segRotation, self._segRetention)
+        return evids,sealed
+
+    def _batchCommitted(self, result, events):
+        evids,sealed = result
+        self.batchcommits += 1
+        self.batchedevents += len(evids)
+        logger.trace("[output:%s] committed batch of %i events" % (self.name,len(evids)))
+        # batches written by the writer thread are delivered through the reactor,
+        # so the output may have been stopped and the index closed since then
+        if self._index == None:
+            return evids
+        self._dispatcher.emitSignal(CommittedEvents(self.name, self._index, evids, events))
+        if sealed != None and self._segOptimize:
+            self._scheduleOptimize(sealed)
+        self._scheduleMerge()
+        return evids
+
+    def _batchFailed(self, failure, nevents):
+        logger.error("[output:%s] failed to write batch of %i events: %s" %
+            (self.name, nevents, failure.getErrorMessage()))
+
+    def _scheduleOptimize(self, segment):
+        """
+        Optimize the sealed segment in the merge thread, so it is never merged
+        while being optimized, or in the writer thread if merging is disabled.
+        """
+        if self._mergepool != None:
+            pool = self._mergepool
+        else:
+            pool = self._threadpool
+        d = deferToThreadPool(reactor, pool, self._index.optimizeSegment, segment, self._blockSize)
+        d.addErrback(self._optimizeFailed, segment)
+
+    def _optimizeFailed(self, failure, segment):
+        logger.error("[output:%s] failed to optimize segment %s: %s" %
+            (self.name, segment.fullName, failure.getErrorMessage()))
+
+    def _scheduleMerge(self):
+        """
+        If segment merging is enabled, then hand the index to the merge thread
+        to look for segments to merge.  The merge policy only needs to run
+        after the segment list changes, which is when the current segment
+        rotates or a merge completes.
+        """
+        if self._mergepool == None or self._index == None or self._merging != None:
+            return
+        if self._index._current is self._mergeChecked:
+            return
+        self._mergeChecked = self._index._current
+        self._merging = deferToThreadPool(reactor, self._mergepool, self._merge)
+        self._merging.addCallbacks(self._mergeCompleted, self._mergeFailed)
+
+    def _merge(self):
+        """
+        Merge a run of sealed segments, if the merge policy finds one.  This
+        method is run in the merge thread.
+        """
+        segments = self._index.findMerge(self._mergeFactor)
+        if segments == None:
+            return None
+        return self._index.mergeSegments(segments, self._segOptimize, self._blockSize)
+
+    def _mergeCompleted(self, merged):
+        self._merging = None
+        if merged != None:
+            self.mergedsegments += 1
+            logger.debug("[output:%s] merged segments into %s" % (self.name,merged.fullName))
+            # the merged segment may complete a run in the next tier
+            self._mergeChecked = None
+            self._scheduleMerge()
+
+    def _mergeFailed(self, failure):
+        self._merging = None
+        logger.error("[output:%s] failed to merge segments: %s" %
+            (self.name, failure.getErrorMessage()))
+
     def getIndex(self):
         return self._index
 
+    def getDispatcher(self):
+        return self._dispatcher
+
 class StoreOutputPlugin(Plugin):
 
     implements(IPlugin)
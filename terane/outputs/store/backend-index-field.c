@@ -49,7 +49,6 @@ terane_Index_get_field (terane_Index *self, PyObject *args)
 
     /* use the fieldname as key */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (fieldname, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* get the record */
@@ -78,7 +77,7 @@ terane_Index_get_field (terane_Index *self, PyObject *args)
     if (key.data)
         PyMem_Free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return fieldspec;
 }
 
@@ -118,7 +117,9 @@ terane_Index_add_field (terane_Index *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->schema->put (self->schema, txn->txn, &key, &data, DB_NOOVERWRITE);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
             /* increment the internal field count */
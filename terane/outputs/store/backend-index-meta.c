@@ -50,7 +50,6 @@ terane_Index_get_meta (terane_Index *self, PyObject *args)
 
     /* use the metadata name as the key */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (id, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* get the record */
@@ -79,7 +78,7 @@ terane_Index_get_meta (terane_Index *self, PyObject *args)
     if (key.data)
         PyMem_Free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return metadata;
 }
 
@@ -118,7 +117,9 @@ terane_Index_set_meta (terane_Index *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->metadata->put (self->metadata, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     /* db error, raise Exception */
     switch (dbret) {
         case 0:
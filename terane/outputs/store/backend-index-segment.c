@@ -45,7 +45,9 @@ terane_Index_new_segment (terane_Index *self, PyObject *args)
     memset (&key, 0, sizeof (DBT));
     key.flags = DB_DBT_MALLOC;
     memset (&data, 0, sizeof (DBT));
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->schema->put (self->segments, txn->txn, &key, &data, DB_APPEND);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
             break;
@@ -58,7 +60,7 @@ terane_Index_new_segment (terane_Index *self, PyObject *args)
     sid = *((db_recno_t *) key.data);
     /* free allocated memory */
     if (key.data)
-        PyMem_Free (key.data);
+        free (key.data);
     return PyLong_FromUnsignedLong ((unsigned long) sid);
 }
 
@@ -169,7 +171,9 @@ terane_Index_delete_segment (terane_Index *self, PyObject *args)
     memset (&key, 0, sizeof (DBT));
     key.data = &sid;
     key.size = sizeof (db_recno_t);
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->segments->del (self->segments, txn->txn, &key, 0);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
             break;
@@ -132,14 +132,14 @@ _Index_init (terane_Index *self, PyObject *args, PyObject *kwds)
     dbret = self->schema->stat (self->schema, txn, &stats, 0);
     if (dbret != 0) {
         if (stats)
-            PyMem_Free (stats);
+            free (stats);
         PyErr_Format (terane_Exc_Error, "Failed to get field count: %s",
             db_strerror (dbret));
         goto error;
     }
     self->nfields = (unsigned long) stats->bt_nkeys;
     if (stats)
-        PyMem_Free (stats);
+        free (stats);
     stats = NULL;
 
     /* create the DB handle for the segments store */
@@ -102,6 +102,9 @@ terane_Iter_new (PyObject *             parent,
     iter->start = NULL;
     iter->end = NULL;
     memset (&iter->range, 0, sizeof (DBT));
+    memset (&iter->range_end, 0, sizeof (DBT));
+    iter->rawkeys = 0;
+    iter->skiprange = 0;
     iter->next = ops->next;
     iter->skip = ops->skip;
     iter->reverse = reverse;
@@ -213,6 +216,43 @@ terane_Iter_new_within (PyObject *          parent,
     return (PyObject *) iter;
 }
 
+/*
+ * terane_Iter_new_raw_within: allocate a new Iter object using the supplied DB
+ *  cursor, which iterates through the records between the start and end keys.
+ *  the keys are compared bytewise, so this is only suitable for DBs which use
+ *  the default DB key comparison.  the Iter takes ownership of the start and
+ *  end key buffers, which must be allocated with PyMem_Malloc.
+ * 
+ * returns: A new Iter object
+ */
+PyObject *
+terane_Iter_new_raw_within (PyObject *          parent,
+                            DBC *               cursor,
+                            terane_Iter_ops *   ops,
+                            DBT *               start,
+                            DBT *               end,
+                            int                 reverse)
+{
+    terane_Iter *iter;
+
+    assert (start != NULL && start->data != NULL);
+    assert (end != NULL && end->data != NULL);
+
+    iter = (terane_Iter *) terane_Iter_new (parent, cursor, ops, reverse);
+    if (iter == NULL) {
+        PyMem_Free (start->data);
+        PyMem_Free (end->data);
+        return NULL;
+    }
+    iter->itype = TERANE_ITER_WITHIN;
+    iter->rawkeys = 1;
+    iter->range.data = start->data;
+    iter->range.size = start->size;
+    iter->range_end.data = end->data;
+    iter->range_end.size = end->size;
+    return (PyObject *) iter;
+}
+
 /*
  * _Iter_iter: return the iterator.
  */
@@ -259,6 +299,24 @@ _Iter_cmp (terane_iterkey *lhs, DBT *rhs, int reverse, int *result)
     return ret;
 }
 
+/*
+ * _Iter_raw_cmp: compare the lhs and rhs keys bytewise, returning less than,
+ *  equal to, or greater than zero if the lhs is less than, equal to, or greater
+ *  than the rhs.  this is the same ordering as the default DB key comparison.
+ */
+static int
+_Iter_raw_cmp (DBT *lhs, DBT *rhs)
+{
+    int ret;
+
+    ret = memcmp (lhs->data, rhs->data, lhs->size < rhs->size ? lhs->size : rhs->size);
+    if (ret != 0)
+        return ret;
+    if (lhs->size == rhs->size)
+        return 0;
+    return lhs->size < rhs->size ? -1 : 1;
+}
+
 /*
  * _Iter_get: retreive the iterator item from the cursor.
  */
@@ -280,7 +338,9 @@ _Iter_get (terane_Iter *iter, int itype, int flags, DBT *range_key)
     /* get the next cursor item */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
-    dbret = iter->cursor->get (iter->cursor, &key, &data, flags);    
+    Py_BEGIN_ALLOW_THREADS
+    dbret = iter->cursor->get (iter->cursor, &key, &data, flags);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         /* success */
         case 0:
@@ -315,6 +375,15 @@ _Iter_get (terane_Iter *iter, int itype, int flags, DBT *range_key)
                 item = iter->next (iter, &key, &data);
             break;
         case TERANE_ITER_WITHIN:
+            /* check that the raw key is between the start and end keys */
+            if (iter->rawkeys) {
+                if (_Iter_raw_cmp (&iter->range, &key) >= 0)
+                    break;
+                if (_Iter_raw_cmp (&iter->range_end, &key) <= 0)
+                    break;
+                item = iter->next (iter, &key, &data);
+                break;
+            }
             /* check that the key is between the start and end keys */
             if (_Iter_cmp (iter->start, &key, iter->reverse, &result) < 0)
                 break;
@@ -331,11 +400,14 @@ _Iter_get (terane_Iter *iter, int itype, int flags, DBT *range_key)
             break;
     }
 
-    /* free allocated memory */
-    if (key.data)
-        PyMem_Free (key.data);
+    /*
+     * free the memory allocated by db.  db doesn't return the key for an
+     * exact DB_SET lookup, so the key may still be the caller's range key.
+     */
+    if (key.data && (range_key == NULL || key.data != range_key->data))
+        free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
 
     return item;
 }
@@ -395,19 +467,12 @@ _Iter_next (terane_Iter *self)
 }
 
 /*
- * terane_Iter_skip: Move the iterator to the specified item.
- *
- * callspec: Iter.skip(target)
- * parameters:
- *   target (object): A python object that describes the item to skip to
- * returns: The iterator value at the skipped-to position
- * exceptions:
- *  IndexError: Target item is out of range
- *  ValueError: Target could not be serialized to a msgpack key
- *  terane.outputs.store.backend.Error: failed to move the DBC cursor
+ * _Iter_skip: Move the iterator to the item specified by the skip callback.
+ *  if range is true, then move to the first item greater than or equal to
+ *  the target.
  */
-PyObject *
-terane_Iter_skip (terane_Iter *self, PyObject *args)
+static PyObject *
+_Iter_skip (terane_Iter *self, PyObject *args, int range)
 {
     DBT skip_key;
     PyObject *skip_obj = NULL;
@@ -424,9 +489,19 @@ terane_Iter_skip (terane_Iter *self, PyObject *args)
      /* The skip function should set exception if it returns NULL */
     if (skip_obj == NULL)
         return NULL;
-    /* dump the skip key object */
     memset (&skip_key, 0, sizeof (DBT));
-    if (_terane_msgpack_dump (skip_obj, (char **) &skip_key.data, &skip_key.size) < 0) {
+    /* if the skip callback returned a str, then it is already a raw key */
+    if (PyString_CheckExact (skip_obj)) {
+        skip_key.size = (uint32_t) PyString_GET_SIZE (skip_obj);
+        skip_key.data = PyMem_Malloc (skip_key.size);
+        if (skip_key.data == NULL) {
+            Py_DECREF (skip_obj);
+            return PyErr_NoMemory ();
+        }
+        memcpy (skip_key.data, PyString_AS_STRING (skip_obj), skip_key.size);
+    }
+    /* otherwise dump the skip key object */
+    else if (_terane_msgpack_dump (skip_obj, (char **) &skip_key.data, &skip_key.size) < 0) {
         Py_DECREF (skip_obj);
         return NULL;
     }
@@ -436,8 +511,9 @@ terane_Iter_skip (terane_Iter *self, PyObject *args)
         itype = TERANE_ITER_WITHIN;
     else
         itype = TERANE_ITER_RANGE;
-    /* retrieve the item associated with the key */
-    item = _Iter_get (self, itype, DB_SET, &skip_key);
+    /* retrieve the item associated with the key, or if range is set
+     * then the first item greater than or equal to the key */
+    item = _Iter_get (self, itype, range? DB_SET_RANGE : DB_SET, &skip_key);
     PyMem_Free (skip_key.data);
     /* raise IndexError if the item was not found */
     if (item == NULL && !PyErr_Occurred())
@@ -446,6 +522,154 @@ terane_Iter_skip (terane_Iter *self, PyObject *args)
     return item;
 }
 
+/*
+ * terane_Iter_skip: Move the iterator to the specified item.
+ *
+ * callspec: Iter.skip(target)
+ * parameters:
+ *   target (object): A python object that describes the item to skip to
+ * returns: The iterator value at the skipped-to position
+ * exceptions:
+ *  IndexError: Target item is out of range
+ *  ValueError: Target could not be serialized to a msgpack key
+ *  terane.outputs.store.backend.Error: failed to move the DBC cursor
+ */
+PyObject *
+terane_Iter_skip (terane_Iter *self, PyObject *args)
+{
+    return _Iter_skip (self, args, self->skiprange);
+}
+
+/*
+ * terane_Iter_seek: Move the iterator to the first item greater than or
+ *  equal to the specified item.
+ *
+ * callspec: Iter.seek(target)
+ * parameters:
+ *   target (object): A python object that describes the item to seek to
+ * returns: The iterator value at the new position
+ * exceptions:
+ *  IndexError: There are no items greater than or equal to the target
+ *  ValueError: Target could not be serialized to a msgpack key
+ *  terane.outputs.store.backend.Error: failed to move the DBC cursor
+ */
+PyObject *
+terane_Iter_seek (terane_Iter *self, PyObject *args)
+{
+    return _Iter_skip (self, args, 1);
+}
+
+/*
+ * terane_Iter_next_block: return a list of up to count iterator items.
+ *
+ * callspec: Iter.next_block(count)
+ * parameters:
+ *   count (int): The maximum number of items to return
+ * returns: A list of iterator items.  The list is empty if there are no
+ *  more items.
+ * exceptions:
+ *  terane.outputs.store.backend.Error: failed to move the DBC cursor
+ */
+PyObject *
+terane_Iter_next_block (terane_Iter *self, PyObject *args)
+{
+    PyObject *block = NULL;
+    PyObject *item = NULL;
+    int count, i;
+
+    if (!PyArg_ParseTuple (args, "i", &count))
+        return NULL;
+    if (count < 1)
+        return PyErr_Format (PyExc_ValueError, "count must be greater than 0");
+    block = PyList_New (0);
+    if (block == NULL)
+        return NULL;
+    /* the iterator is closed once it is exhausted */
+    if (self->cursor == NULL)
+        return block;
+    if (self->next == NULL) {
+        Py_DECREF (block);
+        return PyErr_Format (terane_Exc_Error, "No next callback for iterator");
+    }
+    for (i = 0; i < count && self->cursor != NULL; i++) {
+        item = _Iter_next (self);
+        if (item == NULL) {
+            if (PyErr_Occurred ()) {
+                Py_DECREF (block);
+                return NULL;
+            }
+            break;
+        }
+        if (PyList_Append (block, item) < 0) {
+            Py_DECREF (item);
+            Py_DECREF (block);
+            return NULL;
+        }
+        Py_DECREF (item);
+    }
+    return block;
+}
+
+/*
+ * terane_Iter_skip_block: Move the iterator to each of the specified items
+ *  in turn, returning the items which exist.
+ *
+ * callspec: Iter.skip_block(targets)
+ * parameters:
+ *   targets (sequence): The items to skip to, in iteration order
+ * returns: A list of the iterator values at each skipped-to position
+ * exceptions:
+ *  ValueError: A target could not be serialized to a msgpack key
+ *  terane.outputs.store.backend.Error: failed to move the DBC cursor
+ */
+PyObject *
+terane_Iter_skip_block (terane_Iter *self, PyObject *args)
+{
+    PyObject *targets = NULL;
+    PyObject *seq = NULL;
+    PyObject *block = NULL;
+    PyObject *target_args = NULL;
+    PyObject *item = NULL;
+    Py_ssize_t ntargets, i;
+
+    if (!PyArg_ParseTuple (args, "O", &targets))
+        return NULL;
+    seq = PySequence_Fast (targets, "targets must be a sequence");
+    if (seq == NULL)
+        return NULL;
+    block = PyList_New (0);
+    if (block == NULL)
+        goto error;
+    ntargets = PySequence_Fast_GET_SIZE (seq);
+    for (i = 0; i < ntargets && self->cursor != NULL; i++) {
+        target_args = PyTuple_Pack (1, PySequence_Fast_GET_ITEM (seq, i));
+        if (target_args == NULL)
+            goto error;
+        item = terane_Iter_skip (self, target_args);
+        Py_DECREF (target_args);
+        if (item == NULL) {
+            /* the target doesn't exist, so try the next one */
+            if (PyErr_ExceptionMatches (PyExc_IndexError)) {
+                PyErr_Clear ();
+                continue;
+            }
+            goto error;
+        }
+        if (PyList_Append (block, item) < 0) {
+            Py_DECREF (item);
+            goto error;
+        }
+        Py_DECREF (item);
+    }
+    Py_DECREF (seq);
+    return block;
+
+error:
+    Py_XDECREF (block);
+    Py_DECREF (seq);
+    return NULL;
+}
+
 /*
  * terane_Iter_close: close the underlying DB Cursor.
  *
@@ -461,7 +685,10 @@ PyObject *
 terane_Iter_close (terane_Iter *self)
 {
     if (self->cursor != NULL) {
-        int dbret = self->cursor->close (self->cursor);
+        int dbret;
+        Py_BEGIN_ALLOW_THREADS
+        dbret = self->cursor->close (self->cursor);
+        Py_END_ALLOW_THREADS
         switch (dbret) {
             case 0:
                 break;
@@ -489,6 +716,9 @@ terane_Iter_close (terane_Iter *self)
     if (self->range.data)
         PyMem_Free (self->range.data);
     self->range.data = NULL;
+    if (self->range_end.data)
+        PyMem_Free (self->range_end.data);
+    self->range_end.data = NULL;
     Py_RETURN_NONE;
 }
 
@@ -507,6 +737,12 @@ PyMethodDef _Iter_methods[] =
 {
     { "skip", (PyCFunction) terane_Iter_skip, METH_VARARGS,
         "Move the iterator to the specified item." },
+    { "seek", (PyCFunction) terane_Iter_seek, METH_VARARGS,
+        "Move the iterator to the first item greater than or equal to the specified item." },
+    { "next_block", (PyCFunction) terane_Iter_next_block, METH_VARARGS,
+        "Return a list of up to count iterator items." },
+    { "skip_block", (PyCFunction) terane_Iter_skip_block, METH_VARARGS,
+        "Move the iterator to each of the specified items, returning the items which exist." },
     { "close", (PyCFunction) terane_Iter_close, METH_NOARGS,
         "Free resources allocated by the iterator." },
     { NULL, NULL, 0, NULL }
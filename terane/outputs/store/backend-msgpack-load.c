@@ -429,6 +429,166 @@ _msgpack_load_object (char *        buf,
     return -1;
 }
 
+/*
+ * _msgpack_skip_object: advance pos past the next object in the buffer
+ * without converting it to a python object.
+ */
+static int
+_msgpack_skip_object (char *        buf,
+                      uint32_t      len,
+                      char **       pos)
+{
+    terane_value val;
+    int ret;
+    unsigned char type;
+    terane_conv *conv;
+    uint32_t i, size, nitems;
+
+    ret = _terane_msgpack_load_value (buf, len, pos, &val);
+    /* a scalar value was skipped, or error, or end of buffer */
+    if (ret != -2)
+        return ret;
+
+    /* otherwise skip a complex type */
+    type = (unsigned char) **pos;
+    *pos += 1;
+
+    switch (type) {
+        /* array 16 */
+        case 0xdc:
+        /* map 16 */
+        case 0xde:
+            if (!CONTAINS_BYTES(buf, len, pos, 2))
+                return -1;
+            conv = (terane_conv *) *pos;
+            size = NTOHS(conv->u16);
+            *pos += 2;
+            break;
+        /* array 32 */
+        case 0xdd:
+        /* map 32 */
+        case 0xdf:
+            if (!CONTAINS_BYTES(buf, len, pos, 4))
+                return -1;
+            conv = (terane_conv *) *pos;
+            size = NTOHL(conv->u32);
+            *pos += 4;
+            break;
+        default:
+            /* FixArray or FixMap */
+            if ((type & 0xf0) == 0x90 || (type & 0xf0) == 0x80) {
+                size = type & 0x0f;
+                break;
+            }
+            /* we don't know how to handle this type */
+            PyErr_Format (PyExc_ValueError, "unable to load data with type %x", (int) type);
+            return -1;
+    }
+    /* maps contain a key and a value for each item */
+    nitems = (type == 0xde || type == 0xdf || (type & 0xf0) == 0x80)? size * 2 : size;
+    for (i = 0; i < nitems; i++) {
+        if (_msgpack_skip_object (buf, len, pos) <= 0) {
+            if (!PyErr_Occurred ())
+                PyErr_Format (PyExc_ValueError, "unexpected end of data");
+            return -1;
+        }
+    }
+    return 1;
+}
+
+/*
+ * _terane_msgpack_load_fields: deserialize a buffer containing a map into a
+ * python dict, keeping only the keys which are contained in the fields
+ * sequence.  the values of all other keys are skipped without being decoded.
+ */
+int
+_terane_msgpack_load_fields (char *buf, uint32_t len, PyObject *fields, PyObject **dest)
+{
+    PyObject *dict = NULL, *key = NULL, *value = NULL;
+    char *pos = NULL;
+    unsigned char type;
+    terane_conv *conv;
+    uint32_t i, size;
+    int ret;
+
+    assert (buf != NULL);
+    assert (fields != NULL);
+    assert (dest != NULL);
+
+    /* read the map header */
+    if (len == 0)
+        goto invalid;
+    pos = buf;
+    type = (unsigned char) *pos;
+    pos += 1;
+    switch (type) {
+        /* map 16 */
+        case 0xde:
+            if (!CONTAINS_BYTES(buf, len, &pos, 2))
+                goto invalid;
+            conv = (terane_conv *) pos;
+            size = NTOHS(conv->u16);
+            pos += 2;
+            break;
+        /* map 32 */
+        case 0xdf:
+            if (!CONTAINS_BYTES(buf, len, &pos, 4))
+                goto invalid;
+            conv = (terane_conv *) pos;
+            size = NTOHL(conv->u32);
+            pos += 4;
+            break;
+        default:
+            /* FixMap */
+            if ((type & 0xf0) == 0x80) {
+                size = type & 0x0f;
+                break;
+            }
+            goto invalid;
+    }
+
+    dict = PyDict_New ();
+    if (dict == NULL)
+        return -1;
+    for (i = 0; i < size; i++) {
+        if (_msgpack_load_object (buf, len, &pos, &key) <= 0)
+            goto error;
+        ret = PySequence_Contains (fields, key);
+        if (ret < 0)
+            goto error;
+        /* skip the value if the key isn't in the projection */
+        if (ret == 0) {
+            if (_msgpack_skip_object (buf, len, &pos) <= 0)
+                goto error;
+        }
+        else {
+            if (_msgpack_load_object (buf, len, &pos, &value) <= 0)
+                goto error;
+            if (PyDict_SetItem (dict, key, value) < 0)
+                goto error;
+            Py_DECREF (value);
+            value = NULL;
+        }
+        Py_DECREF (key);
+        key = NULL;
+    }
+    *dest = dict;
+    return 0;
+
+invalid:
+    PyErr_Format (PyExc_ValueError, "data is not a map");
+error:
+    if (!PyErr_Occurred ())
+        PyErr_Format (PyExc_ValueError, "unexpected end of data");
+    if (dict)
+        Py_DECREF (dict);
+    if (key)
+        Py_DECREF (key);
+    if (value)
+        Py_DECREF (value);
+    return -1;
+}
+
 /*
  * _terane_msgpack_load: deserialize a buffer into a python object.
  */
@@ -492,9 +652,11 @@ error:
 /*
  * terane_msgpack_load: 
  *
- * callspec: msgpack_load(string)
+ * callspec: msgpack_load(string, fields=None)
  * parameters:
  *   string (str):
+ *   fields (object): If not None, then string must contain a map, and only
+ *     the keys contained in the fields sequence are loaded.
  * returns:
  * exceptions:
  *   ValueError:
@@ -504,12 +666,17 @@ terane_msgpack_load (PyObject *self, PyObject *args)
 {
     char *str = NULL;
     int len;
+    PyObject *fields = NULL;
     PyObject *obj = NULL;
 
     /* parse parameters */
-    if (!PyArg_ParseTuple (args, "s#", &str, &len))
+    if (!PyArg_ParseTuple (args, "s#|O", &str, &len, &fields))
         return NULL;
-    if (_terane_msgpack_load (str, (uint32_t) len, &obj) < 0)
+    if (fields != NULL && fields != Py_None) {
+        if (_terane_msgpack_load_fields (str, (uint32_t) len, fields, &obj) < 0)
+            return NULL;
+    }
+    else if (_terane_msgpack_load (str, (uint32_t) len, &obj) < 0)
         return NULL;
     return obj;
 }
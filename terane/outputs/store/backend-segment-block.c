@@ -0,0 +1,392 @@
+/*
+ * Copyright 2012 Michael Frank <msfrank@syntaxjockey.com>
+ *
+ * This file is part of Terane.
+ *
+ * Terane is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * Terane is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with Terane.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#include "backend.h"
+
+/*
+ * posting blocks group the postings for a single term id into one record.
+ *  the block key is a binary posting key built from the term id and the
+ *  last evid in the block, so a DB_SET_RANGE lookup for any evid lands on
+ *  the block which may contain it.  the block value consists of:
+ *
+ *   varint count
+ *   count * (varint ts delta, varint offset or offset delta)
+ *   msgpack array of count posting values
+ *
+ *  the first evid is stored as-is.  for each following evid, the ts is
+ *  stored as the difference from the previous ts; if the difference is 0
+ *  then the offset is stored as the difference from the previous offset,
+ *  otherwise the offset is stored as-is.
+ */
+
+/* the maximum number of bytes in a varint-encoded 64-bit value */
+#define TERANE_VARINT_MAX_SIZE  10
+
+/*
+ * _Block_put_varint: write value into buf as a varint.
+ *
+ * returns: the position in buf after the varint.
+ */
+static unsigned char *
+_Block_put_varint (unsigned char *pos, unsigned PY_LONG_LONG value)
+{
+    while (value >= 0x80) {
+        *pos++ = (unsigned char) ((value & 0x7f) | 0x80);
+        value >>= 7;
+    }
+    *pos++ = (unsigned char) value;
+    return pos;
+}
+
+/*
+ * _Block_get_varint: read a varint from the buffer at pos, advancing pos.
+ *
+ * returns: 0 on success, or -1 if the varint is truncated or too long.
+ */
+static int
+_Block_get_varint (unsigned char **pos, unsigned char *end, unsigned PY_LONG_LONG *value)
+{
+    unsigned PY_LONG_LONG result = 0;
+    unsigned char byte;
+    int shift = 0;
+
+    while (*pos < end && shift < 64) {
+        byte = **pos;
+        *pos += 1;
+        result |= ((unsigned PY_LONG_LONG) (byte & 0x7f)) << shift;
+        if (!(byte & 0x80)) {
+            *value = result;
+            return 0;
+        }
+        shift += 7;
+    }
+    return -1;
+}
+
+/*
+ * terane_Segment_set_posting_block: Write a block of postings for the
+ *  specified term id.
+ *
+ * callspec: Segment.set_posting_block(txn, id, postings)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in
+ *   id (long): The term id
+ *   postings (list): A list of (ts, offset, value) tuples, in ascending order
+ * returns: None
+ * exceptions:
+ *   ValueError: The postings are empty or are not in ascending order
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to set the record
+ */
+PyObject *
+terane_Segment_set_posting_block (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    unsigned long termid = 0, ts = 0, last_ts = 0;
+    unsigned PY_LONG_LONG offset = 0, last_offset = 0;
+    PyObject *postings = NULL, *seq = NULL, *item, *value;
+    PyObject *values = NULL, *wrapper = NULL;
+    Py_ssize_t nitems, i;
+    unsigned char *buf = NULL, *pos, *tmp;
+    char *vbuf = NULL;
+    uint32_t vsize = 0;
+    unsigned char keybuf[TERANE_POSTING_KEY_SIZE];
+    DBT key, data;
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "O!kO", &terane_TxnType, &txn, &termid, &postings))
+        return NULL;
+    if (self->format == TERANE_SEGMENT_FORMAT_MSGPACK)
+        return PyErr_Format (terane_Exc_Error, "Segment format doesn't support posting blocks");
+    if (_terane_check_posting_key (termid, 0) < 0)
+        return NULL;
+    seq = PySequence_Fast (postings, "postings must be a sequence");
+    if (seq == NULL)
+        return NULL;
+    nitems = PySequence_Fast_GET_SIZE (seq);
+    if (nitems == 0) {
+        PyErr_Format (PyExc_ValueError, "posting block is empty");
+        goto error;
+    }
+    values = PyList_New (nitems);
+    if (values == NULL)
+        goto error;
+
+    /* delta-encode the evids */
+    buf = PyMem_Malloc (TERANE_VARINT_MAX_SIZE * (1 + 2 * nitems));
+    if (buf == NULL) {
+        PyErr_NoMemory ();
+        goto error;
+    }
+    pos = _Block_put_varint (buf, (unsigned PY_LONG_LONG) nitems);
+    for (i = 0; i < nitems; i++) {
+        item = PySequence_Fast_GET_ITEM (seq, i);
+        if (!PyTuple_Check (item)) {
+            PyErr_Format (PyExc_TypeError, "posting must be a (ts, offset, value) tuple");
+            goto error;
+        }
+        if (!PyArg_ParseTuple (item, "kKO", &ts, &offset, &value))
+            goto error;
+        if (_terane_check_posting_key (termid, ts) < 0)
+            goto error;
+        if (i == 0) {
+            pos = _Block_put_varint (pos, ts);
+            pos = _Block_put_varint (pos, offset);
+        }
+        else if (ts < last_ts || (ts == last_ts && offset <= last_offset)) {
+            PyErr_Format (PyExc_ValueError, "postings must be in ascending order");
+            goto error;
+        }
+        else if (ts == last_ts) {
+            pos = _Block_put_varint (pos, 0);
+            pos = _Block_put_varint (pos, offset - last_offset);
+        }
+        else {
+            pos = _Block_put_varint (pos, ts - last_ts);
+            pos = _Block_put_varint (pos, offset);
+        }
+        Py_INCREF (value);
+        PyList_SET_ITEM (values, i, value);
+        last_ts = ts;
+        last_offset = offset;
+    }
+
+    /* dump the values as a single msgpack array, and append it to the evids */
+    wrapper = PyList_New (1);
+    if (wrapper == NULL)
+        goto error;
+    PyList_SET_ITEM (wrapper, 0, values);
+    values = NULL;
+    if (_terane_msgpack_dump (wrapper, &vbuf, &vsize) < 0)
+        goto error;
+    tmp = PyMem_Realloc (buf, (pos - buf) + vsize);
+    if (tmp == NULL) {
+        PyErr_NoMemory ();
+        goto error;
+    }
+    pos = tmp + (pos - buf);
+    buf = tmp;
+    memcpy (pos, vbuf, vsize);
+
+    /* the block is keyed by the last evid in the block */
+    _terane_pack_posting_key (termid, last_ts, last_offset, keybuf);
+    memset (&key, 0, sizeof (DBT));
+    key.data = keybuf;
+    key.size = TERANE_POSTING_KEY_SIZE;
+    memset (&data, 0, sizeof (DBT));
+    data.data = buf;
+    data.size = (uint32_t) ((pos - buf) + vsize);
+
+    /* set the record */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->blocks->put (self->blocks, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to set posting block: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+    PyMem_Free (buf);
+    PyMem_Free (vbuf);
+    Py_DECREF (wrapper);
+    Py_DECREF (seq);
+    Py_RETURN_NONE;
+
+error:
+    if (buf)
+        PyMem_Free (buf);
+    if (vbuf)
+        PyMem_Free (vbuf);
+    Py_XDECREF (values);
+    Py_XDECREF (wrapper);
+    Py_XDECREF (seq);
+    return NULL;
+}
+
+/*
+ * _Segment_next_posting_block: return the (key,postings) tuple from the
+ *  current cursor item, where postings is a list of (ts,offset,value) tuples.
+ */
+static PyObject *
+_Segment_next_posting_block (terane_Iter *iter, DBT *key, DBT *data)
+{
+    PyObject *block = NULL, *postings = NULL, *values = NULL, *posting;
+    unsigned char *pos = (unsigned char *) data->data;
+    unsigned char *end = pos + data->size;
+    unsigned PY_LONG_LONG count = 0, ts = 0, offset = 0, dts, doffset;
+    unsigned PY_LONG_LONG *evids = NULL;
+    Py_ssize_t i;
+
+    /* decode the evids */
+    if (_Block_get_varint (&pos, end, &count) < 0 || count == 0)
+        goto corrupt;
+    if (count > (unsigned PY_LONG_LONG) (end - pos))
+        goto corrupt;
+    evids = PyMem_Malloc (sizeof (unsigned PY_LONG_LONG) * 2 * count);
+    if (evids == NULL)
+        return PyErr_NoMemory ();
+    for (i = 0; i < (Py_ssize_t) count; i++) {
+        if (_Block_get_varint (&pos, end, &dts) < 0)
+            goto corrupt;
+        if (_Block_get_varint (&pos, end, &doffset) < 0)
+            goto corrupt;
+        if (i > 0 && dts == 0)
+            offset += doffset;
+        else
+            offset = doffset;
+        ts += dts;
+        evids[2 * i] = ts;
+        evids[2 * i + 1] = offset;
+    }
+
+    /* load the posting values */
+    if (_terane_msgpack_load ((char *) pos, (uint32_t) (end - pos), &values) < 0)
+        goto error;
+    if (values == NULL || !PyList_Check (values)
+      || PyList_GET_SIZE (values) != (Py_ssize_t) count)
+        goto corrupt;
+
+    /* build the list of (ts,offset,value) tuples */
+    postings = PyList_New ((Py_ssize_t) count);
+    if (postings == NULL)
+        goto error;
+    for (i = 0; i < (Py_ssize_t) count; i++) {
+        posting = Py_BuildValue ("(kKO)", (unsigned long) evids[2 * i],
+            evids[2 * i + 1], PyList_GET_ITEM (values, i));
+        if (posting == NULL)
+            goto error;
+        PyList_SET_ITEM (postings, i, posting);
+    }
+    block = Py_BuildValue ("(NO)", _terane_load_posting_key (key), postings);
+    goto error;
+
+corrupt:
+    PyErr_Format (terane_Exc_Error, "Posting block is corrupt");
+error:
+    if (evids)
+        PyMem_Free (evids);
+    Py_XDECREF (values);
+    Py_XDECREF (postings);
+    return block;
+}
+
+/*
+ * _Segment_skip_posting_block: create a key to skip to the block which may
+ *  contain the posting specified by (termid,ts,offset).
+ */
+static PyObject *
+_Segment_skip_posting_block (terane_Iter *iter, PyObject *args)
+{
+    PyObject *target = NULL, *tuple = NULL;
+    unsigned long termid = 0, ts = 0;
+    unsigned PY_LONG_LONG offset = 0;
+    unsigned char keybuf[TERANE_POSTING_KEY_SIZE];
+
+    if (!PyArg_ParseTuple (args, "O", &target))
+        return NULL;
+    tuple = PySequence_Tuple (target);
+    if (tuple == NULL)
+        return NULL;
+    if (!PyArg_ParseTuple (tuple, "kkK", &termid, &ts, &offset)) {
+        Py_DECREF (tuple);
+        return NULL;
+    }
+    Py_DECREF (tuple);
+    if (_terane_check_posting_key (termid, ts) < 0)
+        return NULL;
+    /* return the binary key as a str, so the Iter doesn't msgpack it */
+    _terane_pack_posting_key (termid, ts, offset, keybuf);
+    return PyString_FromStringAndSize ((char *) keybuf, TERANE_POSTING_KEY_SIZE);
+}
+
+/*
+ * terane_Segment_iter_posting_blocks: Iterate through all posting blocks
+ *  associated with the specified term id.  Skipping to a (termid,ts,offset)
+ *  target positions the iterator at the block which may contain the target.
+ *
+ * callspec: Segment.iter_posting_blocks(txn, id)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in, or None
+ *   id (long): The term id
+ * returns: a new Iterator object.  Each iteration returns a tuple consisting
+ *  of (key,postings), where key is the (termid,ts,offset) of the last posting
+ *  in the block, and postings is a list of (ts,offset,value) tuples.
+ * exceptions:
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to get the record
+ */
+PyObject *
+terane_Segment_iter_posting_blocks (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    unsigned long termid = 0;
+    DBT start_key, end_key;
+    DBC *cursor = NULL;
+    int dbret;
+    PyObject *iter = NULL;
+    terane_Iter_ops ops = { .next = _Segment_next_posting_block, .skip = _Segment_skip_posting_block };
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "Ok", &txn, &termid))
+        return NULL;
+    if ((PyObject *) txn == Py_None)
+        txn = NULL;
+    if (txn && txn->ob_type != &terane_TxnType)
+        return PyErr_Format (PyExc_TypeError, "txn must be a Txn or None");
+    if (_terane_check_posting_key (termid, 0) < 0)
+        return NULL;
+
+    /* build the keys bounding all blocks for the term id */
+    memset (&start_key, 0, sizeof (DBT));
+    memset (&end_key, 0, sizeof (DBT));
+    start_key.data = PyMem_Malloc (TERANE_POSTING_KEY_SIZE);
+    end_key.data = PyMem_Malloc (TERANE_POSTING_KEY_SIZE);
+    if (start_key.data == NULL || end_key.data == NULL) {
+        PyMem_Free (start_key.data);
+        PyMem_Free (end_key.data);
+        return PyErr_NoMemory ();
+    }
+    start_key.size = TERANE_POSTING_KEY_SIZE;
+    end_key.size = TERANE_POSTING_KEY_SIZE;
+    _terane_pack_posting_key (termid, 0, 0, start_key.data);
+    if (termid < TERANE_POSTING_KEY_MAX_TERMID)
+        _terane_pack_posting_key (termid + 1, 0, 0, end_key.data);
+    else
+        memset (end_key.data, 0xff, TERANE_POSTING_KEY_SIZE);
+
+    /* create a new cursor */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->blocks->cursor (self->blocks, txn? txn->txn : NULL, &cursor, 0);
+    Py_END_ALLOW_THREADS
+    if (dbret != 0) {
+        PyMem_Free (start_key.data);
+        PyMem_Free (end_key.data);
+        return PyErr_Format (terane_Exc_Error, "Failed to allocate DB cursor: %s",
+            db_strerror (dbret));
+    }
+
+    /* create the Iter.  the Iter takes ownership of the key buffers */
+    iter = terane_Iter_new_raw_within ((PyObject *) self, cursor, &ops,
+        &start_key, &end_key, 0);
+    if (iter == NULL) {
+        cursor->close (cursor);
+        return NULL;
+    }
+    ((terane_Iter *) iter)->skiprange = 1;
+    return iter;
+}
@@ -48,7 +48,9 @@ terane_Segment_new_event (terane_Segment *self, PyObject *args)
         return NULL;
     memset (&data, 0, sizeof (DBT));
     /* put a new document.  raise DocExists if the event identifier already exists. */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->put (self->events, txn->txn, &key, &data, DB_NOOVERWRITE);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -65,10 +67,12 @@ terane_Segment_new_event (terane_Segment *self, PyObject *args)
 /*
  * terane_Segment_get_event: retrieve an event
  *
- * callspec: Segment.get_event(txn, evid)
+ * callspec: Segment.get_event(txn, evid, fields=None)
  * parameters:
  *   txn (Txn): A Txn object to wrap the operation in, or None
  *   evid (object): The event identifier
+ *   fields (object): If not None, a sequence of the field names to return.
+ *     The values of all other fields are skipped without being decoded.
  * returns: The event
  * exceptions:
  *   KeyError: The event with the specified evid doesn't exist
@@ -79,28 +83,36 @@ terane_Segment_get_event (terane_Segment *self, PyObject *args)
 {
     terane_Txn *txn = NULL;
     PyObject *evid = NULL;
+    PyObject *fields = NULL;
     DBT key, data;
     PyObject *event = NULL;
     int dbret;
 
     /* parse parameters */
-    if (!PyArg_ParseTuple (args, "OO", &txn, &evid))
+    if (!PyArg_ParseTuple (args, "OO|O", &txn, &evid, &fields))
         return NULL;
     if ((PyObject *) txn == Py_None)
         txn = NULL;
+    if (fields == Py_None)
+        fields = NULL;
     /* use the event identifier as the key */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (evid, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* get the document */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->get (self->events, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
-            /* create a python string from the data */
-            _terane_msgpack_load ((char *) data.data, data.size, &event);
+            /* create a python object from the data, decoding only the
+             * projected fields if fields was specified */
+            if (fields != NULL)
+                _terane_msgpack_load_fields ((char *) data.data, data.size, fields, &event);
+            else
+                _terane_msgpack_load ((char *) data.data, data.size, &event);
             break;
         case DB_NOTFOUND:
         case DB_KEYEMPTY:
@@ -117,7 +129,7 @@ terane_Segment_get_event (terane_Segment *self, PyObject *args)
     if (key.data)
         PyMem_Free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return event;
 }
 
@@ -156,7 +168,9 @@ terane_Segment_set_event (terane_Segment *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->put (self->events, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     PyMem_Free (data.data);
     /* db error, raise Exception */
@@ -198,7 +212,9 @@ terane_Segment_delete_event (terane_Segment *self, PyObject *args)
     if (_terane_msgpack_dump (evid, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* delete the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->del (self->events, txn->txn, &key, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -244,7 +260,9 @@ terane_Segment_contains_event (terane_Segment *self, PyObject *args)
     if (_terane_msgpack_dump (evid, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* check for the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->exists (self->events, txn? txn->txn : NULL, &key, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -301,8 +319,10 @@ terane_Segment_estimate_events (terane_Segment *self, PyObject *args)
         goto error;
 
     /* estimate start key range */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->key_range (self->events, txn? txn->txn : NULL,
         &start_key, &start_range, 0);
+    Py_END_ALLOW_THREADS
     if (dbret != 0) {
         PyErr_Format (terane_Exc_Error, "Failed to estimate start key range: %s",
             db_strerror (dbret));
@@ -310,8 +330,10 @@ terane_Segment_estimate_events (terane_Segment *self, PyObject *args)
     }
 
     /* estimate end key range */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->key_range (self->events, txn? txn->txn : NULL,
         &end_key, &end_range, 0);
+    Py_END_ALLOW_THREADS
     if (dbret != 0) {
         PyErr_Format (terane_Exc_Error, "Failed to estimate end key range: %s",
             db_strerror (dbret));
@@ -390,7 +412,9 @@ terane_Segment_iter_events (terane_Segment *self, PyObject *args)
         reverse = 0;
 
     /* create a new cursor */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->events->cursor (self->events, txn? txn->txn : NULL, &cursor, 0);
+    Py_END_ALLOW_THREADS
     /* if cursor allocation failed, return Error */
     if (dbret != 0)
         return PyErr_Format (terane_Exc_Error, "Failed to allocate document cursor: %s",
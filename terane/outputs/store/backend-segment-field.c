@@ -48,13 +48,14 @@ terane_Segment_get_field (terane_Segment *self, PyObject *args)
         txn = NULL;
     /* use the field as the key */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (field, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* get the record */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->fields->get (self->fields, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
             /* create a python string from the data */
@@ -75,7 +76,7 @@ terane_Segment_get_field (terane_Segment *self, PyObject *args)
     if (key.data)
         PyMem_Free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return value;
 }
 
@@ -115,7 +116,9 @@ terane_Segment_set_field (terane_Segment *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->fields->put (self->fields, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     PyMem_Free (data.data);
     switch (dbret) {
@@ -128,3 +131,70 @@ terane_Segment_set_field (terane_Segment *self, PyObject *args)
     }
     Py_RETURN_NONE;
 }
+
+/*
+ * _Segment_next_field: build a (field,value) tuple from the current cursor item
+ */
+static PyObject *
+_Segment_next_field (terane_Iter *iter, DBT *key, DBT *data)
+{
+    PyObject *field = NULL, *value = NULL, *tuple = NULL;
+
+    /* get the field */
+    if (_terane_msgpack_load ((char *) key->data, key->size, &field) < 0)
+        goto error;
+    /* get the value */
+    if (_terane_msgpack_load ((char *) data->data, data->size, &value) < 0)
+        goto error;
+    /* build the (field,value) tuple */
+    tuple = PyTuple_Pack (2, field, value);
+error:
+    Py_XDECREF (field);
+    Py_XDECREF (value);
+    return tuple;
+}
+
+/*
+ * terane_Segment_iter_fields: Iterate through all fields in the segment.
+ *
+ * callspec: Segment.iter_fields(txn)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in, or None
+ * returns: a new Iterator object.  Each iteration returns a tuple consisting
+ *  of (field,value).
+ * exceptions:
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to get the record
+ */
+PyObject *
+terane_Segment_iter_fields (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    DBC *cursor = NULL;
+    PyObject *iter = NULL;
+    terane_Iter_ops ops = { .next = _Segment_next_field };
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "O", &txn))
+        return NULL;
+    if ((PyObject *) txn == Py_None)
+        txn = NULL;
+    if (txn && txn->ob_type != &terane_TxnType)
+        return PyErr_Format (PyExc_TypeError, "txn must be a Txn or None");
+
+    /* create a new cursor */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->fields->cursor (self->fields, txn? txn->txn : NULL, &cursor, 0);
+    Py_END_ALLOW_THREADS
+    if (dbret != 0)
+        return PyErr_Format (terane_Exc_Error, "Failed to allocate DB cursor: %s",
+            db_strerror (dbret));
+
+    /* allocate a new Iter object */
+    iter = terane_Iter_new ((PyObject *) self, cursor, &ops, 0);
+    if (iter == NULL) {
+        cursor->close (cursor);
+        return NULL;
+    }
+    return iter;
+}
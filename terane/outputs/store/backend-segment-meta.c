@@ -50,13 +50,14 @@ terane_Segment_get_meta (terane_Segment *self, PyObject *args)
 
     /* use the document id as the record number */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (id, (char **) &key.data, &key.size) < 0)
         return NULL;
     /* get the record */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->metadata->get (self->metadata, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     switch (dbret) {
         case 0:
             /* create a python string from the data */
@@ -79,7 +80,7 @@ terane_Segment_get_meta (terane_Segment *self, PyObject *args)
     if (key.data)
         PyMem_Free (key.data);
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return value;
 }
 
@@ -117,7 +118,9 @@ terane_Segment_set_meta (terane_Segment *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->metadata->put (self->metadata, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     PyMem_Free (data.data);
     switch (dbret) {
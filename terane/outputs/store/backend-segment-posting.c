@@ -19,6 +19,118 @@
 
 #include "backend.h"
 
+/*
+ * _Segment_dump_posting_key: serialize the posting into a DB key, according
+ *  to the format version of the segment.  in binary segments the posting must
+ *  be a sequence of (term id, ts, offset).  the key buffer is allocated with
+ *  PyMem_Malloc, and must be freed by the caller.
+ *
+ * returns: 0 on success, otherwise -1 and sets an exception.
+ */
+static int
+_Segment_dump_posting_key (terane_Segment *self, PyObject *posting, DBT *key)
+{
+    PyObject *tuple = NULL;
+    unsigned long termid, ts;
+    unsigned PY_LONG_LONG offset;
+    unsigned char *buf;
+
+    if (self->format == TERANE_SEGMENT_FORMAT_MSGPACK)
+        return _terane_msgpack_dump (posting, (char **) &key->data, &key->size);
+
+    /* parse the (termid,ts,offset) sequence */
+    tuple = PySequence_Tuple (posting);
+    if (tuple == NULL)
+        return -1;
+    if (PyTuple_GET_SIZE (tuple) != 3) {
+        Py_DECREF (tuple);
+        PyErr_Format (PyExc_ValueError, "posting must contain (termid, ts, offset)");
+        return -1;
+    }
+    if (!PyArg_ParseTuple (tuple, "kkK", &termid, &ts, &offset)) {
+        Py_DECREF (tuple);
+        return -1;
+    }
+    Py_DECREF (tuple);
+    if (_terane_check_posting_key (termid, ts) < 0)
+        return -1;
+
+    buf = PyMem_Malloc (TERANE_POSTING_KEY_SIZE);
+    if (buf == NULL) {
+        PyErr_NoMemory ();
+        return -1;
+    }
+    _terane_pack_posting_key (termid, ts, offset, buf);
+    key->data = buf;
+    key->size = TERANE_POSTING_KEY_SIZE;
+    return 0;
+}
+
+/*
+ * _terane_check_posting_key: verify that the term id and ts fit in the four
+ *  bytes each is given in a binary posting key.  callers must check the
+ *  components before packing them, since _terane_pack_posting_key truncates.
+ *
+ * returns: 0 if the components fit, otherwise -1 and sets an exception.
+ */
+int
+_terane_check_posting_key (unsigned long termid, unsigned long ts)
+{
+    if (termid > TERANE_POSTING_KEY_MAX_TERMID) {
+        PyErr_Format (PyExc_ValueError, "term id %lu is out of range", termid);
+        return -1;
+    }
+    if (ts > TERANE_POSTING_KEY_MAX_TS) {
+        PyErr_Format (PyExc_ValueError, "ts %lu is out of range", ts);
+        return -1;
+    }
+    return 0;
+}
+
+/*
+ * _terane_pack_posting_key: pack the posting key components into buf, which
+ *  must be at least TERANE_POSTING_KEY_SIZE bytes long.  each component is
+ *  written in big-endian order, so keys sort bytewise.
+ */
+void
+_terane_pack_posting_key (unsigned long termid, unsigned long ts,
+    unsigned PY_LONG_LONG offset, unsigned char *buf)
+{
+    int i;
+
+    for (i = 0; i < 4; i++)
+        buf[i] = (unsigned char) ((termid >> (8 * (3 - i))) & 0xff);
+    for (i = 0; i < 4; i++)
+        buf[4 + i] = (unsigned char) ((ts >> (8 * (3 - i))) & 0xff);
+    for (i = 0; i < 8; i++)
+        buf[8 + i] = (unsigned char) ((offset >> (8 * (7 - i))) & 0xff);
+}
+
+/*
+ * _terane_load_posting_key: deserialize a binary posting key.
+ *
+ * returns: A new (termid,ts,offset) tuple, or NULL and sets an exception.
+ */
+PyObject *
+_terane_load_posting_key (DBT *key)
+{
+    unsigned char *buf = (unsigned char *) key->data;
+    unsigned long termid = 0, ts = 0;
+    unsigned PY_LONG_LONG offset = 0;
+    int i;
+
+    if (key->size != TERANE_POSTING_KEY_SIZE)
+        return PyErr_Format (PyExc_ValueError, "posting key has invalid size %u",
+            (unsigned int) key->size);
+    for (i = 0; i < 4; i++)
+        termid = (termid << 8) | buf[i];
+    for (i = 0; i < 4; i++)
+        ts = (ts << 8) | buf[4 + i];
+    for (i = 0; i < 8; i++)
+        offset = (offset << 8) | buf[8 + i];
+    return Py_BuildValue ("(kkK)", termid, ts, offset);
+}
+
 /*
  * terane_Segment_get_posting:
  *
@@ -50,14 +162,15 @@ terane_Segment_get_posting (terane_Segment *self, PyObject *args)
 
     /* build the key */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
-    if (_terane_msgpack_dump (posting, (char **) &key.data, &key.size) < 0)
+    if (_Segment_dump_posting_key (self, posting, &key) < 0)
         return NULL;
 
     /* get the record */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->get (self->postings, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -78,7 +191,7 @@ terane_Segment_get_posting (terane_Segment *self, PyObject *args)
 
     /* free allocated memory */
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return value;
 }
 
@@ -109,7 +222,7 @@ terane_Segment_set_posting (terane_Segment *self, PyObject *args)
 
     /* build the key */
     memset (&key, 0, sizeof (DBT));
-    if (_terane_msgpack_dump (posting, (char **) &key.data, &key.size) < 0)
+    if (_Segment_dump_posting_key (self, posting, &key) < 0)
         return NULL;
     /* build the value */
     memset (&data, 0, sizeof (DBT));
@@ -118,7 +231,9 @@ terane_Segment_set_posting (terane_Segment *self, PyObject *args)
         return NULL;
     }
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->put (self->postings, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     PyMem_Free (data.data);
     switch (dbret) {
@@ -162,11 +277,13 @@ terane_Segment_contains_posting (terane_Segment *self, PyObject *args)
 
     /* build the key */
     memset (&key, 0, sizeof (DBT));
-    if (_terane_msgpack_dump (posting, (char **) &key.data, &key.size) < 0)
+    if (_Segment_dump_posting_key (self, posting, &key) < 0)
         return NULL;
 
     /* check if key exists in the db */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->exists (self->postings, txn? txn->txn : NULL, &key, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -216,31 +333,38 @@ terane_Segment_estimate_postings (terane_Segment *self, PyObject *args)
 
     /* build the start and end keys */
     memset (&start_key, 0, sizeof (DBT));
-    if (_terane_msgpack_dump (start, (char **) &start_key.data, &start_key.size) < 0)
-        goto error;
     memset (&end_key, 0, sizeof (DBT));
-    if (_terane_msgpack_dump (end, (char **) &end_key.data, &end_key.size) < 0)
+    if (_Segment_dump_posting_key (self, start, &start_key) < 0)
+        goto error;
+    if (_Segment_dump_posting_key (self, end, &end_key) < 0)
         goto error;
 
     /* estimate start key range */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->key_range (self->postings, txn? txn->txn : NULL,
         &start_key, &start_range, 0);
+    Py_END_ALLOW_THREADS
     if (dbret != 0) {
         PyErr_Format (terane_Exc_Error, "Failed to estimate start key range: %s",
             db_strerror (dbret));
         goto error;
     }
     /* estimate start key range */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->key_range (self->postings, txn? txn->txn : NULL,
          &end_key, &end_range, 0);
+    Py_END_ALLOW_THREADS
     if (dbret != 0) {
         PyErr_Format (terane_Exc_Error, "Failed to estimate end key range: %s",
             db_strerror (dbret));
         goto error;
     }
 
-    dbret = _terane_msgpack_cmp ((char *) start_key.data, start_key.size,
-        (char *) end_key.data, end_key.size, &cmp);
+    if (self->format == TERANE_SEGMENT_FORMAT_MSGPACK)
+        dbret = _terane_msgpack_cmp ((char *) start_key.data, start_key.size,
+            (char *) end_key.data, end_key.size, &cmp);
+    else
+        cmp = memcmp (start_key.data, end_key.data, TERANE_POSTING_KEY_SIZE);
     if (dbret == 0) {
         if (cmp > 0)
             estimate = PyFloat_FromDouble (1.0 - (end_range.less + start_range.greater));
@@ -265,7 +389,11 @@ _Segment_next_posting (terane_Iter *iter, DBT *key, DBT *data)
     PyObject *posting = NULL, *value = NULL, *tuple = NULL;
 
     /* get the posting */
-    if (_terane_msgpack_load ((char *) key->data, key->size, &posting) < 0)
+    if (((terane_Segment *) iter->parent)->format == TERANE_SEGMENT_FORMAT_MSGPACK) {
+        if (_terane_msgpack_load ((char *) key->data, key->size, &posting) < 0)
+            goto error;
+    }
+    else if ((posting = _terane_load_posting_key (key)) == NULL)
         goto error;
     /* get the value */
     if (_terane_msgpack_load ((char *) data->data, data->size, &value) < 0)
@@ -284,11 +412,23 @@ error:
 static PyObject *
 _Segment_skip_posting (terane_Iter *iter, PyObject *args)
 {
-    PyObject *posting = NULL;
+    terane_Segment *segment = (terane_Segment *) iter->parent;
+    PyObject *posting = NULL, *skip = NULL;
+    DBT key;
 
     if (!PyArg_ParseTuple (args, "O", &posting))
         return NULL;
-    return posting;
+    if (segment->format == TERANE_SEGMENT_FORMAT_MSGPACK) {
+        Py_INCREF (posting);
+        return posting;
+    }
+    /* return the binary key as a str, so the Iter doesn't msgpack it */
+    memset (&key, 0, sizeof (DBT));
+    if (_Segment_dump_posting_key (segment, posting, &key) < 0)
+        return NULL;
+    skip = PyString_FromStringAndSize ((char *) key.data, key.size);
+    PyMem_Free (key.data);
+    return skip;
 }
 
 /*
@@ -310,6 +450,7 @@ terane_Segment_iter_postings (terane_Segment *self, PyObject *args)
 {
     terane_Txn *txn = NULL;
     PyObject *start = NULL, *end = NULL;
+    DBT start_key, end_key;
     DBC *cursor = NULL;
     int dbret;
     PyObject *iter = NULL;
@@ -324,14 +465,62 @@ terane_Segment_iter_postings (terane_Segment *self, PyObject *args)
         return PyErr_Format (PyExc_TypeError, "txn must be a Txn or None");
 
     /* create a new cursor */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->postings->cursor (self->postings, txn? txn->txn : NULL, &cursor, 0);
+    Py_END_ALLOW_THREADS
     if (dbret != 0)
         return PyErr_Format (terane_Exc_Error, "Failed to allocate DB cursor: %s",
             db_strerror (dbret));
 
     /* create the Iter */
-    iter = terane_Iter_new_within ((PyObject *) self, cursor, &ops, start, end, 0);
+    if (self->format == TERANE_SEGMENT_FORMAT_MSGPACK)
+        iter = terane_Iter_new_within ((PyObject *) self, cursor, &ops, start, end, 0);
+    else {
+        memset (&start_key, 0, sizeof (DBT));
+        memset (&end_key, 0, sizeof (DBT));
+        if (_Segment_dump_posting_key (self, start, &start_key) < 0)
+            goto error;
+        if (_Segment_dump_posting_key (self, end, &end_key) < 0) {
+            PyMem_Free (start_key.data);
+            goto error;
+        }
+        /* the Iter takes ownership of the key buffers */
+        iter = terane_Iter_new_raw_within ((PyObject *) self, cursor, &ops,
+            &start_key, &end_key, 0);
+    }
+error:
     if (iter == NULL) 
         cursor->close (cursor);
     return iter;
 }
+
+/*
+ * terane_Segment_truncate_postings: Delete all postings in the segment.
+ *
+ * callspec: Segment.truncate_postings(txn)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in
+ * returns: The number of postings deleted.
+ * exceptions:
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to truncate the postings
+ */
+PyObject *
+terane_Segment_truncate_postings (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    u_int32_t count = 0;
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "O!", &terane_TxnType, &txn))
+        return NULL;
+
+    /* delete every record in the postings db */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->postings->truncate (self->postings, txn->txn, &count, 0);
+    Py_END_ALLOW_THREADS
+    if (dbret != 0)
+        return PyErr_Format (terane_Exc_Error, "Failed to truncate postings: %s",
+            db_strerror (dbret));
+    return PyLong_FromUnsignedLong ((unsigned long) count);
+}
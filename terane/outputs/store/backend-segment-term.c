@@ -51,14 +51,15 @@ terane_Segment_get_term (terane_Segment *self, PyObject *args)
 
     /* build the key from the fieldname and term values */
     memset (&key, 0, sizeof (DBT));
-    key.flags = DB_DBT_REALLOC;
     if (_terane_msgpack_dump (term, (char **) &key.data, &key.size) < 0)
         return NULL;
 
     /* get the record */
     memset (&data, 0, sizeof (DBT));
     data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->terms->get (self->terms, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     switch (dbret) {
         case 0:
@@ -79,7 +80,7 @@ terane_Segment_get_term (terane_Segment *self, PyObject *args)
     
     /* free allocated memory */
     if (data.data)
-        PyMem_Free (data.data);
+        free (data.data);
     return value;
 }
 
@@ -121,7 +122,9 @@ terane_Segment_set_term (terane_Segment *self, PyObject *args)
     }
 
     /* set the record */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->terms->put (self->terms, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
     PyMem_Free (key.data);
     PyMem_Free (data.data);
     switch (dbret) {
@@ -134,3 +137,192 @@ terane_Segment_set_term (terane_Segment *self, PyObject *args)
     }
     Py_RETURN_NONE;
 }
+
+/*
+ * terane_Segment_get_term_stats: Retrieve the statistics associated with
+ *  the specified term id.
+ *
+ * callspec: Segment.get_term_stats(txn, id)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in, or None
+ *   id (long): The term id
+ * returns: The term statistics
+ * exceptions:
+ *   KeyError: The specified term id doesn't exist
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to get the record
+ */
+PyObject *
+terane_Segment_get_term_stats (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    unsigned long id = 0;
+    db_recno_t termid = 0;
+    DBT key, data;
+    PyObject *value = NULL;
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "Ok", &txn, &id))
+        return NULL;
+    if ((PyObject *) txn == Py_None)
+        txn = NULL;
+    if (txn && txn->ob_type != &terane_TxnType)
+        return PyErr_Format (PyExc_TypeError, "txn must be a Txn or None");
+    termid = (db_recno_t) id;
+    if (termid == 0)
+        return PyErr_Format (PyExc_KeyError, "Term id 0 doesn't exist");
+
+    /* use the term id as the record number */
+    memset (&key, 0, sizeof (DBT));
+    key.data = &termid;
+    key.size = sizeof (db_recno_t);
+
+    /* get the record */
+    memset (&data, 0, sizeof (DBT));
+    data.flags = DB_DBT_MALLOC;
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->termstats->get (self->termstats, txn? txn->txn : NULL, &key, &data, 0);
+    Py_END_ALLOW_THREADS
+    switch (dbret) {
+        case 0:
+            _terane_msgpack_load ((char *) data.data, data.size, &value);
+            break;
+        case DB_NOTFOUND:
+        case DB_KEYEMPTY:
+            /* term id doesn't exist, raise KeyError */
+            PyErr_Format (PyExc_KeyError, "Term statistics don't exist");
+            break;
+        default:
+            /* some other db error, raise Error */
+            PyErr_Format (terane_Exc_Error, "Failed to get term statistics: %s",
+                db_strerror (dbret));
+            break;
+    }
+
+    /* free allocated memory */
+    if (data.data)
+        free (data.data);
+    return value;
+}
+
+/*
+ * terane_Segment_set_term_stats: Change the statistics associated with
+ *  the specified term id.
+ *
+ * callspec: Segment.set_term_stats(txn, id, value)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in
+ *   id (long): The term id
+ *   value (object): The term statistics
+ * returns: None
+ * exceptions:
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to set the record
+ */
+PyObject *
+terane_Segment_set_term_stats (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    unsigned long id = 0;
+    db_recno_t termid = 0;
+    PyObject *value = NULL;
+    DBT key, data;
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "O!kO", &terane_TxnType, &txn, &id, &value))
+        return NULL;
+    termid = (db_recno_t) id;
+    if (termid == 0)
+        return PyErr_Format (PyExc_ValueError, "Term id must be greater than 0");
+
+    /* use the term id as the record number */
+    memset (&key, 0, sizeof (DBT));
+    key.data = &termid;
+    key.size = sizeof (db_recno_t);
+
+    memset (&data, 0, sizeof (DBT));
+    if (_terane_msgpack_dump (value, (char **) &data.data, &data.size) < 0)
+        return NULL;
+
+    /* set the record */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->termstats->put (self->termstats, txn->txn, &key, &data, 0);
+    Py_END_ALLOW_THREADS
+    PyMem_Free (data.data);
+    switch (dbret) {
+        case 0:
+            break;
+        default:
+            /* some other db error, raise Error */
+            return PyErr_Format (terane_Exc_Error, "Failed to set term statistics: %s",
+                db_strerror (dbret));
+    }
+    Py_RETURN_NONE;
+}
+
+/*
+ * _Segment_next_term: build a (term,value) tuple from the current cursor item
+ */
+static PyObject *
+_Segment_next_term (terane_Iter *iter, DBT *key, DBT *data)
+{
+    PyObject *term = NULL, *value = NULL, *tuple = NULL;
+
+    /* get the term */
+    if (_terane_msgpack_load ((char *) key->data, key->size, &term) < 0)
+        goto error;
+    /* get the value */
+    if (_terane_msgpack_load ((char *) data->data, data->size, &value) < 0)
+        goto error;
+    /* build the (term,value) tuple */
+    tuple = PyTuple_Pack (2, term, value);
+error:
+    Py_XDECREF (term);
+    Py_XDECREF (value);
+    return tuple;
+}
+
+/*
+ * terane_Segment_iter_terms: Iterate through all terms in the segment.
+ *
+ * callspec: Segment.iter_terms(txn)
+ * parameters:
+ *   txn (Txn): A Txn object to wrap the operation in, or None
+ * returns: a new Iterator object.  Each iteration returns a tuple consisting
+ *  of (term,value).
+ * exceptions:
+ *   terane.outputs.store.backend.Error: A db error occurred when trying to get the record
+ */
+PyObject *
+terane_Segment_iter_terms (terane_Segment *self, PyObject *args)
+{
+    terane_Txn *txn = NULL;
+    DBC *cursor = NULL;
+    PyObject *iter = NULL;
+    terane_Iter_ops ops = { .next = _Segment_next_term };
+    int dbret;
+
+    /* parse parameters */
+    if (!PyArg_ParseTuple (args, "O", &txn))
+        return NULL;
+    if ((PyObject *) txn == Py_None)
+        txn = NULL;
+    if (txn && txn->ob_type != &terane_TxnType)
+        return PyErr_Format (PyExc_TypeError, "txn must be a Txn or None");
+
+    /* create a new cursor */
+    Py_BEGIN_ALLOW_THREADS
+    dbret = self->terms->cursor (self->terms, txn? txn->txn : NULL, &cursor, 0);
+    Py_END_ALLOW_THREADS
+    if (dbret != 0)
+        return PyErr_Format (terane_Exc_Error, "Failed to allocate DB cursor: %s",
+            db_strerror (dbret));
+
+    /* allocate a new Iter object */
+    iter = terane_Iter_new ((PyObject *) self, cursor, &ops, 0);
+    if (iter == NULL) {
+        cursor->close (cursor);
+        return NULL;
+    }
+    return iter;
+}
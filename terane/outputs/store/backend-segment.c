@@ -48,6 +48,117 @@ _Segment_new (PyTypeObject *type, PyObject *args, PyObject *kwds)
     return type->tp_alloc (type, 0);
 }
 
+/*
+ * _Segment_load_format: determine the on-disk format version of the segment.
+ *  the version is stored in the segment metadata under the 'format-version'
+ *  key.  if the key doesn't exist and the metadata is empty, then the segment
+ *  is new, so we write the current format version.  otherwise the segment was
+ *  created before format versions were recorded, and uses msgpack postings.
+ *
+ * returns: 0 on success, otherwise -1 and sets an exception.
+ */
+static int
+_Segment_load_format (terane_Segment *self, DB_TXN *segment_txn)
+{
+    PyObject *name = NULL, *version = NULL;
+    DBT key, data, first;
+    DBC *cursor = NULL;
+    int dbret, ret = -1;
+
+    memset (&key, 0, sizeof (DBT));
+    memset (&data, 0, sizeof (DBT));
+
+    /* build the metadata key */
+    name = PyUnicode_FromString ("format-version");
+    if (name == NULL)
+        goto error;
+    if (_terane_msgpack_dump (name, (char **) &key.data, &key.size) < 0)
+        goto error;
+
+    /* look up the format version */
+    data.flags = DB_DBT_MALLOC;
+    dbret = self->metadata->get (self->metadata, segment_txn, &key, &data, 0);
+    switch (dbret) {
+        case 0:
+            if (_terane_msgpack_load ((char *) data.data, data.size, &version) < 0)
+                goto error;
+            self->format = (int) PyInt_AsLong (version);
+            if (PyErr_Occurred ())
+                goto error;
+            ret = 0;
+            goto error;
+        case DB_NOTFOUND:
+        case DB_KEYEMPTY:
+            break;
+        default:
+            PyErr_Format (terane_Exc_Error, "Failed to get format version: %s",
+                db_strerror (dbret));
+            goto error;
+    }
+
+    /* the format version doesn't exist, check whether the metadata is empty */
+    dbret = self->metadata->cursor (self->metadata, segment_txn, &cursor, 0);
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to allocate DB cursor: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+    if (data.data)
+        free (data.data);
+    memset (&data, 0, sizeof (DBT));
+    data.flags = DB_DBT_MALLOC;
+    memset (&first, 0, sizeof (DBT));
+    first.flags = DB_DBT_MALLOC;
+    dbret = cursor->get (cursor, &first, &data, DB_FIRST);
+    if (first.data)
+        free (first.data);
+    switch (dbret) {
+        case 0:
+            /* the segment predates format versions */
+            self->format = TERANE_SEGMENT_FORMAT_MSGPACK;
+            ret = 0;
+            goto error;
+        case DB_NOTFOUND:
+            break;
+        default:
+            PyErr_Format (terane_Exc_Error, "Failed to get metadata: %s",
+                db_strerror (dbret));
+            goto error;
+    }
+
+    /* the segment is new, write the current format version */
+    self->format = TERANE_SEGMENT_FORMAT_CURRENT;
+    if (data.data)
+        free (data.data);
+    memset (&data, 0, sizeof (DBT));
+    version = PyInt_FromLong (TERANE_SEGMENT_FORMAT_CURRENT);
+    if (version == NULL)
+        goto error;
+    if (_terane_msgpack_dump (version, (char **) &data.data, &data.size) < 0)
+        goto error;
+    dbret = self->metadata->put (self->metadata, segment_txn, &key, &data, 0);
+    /* the version was dumped by us rather than allocated by db */
+    PyMem_Free (data.data);
+    data.data = NULL;
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to set format version: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+    ret = 0;
+
+error:
+    if (cursor != NULL)
+        cursor->close (cursor);
+    if (key.data)
+        PyMem_Free (key.data);
+    if (data.data)
+        free (data.data);
+    Py_XDECREF (name);
+    Py_XDECREF (version);
+    return ret;
+}
+
 /*
  * _Segment_init: initialize a Segment object.
  *
@@ -120,6 +231,9 @@ _Segment_init (terane_Segment *self, PyObject *args, PyObject *kwds)
             db_strerror (dbret));
         goto error;
     }
+    /* determine the segment format version */
+    if (_Segment_load_format (self, segment_txn) < 0)
+        goto error;
 
     /* create the DB handle for events */
     dbret = db_create (&self->events, self->index->env->env, 0);
@@ -146,8 +260,9 @@ _Segment_init (terane_Segment *self, PyObject *args, PyObject *kwds)
             db_strerror (dbret));
         goto error;
     }
-    /* set compare function */
-    self->postings->set_bt_compare (self->postings, _terane_msgpack_DB_compare);
+    /* set compare function.  binary posting keys use the default comparison */
+    if (self->format == TERANE_SEGMENT_FORMAT_MSGPACK)
+        self->postings->set_bt_compare (self->postings, _terane_msgpack_DB_compare);
     /* open the postings DB */
     dbret = self->postings->open (self->postings, segment_txn, self->name,
         "postings", DB_BTREE, DB_CREATE | DB_THREAD | DB_MULTIVERSION, 0);
@@ -193,6 +308,38 @@ _Segment_init (terane_Segment *self, PyObject *args, PyObject *kwds)
         goto error;
     }
 
+    /* create the DB handle for term statistics */
+    dbret = db_create (&self->termstats, self->index->env->env, 0);
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to create handle for termstats: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+    /* open the termstats DB.  term ids are dense, so records are numbered */
+    dbret = self->termstats->open (self->termstats, segment_txn, self->name,
+        "termstats", DB_RECNO, DB_CREATE | DB_THREAD | DB_MULTIVERSION, 0);
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to open termstats: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+
+    /* create the DB handle for posting blocks */
+    dbret = db_create (&self->blocks, self->index->env->env, 0);
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to create handle for blocks: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+    /* open the blocks DB.  block keys are binary, so use the default comparison */
+    dbret = self->blocks->open (self->blocks, segment_txn, self->name,
+        "blocks", DB_BTREE, DB_CREATE | DB_THREAD | DB_MULTIVERSION, 0);
+    if (dbret != 0) {
+        PyErr_Format (terane_Exc_Error, "Failed to open blocks: %s",
+            db_strerror (dbret));
+        goto error;
+    }
+
     /* commit new databases */
     dbret = segment_txn->commit (segment_txn, 0);
     if (dbret != 0) {
@@ -283,6 +430,24 @@ terane_Segment_close (terane_Segment *self)
     }
     self->terms = NULL;
 
+    /* close the termstats db */
+    if (self->termstats != NULL) {
+        dbret = self->termstats->close (self->termstats, 0);
+        if (dbret != 0)
+            PyErr_Format (terane_Exc_Error, "Failed to close termstats DB: %s",
+                db_strerror (dbret));
+    }
+    self->termstats = NULL;
+
+    /* close the blocks db */
+    if (self->blocks != NULL) {
+        dbret = self->blocks->close (self->blocks, 0);
+        if (dbret != 0)
+            PyErr_Format (terane_Exc_Error, "Failed to close blocks DB: %s",
+                db_strerror (dbret));
+    }
+    self->blocks = NULL;
+
     /* if this segment is marked to be deleted */
     if (self->deleted) {
         dbret = self->index->env->env->dbremove (self->index->env->env, NULL,
@@ -306,6 +471,8 @@ PyMethodDef _Segment_methods[] =
         "Get a field metadata value." },
     { "set_field", (PyCFunction) terane_Segment_set_field, METH_VARARGS,
         "Set a field metadata value." },
+    { "iter_fields", (PyCFunction) terane_Segment_iter_fields, METH_VARARGS,
+        "Iterates through all fields in the segment." },
     { "new_event", (PyCFunction) terane_Segment_new_event, METH_VARARGS,
         "Create a new event." },
     { "get_event", (PyCFunction) terane_Segment_get_event, METH_VARARGS,
@@ -324,6 +491,12 @@ PyMethodDef _Segment_methods[] =
         "Get metadata for a term in the segment." },
     { "set_term", (PyCFunction) terane_Segment_set_term, METH_VARARGS,
         "Set metadata for a term in the segment." },
+    { "iter_terms", (PyCFunction) terane_Segment_iter_terms, METH_VARARGS,
+        "Iterates through all terms in the segment." },
+    { "get_term_stats", (PyCFunction) terane_Segment_get_term_stats, METH_VARARGS,
+        "Get statistics for a term id in the segment." },
+    { "set_term_stats", (PyCFunction) terane_Segment_set_term_stats, METH_VARARGS,
+        "Set statistics for a term id in the segment." },
     { "get_posting", (PyCFunction) terane_Segment_get_posting, METH_VARARGS,
         "Get a posting in the segment inverted index." },
     { "contains_posting", (PyCFunction) terane_Segment_contains_posting, METH_VARARGS,
@@ -334,6 +507,12 @@ PyMethodDef _Segment_methods[] =
         "Returns the percentage of postings in the field within the given range." },
     { "iter_postings", (PyCFunction) terane_Segment_iter_postings, METH_VARARGS,
         "Iterates through all postings in the segment." },
+    { "truncate_postings", (PyCFunction) terane_Segment_truncate_postings, METH_VARARGS,
+        "Deletes all postings in the segment." },
+    { "set_posting_block", (PyCFunction) terane_Segment_set_posting_block, METH_VARARGS,
+        "Write a compressed block of postings for a term id." },
+    { "iter_posting_blocks", (PyCFunction) terane_Segment_iter_posting_blocks, METH_VARARGS,
+        "Iterates through the posting blocks for a term id." },
     { "delete", (PyCFunction) terane_Segment_delete, METH_NOARGS,
         "Mark the DB Segment for deletion.  Actual deletion will not occur until the Segment is deallocated." },
     { "close", (PyCFunction) terane_Segment_close, METH_NOARGS,
@@ -94,7 +94,9 @@ terane_Txn_new (terane_Env *env, terane_Txn *parent, PyObject *args, PyObject *k
     txn->env = env;
     /* create the DB_TXN handle */
     txn->txn = NULL;
+    Py_BEGIN_ALLOW_THREADS
     dbret = env->env->txn_begin (env->env, parent ? parent->txn : NULL, &txn->txn, dbflags);
+    Py_END_ALLOW_THREADS
     if (dbret != 0) {
         PyErr_Format (terane_Exc_Error, "Failed to create DB_TXN: %s", db_strerror (dbret));
         goto error;
@@ -176,7 +178,9 @@ terane_Txn_commit (terane_Txn *self)
     if (self->txn == NULL)
         return PyErr_Format (terane_Exc_Error, "Failed to commit transaction: DB_TXN handle is NULL");
     /* try to commit the transaction */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->txn->commit (self->txn, 0);
+    Py_END_ALLOW_THREADS
     /* 
      * regardless of return status, the DB_TXN handle is invalid now, as are all child
      * transactions, so discard all references to them.
@@ -196,6 +200,8 @@ terane_Txn_commit (terane_Txn *self)
             PyErr_Format (terane_Exc_Error, "Failed to commit transaction: %s", db_strerror (dbret));
             break;
     }
+    if (dbret != 0)
+        return NULL;
     Py_RETURN_NONE;
 }
 
@@ -216,7 +222,9 @@ terane_Txn_abort (terane_Txn *self)
     if (self->txn == NULL)
         return PyErr_Format (terane_Exc_Error, "Failed to abort transaction: DB_TXN handle is NULL");
     /* abort the transaction */
+    Py_BEGIN_ALLOW_THREADS
     dbret = self->txn->abort (self->txn);
+    Py_END_ALLOW_THREADS
     /* 
      * regardless of return status, the DB_TXN handle is invalid now, as are all child
      * transactions, so discard all references to them.
@@ -230,6 +238,8 @@ terane_Txn_abort (terane_Txn *self)
             PyErr_Format (terane_Exc_Error, "Failed to abort transaction: %s", db_strerror (dbret));
             break;
     }
+    if (dbret != 0)
+        return NULL;
     Py_RETURN_NONE;
 }
 
@@ -24,16 +24,27 @@ initbackend (void)
     PyObject *m;
     int dbret;
 
-    /* set berkeley db to use the python memory allocation functions */
-    if ((dbret = db_env_set_func_malloc (PyMem_Malloc)) != 0) {
+    /*
+     * make sure the GIL exists, since DB calls are made with the GIL
+     * released so the store can be written from a separate thread.
+     */
+    PyEval_InitThreads ();
+
+    /*
+     * set berkeley db to use the C library memory allocation functions.  db
+     * calls are made with the GIL released, so db must not allocate memory
+     * with the python allocator.  memory returned by db, such as DBT data
+     * retrieved with DB_DBT_MALLOC, must be released with free().
+     */
+    if ((dbret = db_env_set_func_malloc (malloc)) != 0) {
         PyErr_Format (PyExc_SystemError, "Failed to set internal memory routines: %s", db_strerror (dbret));
         return;
     }
-    if ((dbret = db_env_set_func_realloc (PyMem_Realloc)) != 0) {
+    if ((dbret = db_env_set_func_realloc (realloc)) != 0) {
         PyErr_Format (PyExc_SystemError, "Failed to set internal memory routines: %s", db_strerror (dbret));
         return;
     }
-    if ((dbret = db_env_set_func_free (PyMem_Free)) != 0) {
+    if ((dbret = db_env_set_func_free (free)) != 0) {
         PyErr_Format (PyExc_SystemError, "Failed to set internal memory routines: %s", db_strerror (dbret));
         return;
     }
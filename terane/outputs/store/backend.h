@@ -93,6 +93,9 @@ typedef struct _terane_Iter {
     terane_iterkey *start;
     terane_iterkey *end;
     DBT range;
+    DBT range_end;
+    int rawkeys;
+    int skiprange;
     int reverse;
     PyObject *(*next)(struct _terane_Iter *, DBT *, DBT *);
     PyObject *(*skip)(struct _terane_Iter *, PyObject *);
@@ -123,6 +126,9 @@ typedef struct _terane_Segment {
     DB *postings;           /* DB handle to the segment postings */
     DB *fields;             /* DB handle to the segment fields */
     DB *terms;              /* DB handle to the segment terms */
+    DB *termstats;          /* DB handle to the segment term statistics */
+    DB *blocks;             /* DB handle to the segment posting blocks */
+    int format;             /* the on-disk format version of the segment */
     int deleted;            /* non-zero if the segment is scheduled to be deleted */
 } terane_Segment;
 
@@ -158,6 +164,7 @@ PyObject * terane_Segment_set_meta (terane_Segment *self, PyObject *args);
 
 PyObject * terane_Segment_get_field (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_set_field (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_iter_fields (terane_Segment *self, PyObject *args);
 
 PyObject * terane_Segment_new_event (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_get_event (terane_Segment *self, PyObject *args);
@@ -169,12 +176,22 @@ PyObject * terane_Segment_iter_events (terane_Segment *self, PyObject *args);
 
 PyObject * terane_Segment_get_term (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_set_term (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_iter_terms (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_get_term_stats (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_set_term_stats (terane_Segment *self, PyObject *args);
 
 PyObject * terane_Segment_get_posting (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_set_posting (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_contains_posting (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_estimate_postings (terane_Segment *self, PyObject *args);
 PyObject * terane_Segment_iter_postings (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_truncate_postings (terane_Segment *self, PyObject *args);
+int        _terane_check_posting_key (unsigned long termid, unsigned long ts);
+void       _terane_pack_posting_key (unsigned long termid, unsigned long ts, unsigned PY_LONG_LONG offset, unsigned char *buf);
+PyObject * _terane_load_posting_key (DBT *key);
+
+PyObject * terane_Segment_set_posting_block (terane_Segment *self, PyObject *args);
+PyObject * terane_Segment_iter_posting_blocks (terane_Segment *self, PyObject *args);
 
 PyObject * terane_Segment_delete (terane_Segment *self);
 PyObject * terane_Segment_close (terane_Segment *self);
@@ -190,7 +207,11 @@ PyObject * terane_Iter_new (PyObject *parent, DBC *cursor, terane_Iter_ops *ops,
 PyObject * terane_Iter_new_range (PyObject *parent, DBC *cursor, terane_Iter_ops *ops, PyObject *key, int reverse);
 PyObject * terane_Iter_new_from (PyObject *parent, DBC *cursor, terane_Iter_ops *ops, PyObject *key, int reverse);
 PyObject * terane_Iter_new_within (PyObject *parent, DBC *cursor, terane_Iter_ops *ops, PyObject *start, PyObject *end, int reverse);
+PyObject * terane_Iter_new_raw_within (PyObject *parent, DBC *cursor, terane_Iter_ops *ops, DBT *start, DBT *end, int reverse);
 PyObject * terane_Iter_skip (terane_Iter *self, PyObject *args);
+PyObject * terane_Iter_seek (terane_Iter *self, PyObject *args);
+PyObject * terane_Iter_next_block (terane_Iter *self, PyObject *args);
+PyObject * terane_Iter_skip_block (terane_Iter *self, PyObject *args);
 PyObject * terane_Iter_close (terane_Iter *self);
 
 /*
@@ -207,6 +228,7 @@ PyObject *      terane_msgpack_dump (PyObject *self, PyObject *args);
 terane_value *  _terane_msgpack_make_value (PyObject *obj);
 int             _terane_msgpack_load_value (char *buf, uint32_t len, char **pos, terane_value *val);
 int             _terane_msgpack_load (char *buf, uint32_t len, PyObject **dest);
+int             _terane_msgpack_load_fields (char *buf, uint32_t len, PyObject *fields, PyObject **dest);
 PyObject *      terane_msgpack_load (PyObject *self, PyObject *args);
 int             _terane_msgpack_cmp_values (terane_value *v1, terane_value *v2);
 int             _terane_msgpack_cmp (char *b1, uint32_t l1, char *b2, uint32_t l2, int *result);
@@ -249,6 +271,22 @@ typedef enum {
     TERANE_MSGPACK_TYPE_DICT    = 11
 } terane_msgpack_type;
 
+/*
+ * segment format versions.  in TERANE_SEGMENT_FORMAT_MSGPACK segments, posting
+ * keys are msgpack lists of [fieldname, fieldtype, term, ts, offset] which are
+ * ordered by _terane_msgpack_DB_compare.  in TERANE_SEGMENT_FORMAT_BINARY
+ * segments, posting keys are TERANE_POSTING_KEY_SIZE bytes long, consisting of
+ * the term id, ts and offset packed in big-endian order, which are ordered by
+ * the default DB key comparison.
+ */
+#define TERANE_SEGMENT_FORMAT_MSGPACK   1
+#define TERANE_SEGMENT_FORMAT_BINARY    2
+#define TERANE_SEGMENT_FORMAT_CURRENT   TERANE_SEGMENT_FORMAT_BINARY
+
+#define TERANE_POSTING_KEY_SIZE         16
+#define TERANE_POSTING_KEY_MAX_TERMID   0xffffffffUL
+#define TERANE_POSTING_KEY_MAX_TS       0xffffffffUL
+
 /*
  * iteration type constants
  */
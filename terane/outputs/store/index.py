@@ -15,15 +15,16 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
-import time, datetime
+import time, datetime, threading
 from zope.interface import implements
 from terane.bier import IIndex
 from terane.bier.evid import EVID, EVID_MIN
 from terane.outputs.store import backend
-from terane.outputs.store.segment import Segment
+from terane.outputs.store.segment import Segment, FORMAT_MSGPACK
 from terane.outputs.store.schema import Schema
 from terane.outputs.store.searching import IndexSearcher
 from terane.outputs.store.writing import IndexWriter
+from terane.outputs.store.merging import findMergeCandidates, mergeSegments, MergeAborted
 from terane.loggers import getLogger
 
 logger = getLogger('terane.outputs.store.index')
@@ -50,24 +51,49 @@ class Index(backend.Index):
         self._currentSize = 0
         self._lastModified = 0
         self._lastId = EVID_MIN
+        # incremented whenever the searchable contents of the index change
+        self._generation = 0
+        # protects the segment list, which is modified by both the writer
+        # and the merge threads.  once the index is open, the segment list is
+        # never modified in place, only replaced, so readers in other threads
+        # can take a reference to it without holding the lock.
+        self._segmentsLock = threading.RLock()
         backend.Index.__init__(self, env, name)
         try:
             # load schema
             self._schema = Schema(self, fieldstore)
             # load data segments
+            sizes = {}
+            incomplete = []
             with self.new_txn() as txn:
                 for segmentId in self.iter_segments(txn):
                     segment = Segment(txn, self, segmentId)
+                    # a merged segment which never committed duplicates the
+                    # events in the segments it was meant to replace
+                    try:
+                        if segment.get_meta(txn, u'merge-incomplete'):
+                            incomplete.append(segment)
+                            continue
+                    except KeyError:
+                        pass
                     last_update = segment.get_meta(txn, u'last-update')
-                    self._currentSize = last_update[u'size']
+                    sizes[segmentId] = last_update[u'size']
                     self._indexSize += last_update[u'size']
                     lastId = last_update[u'last-id']
                     lastId = EVID(lastId[0], lastId[1])
                     if lastId > self._lastId:
-                        self._lastId = last_update[u'last-id']
+                        self._lastId = lastId
                     if last_update[u'last-modified'] > self._lastModified:
                         self._lastModified = last_update[u'last-modified']
                     self._segments.append(segment)
+            for segment in incomplete:
+                self._discard(segment)
+                logger.info("discarded incomplete merged segment %s" % segment.fullName)
+            # merged segments are allocated after the segments they replace,
+            # so order the segments by sequence rather than segment id
+            self._segments.sort(key=lambda segment: segment.sequence)
+            if self._segments != []:
+                self._currentSize = sizes[self._segments[-1].segmentId]
             # if the index has no segments, create one
             if self._segments == []:
                 with self.new_txn() as txn:
@@ -85,7 +111,7 @@ class Index(backend.Index):
             else:
                 logger.info("found %i events in %i segments for index '%s'" % (
                     self._indexSize, len(self._segments), name))
-            logger.debug("last evid is %s" % self._lastId)
+            logger.debug("last evid is %s" % str(self._lastId))
             # get a reference to the current segment
             self._current = self._segments[-1]
             logger.debug("opened event index '%s'" % self.name)
@@ -121,48 +147,177 @@ class Index(backend.Index):
             "current-segment-size": self._currentSize,
             "num-segments": len(self._segments),
             "last-modified": lastModified,
-            "last-event": self._lastId
+            "last-event": str(self._lastId)
             }
 
+    def getGeneration(self):
+        """
+        Returns the generation of the index, which changes whenever events
+        are written or segments are added, merged or deleted.
+        """
+        return self._generation
+
+    def _updateStats(self, numEvents, lastId, lastModified):
+        """
+        Update the in-memory view of the index metadata after an IndexWriter
+        has committed events to the current segment.  The last event id and
+        last-modified time only ever move forward, so getStats() never needs
+        to read the segment metadata from the DB.
+        """
+        # the merge thread also increments the generation
+        with self._segmentsLock:
+            self._indexSize += numEvents
+            self._currentSize += numEvents
+            if lastId > self._lastId:
+                self._lastId = lastId
+            if lastModified > self._lastModified:
+                self._lastModified = lastModified
+            self._generation += 1
+
     def rotateSegments(self, segRotation, segRetention):
         """
         Allocate a new Segment, making it the new current segment.
+
+        :returns: The sealed previous current Segment if the index was rotated
+          and the segment was not deleted by the retention policy, otherwise None.
+        :rtype: :class:`terane.outputs.store.segment.Segment`
         """
         # if the current segment contains more events than specified by
         # segRotation, then rotate the index to generate a new segment.
         if segRotation > 0 and self._currentSize >= segRotation:
+            sealed = self._current
+            with self._segmentsLock:
+                with self.new_txn() as txn:
+                    segmentId = self.new_segment(txn)
+                    segment = Segment(txn, self, segmentId)
+                    segment.set_meta(txn, u'created-on', int(time.time()))
+                    last_update = {
+                        u'size': 0,
+                        u'last-id': [EVID_MIN.ts, EVID_MIN.offset],
+                        u'last-modified': 0
+                        }
+                    segment.set_meta(txn, u'last-update', last_update)
+                self._segments = self._segments + [segment]
+                self._current = segment
+                self._currentSize = 0
+                self._generation += 1
+                logger.debug("rotated current segment, new segment is %s" % segment.fullName)
+                # if the index contains more segments than specified by segRetention,
+                # then delete the oldest segment.
+                if segRetention > 0:
+                    if len(self._segments) > segRetention:
+                        for segment in self._segments[0:len(self._segments)-segRetention]:
+                            self.delete(segment)
+            # the previous segment is sealed, so it can be optimized
+            if sealed in self._segments:
+                return sealed
+        return None
+
+    def optimizeSegment(self, segment, blockSize):
+        """
+        Rewrite the postings in the specified sealed Segment into compressed
+        posting blocks.  Segments using the msgpack format cannot be optimized,
+        and are left as-is.  Optimizing rewrites every posting in the segment,
+        so this method should not run in the reactor thread.
+        """
+        with self._segmentsLock:
+            if not segment in self._segments:
+                logger.debug("not optimizing segment %s, segment was deleted" % segment.fullName)
+                return
+        if segment.formatVersion == FORMAT_MSGPACK:
+            logger.debug("not optimizing segment %s, format doesn't support posting blocks"
+                % segment.fullName)
+            return
+        with self.new_txn() as txn:
+            numBlocks = segment.optimize(txn, blockSize)
+        logger.debug("optimized segment %s into %i posting blocks" % (segment.fullName, numBlocks))
+
+    def findMerge(self, mergeFactor):
+        """
+        Returns a list of adjacent sealed Segments which should be merged, or
+        None if no segments need merging.
+        """
+        with self._segmentsLock:
+            sealed = self._segments[:-1]
+        with self.new_txn() as txn:
+            return findMergeCandidates(txn, sealed, mergeFactor)
+
+    def mergeSegments(self, segments, segOptimize=False, blockSize=128):
+        """
+        Merge the specified adjacent sealed Segments into a new Segment, then
+        atomically replace them in the segment list.  This method does not
+        need to run in the reactor thread.
+
+        :returns: The merged Segment.
+        :rtype: :class:`terane.outputs.store.segment.Segment`
+        """
+        # allocate the merged segment.  it is marked incomplete until the merge
+        # commits, so a merge interrupted by a crash is discarded on restart.
+        with self._segmentsLock:
             with self.new_txn() as txn:
                 segmentId = self.new_segment(txn)
-                segment = Segment(txn, self, segmentId)
-                segment.set_meta(txn, u'created-on', int(time.time()))
-                last_update = {
-                    u'size': 0,
-                    u'last-id': [EVID_MIN.ts, EVID_MIN.offset],
-                    u'last-modified': 0
-                    }
-                segment.set_meta(txn, u'last-update', last_update)
-            self._segments.append(segment)
-            self._current = segment
-            self._currentSize = 0
-            logger.debug("rotated current segment, new segment is %s" % segment.fullName)
-            # if the index contains more segments than specified by segRetention,
-            # then delete the oldest segment.
-            if segRetention > 0:
-                if len(self._segments) > segRetention:
-                    for segment in self._segments[0:len(self._segments)-segRetention]:
-                        self.delete(segment)
+                merged = Segment(txn, self, segmentId)
+                merged.set_meta(txn, u'merge-incomplete', True)
+        try:
+            txn = self.new_txn()
+            try:
+                size = mergeSegments(txn, merged, segments)
+                if segOptimize:
+                    merged.optimize(txn, blockSize)
+                merged.set_meta(txn, u'merge-incomplete', False)
+                with self._segmentsLock:
+                    # retention may have deleted some of the segments during the merge
+                    if not segments[0] in self._segments:
+                        raise MergeAborted()
+                    first = self._segments.index(segments[0])
+                    last = first + len(segments)
+                    if self._segments[first:last] != segments or last == len(self._segments):
+                        raise MergeAborted()
+                    for segment in segments:
+                        self.delete_segment(txn, segment.segmentId)
+                    txn.commit()
+                    txn = None
+                    merged.sequence = segments[0].sequence
+                    self._segments = self._segments[:first] + [merged] + self._segments[last:]
+                    self._generation += 1
+            finally:
+                if txn != None:
+                    txn.abort()
+        except:
+            self._discard(merged)
+            raise
+        # the replaced segments are physically deleted once no searcher
+        # holds a reference to them
+        for segment in segments:
+            segment.delete()
+        logger.debug("merged %i segments into segment %s containing %i events" %
+            (len(segments), merged.fullName, size))
+        return merged
+
+    def _discard(self, segment):
+        """
+        Remove a Segment which is not in the segment list from the TOC, and
+        delete it.
+        """
+        with self._segmentsLock:
+            with self.new_txn() as txn:
+                self.delete_segment(txn, segment.segmentId)
+        segment.delete()
+        segment.close()
 
     def delete(self, segment):
         """
         Delete the specified Segment.
         """
         fullName = segment.fullName
-        # remove the segment from the segment list
-        self._segments.remove(segment)
-        # remove the segment from the TOC.  this also marks the segment
-        # for eventual physical deletion, when the Segment is deallocated.
-        with self.new_txn() as txn:
-            self.delete_segment(txn, segment.segmentId)
+        with self._segmentsLock:
+            # remove the segment from the segment list
+            self._segments = [s for s in self._segments if s is not segment]
+            self._generation += 1
+            # remove the segment from the TOC.  this also marks the segment
+            # for eventual physical deletion, when the Segment is deallocated.
+            with self.new_txn() as txn:
+                self.delete_segment(txn, segment.segmentId)
         segment.delete()
         logger.debug("deleted segment %s" % fullName)
 
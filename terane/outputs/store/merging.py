@@ -0,0 +1,158 @@
+# Copyright 2010,2011 Michael Frank <msfrank@syntaxjockey.com>
+#
+# This file is part of Terane.
+#
+# Terane is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Terane is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Terane.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from terane.bier.evid import EVID, EVID_MIN, EVID_MAX
+from terane.outputs.store.segment import FORMAT_MSGPACK, MAX_TERM_ID
+from terane.loggers import getLogger
+
+logger = getLogger('terane.outputs.store.merging')
+
+class MergeAborted(Exception):
+    """
+    The segments being merged changed while the merge was running.
+    """
+    pass
+
+def segmentTier(size, mergeFactor):
+    """
+    Returns the size tier of a segment containing size events.  Each tier
+    holds segments up to mergeFactor times larger than the previous tier.
+    """
+    if size < mergeFactor:
+        return 0
+    return int(math.log(size, mergeFactor))
+
+def findMergeCandidates(txn, segments, mergeFactor):
+    """
+    Find a run of mergeFactor adjacent segments which are all in the same size
+    tier.  Merging only adjacent segments preserves the chronological order of
+    the segment list.  Segments using the msgpack format cannot be merged.
+
+    :param txn: The transaction to read the segment metadata in.
+    :type txn: :class:`terane.outputs.store.backend.Txn`
+    :param segments: The sealed segments, in sequence order.
+    :type segments: list
+    :param mergeFactor: The number of segments to merge at once.
+    :type mergeFactor: int
+    :returns: The list of segments to merge, or None.
+    :rtype: list
+    """
+    run = []
+    runTier = None
+    for segment in segments:
+        if segment.formatVersion == FORMAT_MSGPACK:
+            run = []
+            continue
+        size = segment.get_meta(txn, u'last-update')[u'size']
+        tier = segmentTier(size, mergeFactor)
+        if run == [] or tier != runTier:
+            run = []
+            runTier = tier
+        run.append(segment)
+        if len(run) == mergeFactor:
+            return run
+    return None
+
+def mergeSegments(txn, merged, segments):
+    """
+    Copy the events, postings, fields and term dictionaries of the specified
+    segments into the merged segment.  Term ids are reassigned, so the merged
+    term dictionary is dense and ordered by term.
+
+    :param txn: The transaction to wrap the merge in.
+    :type txn: :class:`terane.outputs.store.backend.Txn`
+    :param merged: The new segment.
+    :type merged: :class:`terane.outputs.store.segment.Segment`
+    :param segments: The segments to merge.
+    :type segments: list
+    :returns: The number of events in the merged segment.
+    :rtype: int
+    """
+    # build the merged term dictionary
+    terms = {}
+    for i in range(len(segments)):
+        for key,termId in segments[i].iter_terms(txn):
+            terms.setdefault(tuple(key), []).append((i, termId))
+    remap = [dict() for segment in segments]
+    newId = 0
+    if len(terms) > MAX_TERM_ID:
+        raise ValueError("merged segment would need %i term ids, the maximum is %i"
+            % (len(terms), MAX_TERM_ID))
+    for key in sorted(terms.keys()):
+        newId += 1
+        numDocs = 0
+        for i,termId in terms[key]:
+            remap[i][termId] = newId
+            numDocs += segments[i].get_term_stats(txn, termId)[u'num-docs']
+        merged.set_term(txn, list(key), newId)
+        merged.set_term_stats(txn, newId, {u'num-docs': numDocs})
+    merged.set_meta(txn, u'last-term-id', newId)
+    del terms
+    # sum the field document counts
+    fields = {}
+    for segment in segments:
+        for key,value in segment.iter_fields(txn):
+            key = tuple(key)
+            fields[key] = fields.get(key, 0) + value[u'num-docs']
+    for key in sorted(fields.keys()):
+        merged.set_field(txn, list(key), {u'num-docs': fields[key]})
+    # copy the events
+    start = [EVID_MIN.ts, EVID_MIN.offset]
+    end = [EVID_MAX.ts, EVID_MAX.offset]
+    for segment in segments:
+        for evid,_ in segment.iter_events(txn, start, end):
+            merged.set_event(txn, evid, segment.get_event(txn, evid))
+    # copy the postings, translating the term ids
+    for i in range(len(segments)):
+        termIds = remap[i]
+        for termId,ts,offset,value in segments[i].iterPostingRecords(txn):
+            merged.set_posting(txn, [termIds[termId], ts, offset], value)
+    # combine the segment metadata
+    size = 0
+    lastId = EVID_MIN
+    lastModified = 0
+    createdOn = None
+    for segment in segments:
+        lastUpdate = segment.get_meta(txn, u'last-update')
+        size += lastUpdate[u'size']
+        segmentLastId = EVID(lastUpdate[u'last-id'][0], lastUpdate[u'last-id'][1])
+        if segmentLastId > lastId:
+            lastId = segmentLastId
+        lastModified = max(lastModified, lastUpdate[u'last-modified'])
+        try:
+            segmentCreatedOn = segment.get_meta(txn, u'created-on')
+            if createdOn == None or segmentCreatedOn < createdOn:
+                createdOn = segmentCreatedOn
+        except KeyError:
+            pass
+    for segment in segments:
+        if segment.minId != None:
+            merged.widenRange(segment.minId, segment.maxId)
+    lastUpdate = {
+        u'size': size,
+        u'last-id': [lastId.ts, lastId.offset],
+        u'last-modified': lastModified
+        }
+    if merged.minId != None:
+        lastUpdate[u'min-id'] = [merged.minId.ts, merged.minId.offset]
+        lastUpdate[u'max-id'] = [merged.maxId.ts, merged.maxId.offset]
+    merged.set_meta(txn, u'last-update', lastUpdate)
+    if createdOn != None:
+        merged.set_meta(txn, u'created-on', createdOn)
+    merged.set_meta(txn, u'sequence', segments[0].sequence)
+    return size
@@ -32,6 +32,7 @@ class Schema(object):
         self._index = index
         self._fields = {}
         self._fieldstore = fieldstore
+        self._version = 0
         # load schema data from the db
         with self._index.new_txn() as txn:
             for fieldname,fieldspec in self._index.iter_fields(txn):
@@ -56,6 +57,7 @@ class Schema(object):
         with self._index.new_txn() as txn:
             self._index.add_field(txn, fieldname, unicode(pickle.dumps(fieldspec)))
         self._fields[fieldname] = fieldspec
+        self._version += 1
         return stored
 
     def getField(self, fieldname, fieldtype):
@@ -78,5 +80,8 @@ class Schema(object):
             return False
         return True
 
+    def getVersion(self):
+        return self._version
+
     def listFields(self):
         return self._cached.itervalues()
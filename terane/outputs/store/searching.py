@@ -15,10 +15,12 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
-import math
+import math, bisect
 from zope.interface import implements
 from terane.bier import ISearcher, IPostingList, IEventStore
 from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
+from terane.outputs.store.segment import FORMAT_MSGPACK
 from terane.loggers import getLogger
 
 logger = getLogger('terane.outputs.store.searching')
@@ -37,7 +39,10 @@ class IndexSearcher(object):
         :type ix: :class:`terane.outputs.store.index.Index`
         """
         txn = ix.new_txn(TXN_SNAPSHOT=True)
-        self._segmentSearchers = [SegmentSearcher(s,txn) for s in ix._segments]
+        # the segment list is replaced rather than modified by the writer and
+        # merge threads, so this reference stays consistent while we iterate
+        segments = ix._segments
+        self._segmentSearchers = [SegmentSearcher(s,txn) for s in segments]
         self._txn = txn
 
     def postingsLength(self, field, term, startId, endId):
@@ -57,7 +62,7 @@ class IndexSearcher(object):
         :rtype: int
         """
         length = 0
-        for searcher in self._segmentSearchers:
+        for searcher in self._searchersWithin(startId, endId):
             length += searcher.postingsLength(field, term, startId, endId)
         return length
 
@@ -79,12 +84,56 @@ class IndexSearcher(object):
         :returns: An object for iterating through events matching the query.
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
-        iters = [s.iterPostings(field, term, startId, endId) for s in self._segmentSearchers]
-        if endId < startId:
-            compar = lambda d1,d2: cmp(d2,d1)
-        else:
-            compar = cmp
-        return MergedPostingList(iters, compar)
+        iters = [s.iterPostings(field, term, startId, endId)
+            for s in self._searchersWithin(startId, endId)]
+        return MergedPostingList(iters, endId < startId)
+
+    def countPostings(self, field, term, startId, endId):
+        """
+        Returns the exact number of postings in the index within the specified
+        period.
+
+        :param field: The field to search within.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :param term: The term to search for.
+        :type term: object
+        :param startId:
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId:
+        :type endId: :class:`terane.bier.evid.EVID`
+        :returns: The number of postings.
+        :rtype: int
+        """
+        count = 0
+        for searcher in self._searchersWithin(startId, endId):
+            count += searcher.countPostings(field, term, startId, endId)
+        return count
+
+    def iterTerms(self, field, startId, endId):
+        """
+        Returns an iterator yielding each term in the field which is present in
+        a segment overlapping the specified period, in sorted order.
+
+        :param field: The field to list terms for.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :param startId:
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId:
+        :type endId: :class:`terane.bier.evid.EVID`
+        :returns: An iterator yielding terms.
+        :rtype: iterator
+        """
+        terms = set()
+        for searcher in self._searchersWithin(startId, endId):
+            terms.update(searcher.iterTerms(field))
+        return iter(sorted(terms))
+
+    def _searchersWithin(self, startId, endId):
+        """
+        Returns the SegmentSearchers for the segments which may contain evids
+        between startId and endId.
+        """
+        return [s for s in self._segmentSearchers if s._segment.overlaps(startId, endId)]
 
     def close(self):
         for searcher in self._segmentSearchers: searcher.close()
@@ -92,90 +141,20 @@ class IndexSearcher(object):
         self._txn.abort()
         self._txn = None
 
-class MergedPostingList(object):
+class MergedPostingList(PostingHeap):
     """
     MergedPostingList iterates through a sequence of PostingList instances,
     merging the results in chronological order.
     """
 
-    implements(IPostingList)
-
-    def __init__(self, iters, compar):
+    def __init__(self, iters, reverse=False):
         """
         :param iters: A sequence of :class:`terane.outputs.store.searching.PostingList` objects.
         :type iters: list
+        :param reverse: If True, then merge in reverse chronological order.
+        :type reverse: bool
         """
-        self._iters = iters
-        self._cmp = compar
-        self._smallestPostings = [(None,None,None) for i in range(len(iters))]
-        self._lastId = None
-
-    def nextPosting(self):
-        """
-        Returns the next posting, or None if iteration is finished.
-
-        :returns: The next posting, which is a tuple containing the evid, the
-          term value, and the searcher, or (None,None,None)
-        :rtype: tuple
-        """
-        curr = 0
-        # check each child iter for the lowest evid
-        for i in range(len(self._iters)):
-            # if None, then get the next posting from the iter
-            if self._smallestPostings[i][0] == None:
-                self._smallestPostings[i] = self._iters[i].nextPosting()
-            # if the posting evid is None, then check the next iter
-            if self._smallestPostings[i][0] == None:
-                continue
-            # if the evid equals the last evid returned, then ignore it
-            if self._lastId != None and self._smallestPostings[i][0] == self._lastId:
-                self._smallestPostings[i] = (None,None,None)
-                continue
-            # we don't compare the first evid with itself
-            if i == 0:
-                continue
-            # if the evid is the current smallest evid, then remember it
-            if self._smallestPostings[curr][0] == None or \
-              self._cmp(self._smallestPostings[i][0], self._smallestPostings[curr][0]) < 0:
-                curr = i
-        # update lastId with the evid
-        posting = self._smallestPostings[curr]
-        self._lastId = posting[0]
-        # forget the evid so we don't return it again
-        self._smallestPostings[curr] = (None,None,None)
-        return posting
-
-    def skipPosting(self, targetId):
-        """
-        Skips to the targetId, returning the posting or None if the posting
-        doesn't exist.
-
-        :param targetId: The target evid to skip to.
-        :type targetId: :class:`terane.bier.evid.EVID`
-        :returns: The target posting, which is a tuple containing the evid,
-          the term value, and the searcher, or (None,None,None)
-        :rtype: tuple
-        """
-        posting = None
-        # iterate through each child query
-        for i in range(len(self._iters)):
-            posting = self._smallestPostings[i]
-            # if the smallestId equals the targetId, we are done
-            if posting[0] == targetId:
-                break
-            # otherwise check if the targetId exists in the child query
-            if posting[0] == None or self._cmp(posting[0], targetId) < 0:
-                posting = self._iters[i].skipPosting(targetId)
-                self._smallestPostings[i] = posting
-                if posting[0] == targetId:
-                    break    
-        return posting
-
-    def close(self):
-        for i in self._iters: i.close()
-        self._iters = None
-        self._smallestPostings = None
-        self._lastId = None
+        PostingHeap.__init__(self, iters, reverse)
 
 class SegmentSearcher(object):
     """
@@ -191,6 +170,24 @@ class SegmentSearcher(object):
         """
         self._segment = segment
         self._txn = txn 
+        self._blockSize = None
+        self._blockSizeLoaded = False
+
+    def _getBlockSize(self):
+        """
+        If the segment has been optimized, then postings are stored in posting
+        blocks, and this returns the block size; otherwise returns None.  The
+        metadata is read within the snapshot txn, so the searcher always sees
+        a consistent set of postings.  It is only read once the segment is
+        actually searched, so pruned segments cost nothing.
+        """
+        if not self._blockSizeLoaded:
+            try:
+                self._blockSize = self._segment.get_meta(self._txn, u'posting-blocks')
+            except KeyError:
+                self._blockSize = None
+            self._blockSizeLoaded = True
+        return self._blockSize
 
     def postingsLength(self, field, term, startId, endId):
         """
@@ -215,9 +212,15 @@ class SegmentSearcher(object):
                 start = [startId.ts, startId.offset]
                 end = [endId.ts, endId.offset]
                 estimate = self._segment.estimate_events(self._txn, start, end)
+            elif self._getBlockSize() != None:
+                # the number of documents containing the term is an upper
+                # bound on the number of postings in the period
+                termId = self._postingPrefix(field, term)[0]
+                return self._segment.get_term_stats(self._txn, termId)[u'num-docs']
             else:
-                start = [field.fieldname, field.fieldtype, term, startId.ts, startId.offset]
-                end = [field.fieldname, field.fieldtype, term, endId.ts, endId.offset]
+                prefix = self._postingPrefix(field, term)
+                start = prefix + [startId.ts, startId.offset]
+                end = prefix + [endId.ts, endId.offset]
                 field = self._segment.get_field(self._txn, [field.fieldname,field.fieldtype])
                 numDocs = field[u'num-docs']
                 # startId may be greater than endId, but the estimate_postings
@@ -246,26 +249,110 @@ class SegmentSearcher(object):
         :rtype: An object implementing :class:`terane.bier.searching.IPostingList`
         """
         if field == None and term == None:
+            prefix = []
             start = [startId.ts, startId.offset]
             end = [endId.ts, endId.offset]
             postings = self._segment.iter_events(self._txn, start, end)
         else:
-            start = [field.fieldname, field.fieldtype, term, startId.ts, startId.offset]
-            end = [field.fieldname, field.fieldtype, term, endId.ts, endId.offset]
+            try:
+                prefix = self._postingPrefix(field, term)
+            except KeyError:
+                # the term doesn't exist in this segment
+                return PostingList(self, None, None)
+            if self._getBlockSize() != None:
+                blocks = self._segment.iter_posting_blocks(self._txn, prefix[0])
+                return BlockPostingList(self, prefix[0], startId, endId, blocks)
+            start = prefix + [startId.ts, startId.offset]
+            end = prefix + [endId.ts, endId.offset]
             postings = self._segment.iter_postings(self._txn, start, end)
-        return PostingList(self, field, term, postings)
+        return PostingList(self, prefix, postings)
+
+    def _postingPrefix(self, field, term):
+        """
+        Returns the leading part of the posting key for the term in the
+        specified field, which depends on the segment format version.
 
-    def getEvent(self, evid):
+        :raises KeyError: The term doesn't exist in the segment.
         """
-        Returns the event specified by evid.
+        if self._segment.formatVersion == FORMAT_MSGPACK:
+            return [field.fieldname, field.fieldtype, term]
+        return [self._segment.get_term(self._txn, [field.fieldname, field.fieldtype, term])]
+
+    def countPostings(self, field, term, startId, endId):
+        """
+        Returns the exact number of postings in the segment within the specified
+        period.  If the segment lies entirely within the period, then the count
+        is read from the document counts stored in the segment, otherwise the
+        postings within the period are counted.
+
+        :param field: The field to search within.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :param term: The term to search for.
+        :type term: object
+        :param startId:
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId:
+        :type endId: :class:`terane.bier.evid.EVID`
+        :returns: The number of postings.
+        :rtype: int
+        """
+        if self._segment.within(startId, endId):
+            try:
+                if field == None and term == None:
+                    return self._segment.get_meta(self._txn, u'last-update')[u'size']
+                if self._segment.formatVersion == FORMAT_MSGPACK:
+                    key = [field.fieldname, field.fieldtype, term]
+                    return self._segment.get_term(self._txn, key)[u'num-docs']
+                termId = self._postingPrefix(field, term)[0]
+                return self._segment.get_term_stats(self._txn, termId)[u'num-docs']
+            except KeyError:
+                return 0
+        postings = self.iterPostings(field, term, startId, endId)
+        try:
+            count = 0
+            while True:
+                batch = postings.nextPostings(1000)
+                if len(batch) == 0:
+                    return count
+                count += len(batch)
+        finally:
+            postings.close()
+
+    def iterTerms(self, field):
+        """
+        Returns a generator yielding each term in the specified field.  The
+        term dictionary is not ordered by field, so the whole dictionary is
+        scanned.
+
+        :param field: The field to list terms for.
+        :type field: :class:`terane.bier.fields.QualifiedField`
+        :returns: A generator yielding terms.
+        :rtype: generator
+        """
+        terms = self._segment.iter_terms(self._txn)
+        try:
+            for (fieldname,fieldtype,term),value in terms:
+                if fieldname == field.fieldname and fieldtype == field.fieldtype:
+                    yield term
+        finally:
+            terms.close()
+
+    def getEvent(self, evid, fields=None):
+        """
+        Returns the event specified by evid.  If fields is not None, then the
+        values of all other fields are skipped when the event is decoded.
 
         :param evid: The event identifier
         :type evid: :class:`terane.bier.evid.EVID`
+        :param fields: The names of the fields to return, or None to return all fields.
+        :type fields: frozenset or None
         :returns: A dict mapping fieldnames to values.
         :rtype: dict
         """
-        fields = self._segment.get_event(self._txn, [evid.ts, evid.offset])
         defaultfield = u'message'
+        if fields != None:
+            fields = fields | frozenset((defaultfield,))
+        fields = self._segment.get_event(self._txn, [evid.ts, evid.offset], fields)
         defaultvalue = fields[defaultfield]
         del fields[defaultfield]
         return defaultfield, defaultvalue, fields
@@ -280,16 +367,17 @@ class PostingList(object):
     
     implements(IPostingList)
 
-    def __init__(self, searcher, field, term, postings):
+    def __init__(self, searcher, prefix, postings):
         """
         :param searcher:
         :type searcher: :class:`terane.outputs.store.searching.SegmentSearcher`
+        :param prefix: The leading part of each key, preceding the ts and offset.
+        :type prefix: list
         :param postings:
         :type postings: :class:`terane.outputs.store.backend.Iter`
         """
         self._searcher = searcher
-        self._field = field
-        self._term = term
+        self._prefix = prefix
         self._postings = postings
     
     def nextPosting(self):
@@ -304,12 +392,8 @@ class PostingList(object):
             return None, None, None
         try:
             key,value = self._postings.next()
-            # posting key consists of: fieldname, fieldtype, term, ts, id
-            if len(key) == 5:
-                evid = EVID(key[3], key[4])
-            # term key consists of: ts, id
-            else:
-                evid = EVID(key[0], key[1])
+            # every key ends with: ts, id
+            evid = EVID.fromKey(key)
             return evid, value, self._searcher
         except StopIteration:
             self._postings.close()
@@ -330,20 +414,10 @@ class PostingList(object):
         if self._postings == None:
             return None, None, None
         try:
-            target = [
-                self._field.fieldname,
-                self._field.fieldtype,
-                self._term,
-                targetId.ts,
-                targetId.offset
-                ]
+            target = self._prefix + [targetId.ts, targetId.offset]
             key,value = self._postings.skip(target)
-            # posting key consists of: fieldname, fieldtype, term, ts, id
-            if len(key) == 5:
-                evid = EVID(key[3], key[4])
-            # term key consists of: ts, id
-            else:
-                evid = EVID(key[0], key[1])
+            # every key ends with: ts, id
+            evid = EVID.fromKey(key)
             return evid, value, self._searcher
         except IndexError:
             return None, None, None
@@ -352,8 +426,288 @@ class PostingList(object):
             self._postings = None
         return None, None, None
 
+    def seekPosting(self, targetId):
+        """
+        Returns the first posting at or after the targetId, or
+        (None,None,None) if there are no more postings.
+
+        :param targetId: The target evid to seek to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: A tuple containing the evid, the term value, and the
+          searcher, or (None,None,None)
+        :rtype: tuple
+        """
+        if self._postings == None:
+            return None, None, None
+        try:
+            target = self._prefix + [targetId.ts, targetId.offset]
+            key,value = self._postings.seek(target)
+            # every key ends with: ts, id
+            return EVID.fromKey(key), value, self._searcher
+        except IndexError:
+            self._postings.close()
+            self._postings = None
+        return None, None, None
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next postings.  An empty list
+        means iteration is finished.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of tuples containing the evid, the term value, and
+          the searcher.
+        :rtype: list
+        """
+        if self._postings == None:
+            return []
+        block = self._postings.next_block(count)
+        if len(block) < count:
+            self._postings.close()
+            self._postings = None
+        searcher = self._searcher
+        # every key ends with: ts, id
+        return [(EVID.fromKey(key), value, searcher) for key,value in block]
+
+    def skipPostings(self, targetIds):
+        """
+        Skips to each of the targetIds in turn, returning the postings which
+        exist.
+
+        :param targetIds: The target evids to skip to, in iteration order.
+        :type targetIds: list
+        :returns: A list of tuples containing the evid, the term value, and
+          the searcher.
+        :rtype: list
+        """
+        if self._postings == None:
+            return []
+        prefix = self._prefix
+        targets = [prefix + [targetId.ts, targetId.offset] for targetId in targetIds]
+        searcher = self._searcher
+        return [(EVID.fromKey(key), value, searcher)
+            for key,value in self._postings.skip_block(targets)]
+
     def close(self):
         if not self._postings == None:
             self._postings.close()
         self._postings = None
+        self._prefix = None
+        self._searcher = None
+
+class BlockPostingList(object):
+    """
+    BlockPostingList iterates through postings stored in the posting blocks
+    of an optimized segment, in chronological order.  Each block is keyed by
+    its last evid, so skipping to an evid outside of the current block only
+    requires a single seek, and skipping within the current block touches no
+    records at all.
+    """
+
+    implements(IPostingList)
+
+    def __init__(self, searcher, termId, startId, endId, blocks):
+        """
+        :param searcher:
+        :type searcher: :class:`terane.outputs.store.searching.SegmentSearcher`
+        :param termId: The id of the term in the segment term dictionary.
+        :type termId: int
+        :param startId: Postings must be greater than startId.
+        :type startId: :class:`terane.bier.evid.EVID`
+        :param endId: Postings must be less than endId.
+        :type endId: :class:`terane.bier.evid.EVID`
+        :param blocks:
+        :type blocks: :class:`terane.outputs.store.backend.Iter`
+        """
+        self._searcher = searcher
+        self._termId = termId
+        self._startId = startId
+        self._endId = endId
+        self._blocks = blocks
+        self._block = None
+        self._pos = 0
+
+    def _seekBlock(self, targetId):
+        """
+        Load the block which may contain targetId.  Returns False if there
+        are no more blocks.
+        """
+        try:
+            key,self._block = self._blocks.skip([self._termId, targetId.ts, targetId.offset])
+            self._pos = 0
+            return True
+        except IndexError:
+            self.close()
+        return False
+
+    def _nextBlock(self):
+        """
+        Load the next block.  Returns False if there are no more blocks.
+        """
+        try:
+            key,self._block = self._blocks.next()
+            self._pos = 0
+            return True
+        except StopIteration:
+            self.close()
+        return False
+
+    def nextPosting(self):
+        """
+        Returns the next posting, or None if iteration is finished.
+
+        :returns: The next posting, which is a tuple containing the evid, the
+          term value, and the searcher, or (None,None,None)
+        :rtype: tuple
+        """
+        if self._blocks == None:
+            return None, None, None
+        # start at the block which may contain the start of the period
+        if self._block == None and not self._seekBlock(self._startId):
+            return None, None, None
+        while True:
+            if self._pos == len(self._block) and not self._nextBlock():
+                return None, None, None
+            posting = self._block[self._pos]
+            self._pos += 1
+            evid = EVID.fromKey(posting[:2])
+            if evid <= self._startId:
+                continue
+            if evid >= self._endId:
+                self.close()
+                return None, None, None
+            return evid, posting[2], self._searcher
+
+    def skipPosting(self, targetId):
+        """
+        Skips to the targetId, returning the posting or None if the posting
+        doesn't exist.
+
+        :param targetId: The target evid to skip to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: The target posting, which is a tuple containing the evid,
+          the term value, and the searcher, or (None,None,None)
+        :rtype: tuple
+        """
+        if self._blocks == None:
+            return None, None, None
+        if targetId <= self._startId or targetId >= self._endId:
+            return None, None, None
+        # if the target is not within the current block, then seek to the
+        # block which may contain it
+        if self._block == None or targetId < self._block[0][:2] or targetId > self._block[-1][:2]:
+            if not self._seekBlock(targetId):
+                return None, None, None
+        # find the target within the block
+        i = self._gallop(targetId)
+        self._pos = i
+        if i < len(self._block) and self._block[i][:2] == targetId:
+            self._pos = i + 1
+            return targetId, self._block[i][2], self._searcher
+        return None, None, None
+
+    def seekPosting(self, targetId):
+        """
+        Returns the first posting at or after the targetId, or
+        (None,None,None) if there are no more postings.
+
+        :param targetId: The target evid to seek to.
+        :type targetId: :class:`terane.bier.evid.EVID`
+        :returns: A tuple containing the evid, the term value, and the
+          searcher, or (None,None,None)
+        :rtype: tuple
+        """
+        if self._blocks == None:
+            return None, None, None
+        if targetId <= self._startId:
+            return self.nextPosting()
+        # if the target is beyond the current block, then seek to the block
+        # which may contain it
+        if self._block == None or targetId > self._block[-1][:2]:
+            if not self._seekBlock(targetId):
+                return None, None, None
+        # never seek backwards
+        self._pos = max(self._gallop(targetId), self._pos)
+        return self.nextPosting()
+
+    def _gallop(self, targetId):
+        """
+        Returns the position of the first posting in the current block which
+        is at or after targetId.  Targets usually lie a short distance past
+        the current position, so search forward from the current position in
+        exponentially increasing steps before bisecting.
+        """
+        block = self._block
+        lo = self._pos
+        if lo >= len(block) or not block[lo] < targetId:
+            lo = 0
+        hi = lo + 1
+        step = 1
+        while hi < len(block) and block[hi] < targetId:
+            lo = hi
+            step *= 2
+            hi = lo + step
+        return bisect.bisect_left(block, targetId, lo, min(hi, len(block)))
+
+    def nextPostings(self, count):
+        """
+        Returns a list of up to count of the next postings.  An empty list
+        means iteration is finished.
+
+        :param count: The maximum number of postings to return.
+        :type count: int
+        :returns: A list of tuples containing the evid, the term value, and
+          the searcher.
+        :rtype: list
+        """
+        if self._blocks == None:
+            return []
+        # start at the block which may contain the start of the period
+        if self._block == None and not self._seekBlock(self._startId):
+            return []
+        postings = []
+        searcher = self._searcher
+        while len(postings) < count:
+            if self._pos == len(self._block) and not self._nextBlock():
+                break
+            end = min(len(self._block), self._pos + count - len(postings))
+            chunk = self._block[self._pos:end]
+            self._pos = end
+            for posting in chunk:
+                evid = EVID.fromKey(posting[:2])
+                if evid <= self._startId:
+                    continue
+                if evid >= self._endId:
+                    self.close()
+                    return postings
+                postings.append((evid, posting[2], searcher))
+        return postings
+
+    def skipPostings(self, targetIds):
+        """
+        Skips to each of the targetIds in turn, returning the postings which
+        exist.  Targets within the current block are found without touching
+        the blocks database.
+
+        :param targetIds: The target evids to skip to, in iteration order.
+        :type targetIds: list
+        :returns: A list of tuples containing the evid, the term value, and
+          the searcher.
+        :rtype: list
+        """
+        postings = []
+        for targetId in targetIds:
+            if self._blocks == None:
+                break
+            posting = self.skipPosting(targetId)
+            if posting[0] != None:
+                postings.append(posting)
+        return postings
+
+    def close(self):
+        if not self._blocks == None:
+            self._blocks.close()
+        self._blocks = None
+        self._block = None
         self._searcher = None
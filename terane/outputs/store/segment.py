@@ -16,11 +16,24 @@
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
 import pickle, time
+from terane.bier.evid import EVID, EVID_MIN, EVID_MAX, TS_MAX, OFFSET_MAX
 from terane.outputs.store import backend
 from terane.loggers import getLogger
 
 logger = getLogger('terane.outputs.store.segment')
 
+# segment format versions.  FORMAT_MSGPACK segments key postings by a msgpack
+# list of [fieldname, fieldtype, term, ts, offset], and store term statistics
+# in the terms DB.  FORMAT_BINARY segments keep a term dictionary in the terms
+# DB, mapping [fieldname, fieldtype, term] to a dense integer term id.  postings
+# are keyed by [termid, ts, offset], packed into a fixed-size binary key, and
+# term statistics are stored in the termstats DB, keyed by term id.
+FORMAT_MSGPACK = 1
+FORMAT_BINARY = 2
+
+# the largest term id which can be stored in a binary posting key
+MAX_TERM_ID = 2**32 - 1
+
 class Segment(backend.Segment):
 
     def __init__(self, txn, index, segmentId):
@@ -28,6 +41,132 @@ class Segment(backend.Segment):
         self.segmentId = segmentId
         self.segmentName = index.name
         self.fullName = "%s.%i" % (index.name, segmentId)
+        # segments created before format versions were recorded use msgpack keys
+        try:
+            self.formatVersion = self.get_meta(txn, u'format-version')
+        except KeyError:
+            self.formatVersion = FORMAT_MSGPACK
+        # segments are ordered by sequence.  a merged segment takes the
+        # sequence of the oldest segment it replaces.
+        try:
+            self.sequence = self.get_meta(txn, u'sequence')
+        except KeyError:
+            self.sequence = segmentId
+        # the range of evids contained in the segment, or None if the segment
+        # is empty.  segments written before the range was recorded are
+        # assumed to contain any evid.
+        try:
+            lastUpdate = self.get_meta(txn, u'last-update')
+        except KeyError:
+            lastUpdate = {}
+        if u'min-id' in lastUpdate:
+            self.minId = EVID(lastUpdate[u'min-id'][0], lastUpdate[u'min-id'][1])
+            self.maxId = EVID(lastUpdate[u'max-id'][0], lastUpdate[u'max-id'][1])
+        elif lastUpdate.get(u'size', 0) > 0:
+            self.minId = EVID_MIN
+            self.maxId = EVID_MAX
+        else:
+            self.minId = None
+            self.maxId = None
+
+    def widenRange(self, minId, maxId):
+        """
+        Widen the range of evids contained in the segment to include the
+        range between minId and maxId.
+        """
+        if self.minId == None or minId < self.minId:
+            self.minId = minId
+        if self.maxId == None or maxId > self.maxId:
+            self.maxId = maxId
+
+    def overlaps(self, startId, endId):
+        """
+        Returns True if the segment may contain evids between startId and
+        endId, exclusive.
+        """
+        if endId < startId:
+            startId,endId = endId,startId
+        if self.minId == None:
+            return False
+        return self.maxId > startId and self.minId < endId
+
+    def within(self, startId, endId):
+        """
+        Returns True if every evid contained in the segment is between startId
+        and endId, exclusive.  An empty segment is not within any period.
+        """
+        if endId < startId:
+            startId,endId = endId,startId
+        if self.minId == None:
+            return False
+        return self.minId > startId and self.maxId < endId
+
+    def iterPostingRecords(self, txn):
+        """
+        Iterate through every posting in the segment, regardless of whether the
+        segment has been optimized.  Only binary format segments are supported.
+
+        :param txn: The transaction to wrap the iteration in.
+        :type txn: :class:`terane.outputs.store.backend.Txn`
+        :returns: A generator yielding (termId, ts, offset, value) tuples.
+        """
+        try:
+            self.get_meta(txn, u'posting-blocks')
+        except KeyError:
+            postings = self.iter_postings(txn, [0, 0, 0], [MAX_TERM_ID, TS_MAX, OFFSET_MAX])
+            try:
+                for (termId,ts,offset),value in postings:
+                    yield termId, ts, offset, value
+            finally:
+                postings.close()
+            return
+        for key,termId in self.iter_terms(txn):
+            blocks = self.iter_posting_blocks(txn, termId)
+            try:
+                for key,block in blocks:
+                    for ts,offset,value in block:
+                        yield termId, ts, offset, value
+            finally:
+                blocks.close()
+
+    def optimize(self, txn, blockSize):
+        """
+        Rewrite the postings in the segment into compressed posting blocks,
+        each holding at most blockSize postings for a single term.  Only
+        segments which are no longer written to should be optimized, because
+        the IndexWriter only writes individual postings.
+
+        :param txn: The transaction to wrap the rewrite in.
+        :type txn: :class:`terane.outputs.store.backend.Txn`
+        :param blockSize: The maximum number of postings in a block.
+        :type blockSize: int
+        :returns: The number of posting blocks written.
+        :rtype: int
+        """
+        if self.formatVersion == FORMAT_MSGPACK:
+            raise ValueError("segment %s format doesn't support posting blocks" % self.fullName)
+        termId = None
+        block = []
+        numBlocks = 0
+        # postings are ordered by term id, then by evid
+        postings = self.iter_postings(txn, [0, 0, 0], [MAX_TERM_ID, TS_MAX, OFFSET_MAX])
+        try:
+            for key,value in postings:
+                if key[0] != termId or len(block) == blockSize:
+                    if block != []:
+                        self.set_posting_block(txn, termId, block)
+                        numBlocks += 1
+                    termId = key[0]
+                    block = []
+                block.append((key[1], key[2], value))
+            if block != []:
+                self.set_posting_block(txn, termId, block)
+                numBlocks += 1
+        finally:
+            postings.close()
+        self.truncate_postings(txn)
+        self.set_meta(txn, u'posting-blocks', blockSize)
+        return numBlocks
 
     def __cmp__(self, other):
         if self.segmentName != other.segmentName:
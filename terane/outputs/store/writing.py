@@ -19,6 +19,7 @@ import time
 from zope.interface import implements
 from terane.bier import IWriter
 from terane.bier.writing import WriterError
+from terane.outputs.store.segment import FORMAT_MSGPACK, MAX_TERM_ID
 from terane.loggers import getLogger
 
 logger = getLogger('terane.outputs.store.writing')
@@ -33,69 +34,179 @@ class IndexWriter(object):
     def __init__(self, ix):
         self._txn = None
         self._ix = ix
-        self._indexSize = self._ix._indexSize
-        self._currentSize = self._ix._currentSize
-        self._lastId = self._ix._lastId
-        self._lastModified = self._ix._lastModified
+        self._segment = None
+        self._fieldCounts = {}
+        self._termCounts = {}
+        self._termIds = {}
+        self._lastTermId = None
+        self._numEvents = 0
+        self._firstId = None
+        self._lastId = None
 
     def begin(self):
         if self._txn:
             raise WriterError("IndexWriter is already in a transaction")
         self._txn = self._ix.new_txn()
+        self._segment = self._ix._current
         return self
 
     def newEvent(self, evid, event):
         # serialize the fields dict and write it to the segment
-        segment = self._ix._current
+        segment = self._segment
         segment.set_event(self._txn, [evid.ts,evid.offset], event)
-        # update segment metadata
-        self._indexSize += 1
-        self._currentSize += 1
-        self._lastId = [evid.ts,evid.offset]
-        self._lastModified = int(time.time())
-        lastUpdate = {
-            u'size': self._currentSize,
-            u'last-id': self._lastId,
-            u'last-modified': self._lastModified
-            }
-        segment.set_meta(self._txn, u'last-update', lastUpdate)
+        # remember the segment metadata changes, which are written in commit()
+        self._numEvents += 1
+        if self._firstId == None or evid < self._firstId:
+            self._firstId = evid
+        if self._lastId == None or evid > self._lastId:
+            self._lastId = evid
 
     def newPosting(self, field, term, evid, posting):
-        segment = self._ix._current
-        # increment the document count for this field
-        f = [field.fieldname, field.fieldtype]
-        try:
-            value = segment.get_field(self._txn, f)
-            if not u'num-docs' in value:
-                raise WriterError("field %s is missing key 'num-docs'" % f)
-            value[u'num-docs'] += 1
-        except KeyError:
-            value = {u'num-docs': 1}
-        segment.set_field(self._txn, f, value)
-        # increment the document count for this term
-        t = [field.fieldname, field.fieldtype, term]
-        try:
-            value = segment.get_term(self._txn, t)
-            if not u'num-docs' in value:
-                raise WriterError("term %s is missing key 'num-docs'" % t)
-            value[u'num-docs'] += 1
-        except KeyError:
-            value = {u'num-docs': 1}
-        segment.set_term(self._txn, t, value)
+        segment = self._segment
+        # increment the document count for this field and term.  the counts
+        # are accumulated for the life of the transaction, and written to the
+        # segment once in commit().
+        f = (field.fieldname, field.fieldtype)
+        self._fieldCounts[f] = self._fieldCounts.get(f, 0) + 1
+        t = (field.fieldname, field.fieldtype, term)
+        self._termCounts[t] = self._termCounts.get(t, 0) + 1
         # add the posting
         if posting == None:
             posting = dict()
-        p = [field.fieldname, field.fieldtype, term, evid.ts, evid.offset]
+        if segment.formatVersion == FORMAT_MSGPACK:
+            p = [field.fieldname, field.fieldtype, term, evid.ts, evid.offset]
+        else:
+            p = [self._getTermId(t), evid.ts, evid.offset]
         segment.set_posting(self._txn, p, posting)
 
+    def _getTermId(self, t):
+        """
+        Returns the id of the (fieldname, fieldtype, term) tuple in the segment
+        term dictionary, adding the term to the dictionary if it doesn't exist.
+        Term ids are cached for the life of the transaction.
+        """
+        termId = self._termIds.get(t)
+        if termId == None:
+            segment = self._segment
+            try:
+                termId = segment.get_term(self._txn, list(t))
+            except KeyError:
+                termId = self._newTermId()
+                segment.set_term(self._txn, list(t), termId)
+            self._termIds[t] = termId
+        return termId
+
+    def _newTermId(self):
+        """
+        Allocate a new term id.  The last allocated id is stored in the
+        segment 'last-term-id' metadata, which is written in commit().  Term
+        ids must fit in a posting key, so allocating past MAX_TERM_ID fails.
+        """
+        if self._lastTermId == None:
+            try:
+                self._lastTermId = self._segment.get_meta(self._txn, u'last-term-id')
+            except KeyError:
+                self._lastTermId = 0
+        if self._lastTermId >= MAX_TERM_ID:
+            raise WriterError("no term ids left in segment %s" % self._segment.fullName)
+        self._lastTermId += 1
+        return self._lastTermId
+
+    def _writeCounts(self):
+        """
+        Add the accumulated field and term document counts to the counts
+        stored in the segment.  Keys are written in sorted order, so the
+        updates touch the underlying B-trees sequentially.
+        """
+        segment = self._segment
+        for f in sorted(self._fieldCounts.keys()):
+            key = list(f)
+            try:
+                value = segment.get_field(self._txn, key)
+                if not u'num-docs' in value:
+                    raise WriterError("field %s is missing key 'num-docs'" % key)
+                value[u'num-docs'] += self._fieldCounts[f]
+            except KeyError:
+                value = {u'num-docs': self._fieldCounts[f]}
+            segment.set_field(self._txn, key, value)
+        if segment.formatVersion == FORMAT_MSGPACK:
+            for t in sorted(self._termCounts.keys()):
+                key = list(t)
+                try:
+                    value = segment.get_term(self._txn, key)
+                    if not u'num-docs' in value:
+                        raise WriterError("term %s is missing key 'num-docs'" % key)
+                    value[u'num-docs'] += self._termCounts[t]
+                except KeyError:
+                    value = {u'num-docs': self._termCounts[t]}
+                segment.set_term(self._txn, key, value)
+        else:
+            # term statistics are keyed by term id
+            counts = sorted([(self._termIds[t],n) for t,n in self._termCounts.items()])
+            for termId,count in counts:
+                try:
+                    value = segment.get_term_stats(self._txn, termId)
+                    if not u'num-docs' in value:
+                        raise WriterError("term id %i is missing key 'num-docs'" % termId)
+                    value[u'num-docs'] += count
+                except KeyError:
+                    value = {u'num-docs': count}
+                segment.set_term_stats(self._txn, termId, value)
+            if self._lastTermId != None:
+                segment.set_meta(self._txn, u'last-term-id', self._lastTermId)
+        self._fieldCounts = {}
+        self._termCounts = {}
+        self._termIds = {}
+        self._lastTermId = None
+
+    def _writeLastUpdate(self, lastModified):
+        """
+        Write the segment 'last-update' metadata, reflecting all events written
+        in this transaction.
+        """
+        segment = self._segment
+        lastId = self._lastId
+        if self._ix._lastId > lastId:
+            lastId = self._ix._lastId
+        # widen the range of evids contained in the segment.  the in-memory
+        # range is widened before the transaction commits, so a searcher can
+        # never see events outside of the range.
+        segment.widenRange(self._firstId, self._lastId)
+        lastUpdate = {
+            u'size': self._ix._currentSize + self._numEvents,
+            u'last-id': [lastId.ts, lastId.offset],
+            u'last-modified': max(lastModified, self._ix._lastModified),
+            u'min-id': [segment.minId.ts, segment.minId.offset],
+            u'max-id': [segment.maxId.ts, segment.maxId.offset]
+            }
+        segment.set_meta(self._txn, u'last-update', lastUpdate)
+
     def commit(self):
+        lastModified = int(time.time())
+        try:
+            self._writeCounts()
+            if self._numEvents > 0:
+                self._writeLastUpdate(lastModified)
+        except:
+            self.abort()
+            raise
         self._txn.commit()
-        self._ix._indexSize = self._indexSize
-        self._ix._currentSize = self._currentSize
-        self._ix._lastId = self._lastId
-        self._ix._lastModified = self._lastModified
+        if self._numEvents > 0:
+            self._ix._updateStats(self._numEvents, self._lastId, lastModified)
         self._txn = None
+        self._segment = None
+        self._numEvents = 0
+        self._firstId = None
+        self._lastId = None
 
     def abort(self):
         self._txn.abort()
         self._txn = None
+        self._segment = None
+        self._fieldCounts = {}
+        self._termCounts = {}
+        self._termIds = {}
+        self._lastTermId = None
+        self._numEvents = 0
+        self._firstId = None
+        self._lastId = None
@@ -54,11 +54,13 @@ class XMLRPCDispatcher(XMLRPC):
         self.avatarId = avatarId
         self.iters = getStat('terane.protocols.xmlrpc.iter.count', 0)
         self.totalitertime = getStat('terane.protocols.xmlrpc.iter.totaltime', 0.0)
+        self.counts = getStat('terane.protocols.xmlrpc.count.count', 0)
+        self.totalcounttime = getStat('terane.protocols.xmlrpc.count.totaltime', 0.0)
         self.tails = getStat('terane.protocols.xmlrpc.tail.count', 0)
         self.totaltailtime = getStat('terane.protocols.xmlrpc.tail.totaltime', 0.0)
 
     @inlineCallbacks
-    def xmlrpc_iterEvents(self, query, last=None, indices=None, limit=100, reverse=False, fields=None):
+    def xmlrpc_iterEvents(self, query, last=None, indices=None, limit=100, reverse=False, fields=None, pageSize=None):
         try:
             if indices == None:
                 result = yield self._protocol._querymanager.listIndices()
@@ -67,7 +69,7 @@ class XMLRPCDispatcher(XMLRPC):
             if indices == []:
                 raise FaultNotAuthorized("not authorized to access the specified resource")
             self.iters += 1
-            result = yield self._protocol._querymanager.iterEvents(unicode(query), last, indices, limit, reverse, fields)
+            result = yield self._protocol._querymanager.iterEvents(unicode(query), last, indices, limit, reverse, fields, pageSize)
             self.totalitertime += float(result.meta['runtime'])
             returnValue(result)
         except xmlrpclib.Fault:
@@ -78,6 +80,53 @@ class XMLRPCDispatcher(XMLRPC):
             logger.exception(e)
             raise FaultInternalError()
 
+    @inlineCallbacks
+    def xmlrpc_fetchMore(self, cursor):
+        try:
+            result = yield self._protocol._querymanager.fetchMore(cursor)
+            self.totalitertime += float(result.meta['runtime'])
+            returnValue(result)
+        except xmlrpclib.Fault:
+            raise
+        except (QuerySyntaxError, QueryExecutionError), e:
+            raise FaultBadRequest(e)
+        except Exception, e:
+            logger.exception(e)
+            raise FaultInternalError()
+
+    def xmlrpc_closeCursor(self, cursor):
+        try:
+            return self._protocol._querymanager.closeCursor(cursor)
+        except xmlrpclib.Fault:
+            raise
+        except (QuerySyntaxError, QueryExecutionError), e:
+            raise FaultBadRequest(e)
+        except Exception, e:
+            logger.exception(e)
+            raise FaultInternalError()
+
+    @inlineCallbacks
+    def xmlrpc_countEvents(self, query, indices=None, groupBy=None):
+        try:
+            if indices == None:
+                result = yield self._protocol._querymanager.listIndices()
+                indices = result.data
+            indices = [i for i in indices \
+              if self._protocol._authmanager.canAccess(self.avatarId, 'index', i, 'PERM::XMLRPC::ITER')]
+            if indices == []:
+                raise FaultNotAuthorized("not authorized to access the specified resource")
+            self.counts += 1
+            result = yield self._protocol._querymanager.countEvents(unicode(query), indices, groupBy)
+            self.totalcounttime += float(result.meta['runtime'])
+            returnValue(result)
+        except xmlrpclib.Fault:
+            raise
+        except (QuerySyntaxError, QueryExecutionError), e:
+            raise FaultBadRequest(e)
+        except Exception, e:
+            logger.exception(e)
+            raise FaultInternalError()
+
     @inlineCallbacks
     def xmlrpc_tailEvents(self, query, last=None, indices=None, limit=100, fields=None):
         try:
@@ -15,16 +15,20 @@
 # You should have received a copy of the GNU General Public License
 # along with Terane.  If not, see <http://www.gnu.org/licenses/>.
 
-import time
+import time, datetime, bisect, uuid
+from collections import OrderedDict
 from zope.interface import Interface, implements
 from twisted.internet.defer import succeed
 from twisted.python.failure import Failure
 from terane.manager import IManager, Manager
+from terane.settings import ConfigureError
 from terane.registry import getRegistry
 from terane.routes import IIndexStore
-from terane.bier.evid import EVID
+from terane.bier.evid import EVID, EVID_MAX
 from terane.bier.ql import parseIterQuery, parseTailQuery
-from terane.bier.searching import searchIndices, Period, SearcherError
+from terane.bier.searching import searchIndices, countIndices, plans, queryKey, Period, SearcherError
+from terane.bier.writing import eventTerms
+from terane.signals import SignalCancelled
 from terane.loggers import getLogger
 
 logger = getLogger('terane.queries')
@@ -49,10 +53,143 @@ class QueryResult(object):
     def __str__(self):
         return "<QueryResult meta=%s, data=%s>" % (self.meta, self.data)
 
+class ResultCache(object):
+    """
+    A least-recently-used cache of iter query results.  Each entry records the
+    generation of every index searched, and is discarded when any of them
+    changes.  The cache is bounded by the total number of events held.
+    """
+
+    def __init__(self, maxEvents):
+        """
+        :param maxEvents: The maximum number of events to hold in the cache.
+        :type maxEvents: int
+        """
+        self.maxEvents = maxEvents
+        self._entries = OrderedDict()
+        self._numEvents = 0
+
+    def get(self, key, generations):
+        """
+        Returns the cached QueryResult for key, or None if the result is not
+        cached or any index has changed since it was cached.
+        """
+        try:
+            cachedGenerations,meta,events = self._entries.pop(key)
+        except KeyError:
+            return None
+        if cachedGenerations != generations:
+            self._numEvents -= len(events)
+            return None
+        # reinsert the entry, making it the most recently used
+        self._entries[key] = (cachedGenerations, meta, events)
+        return QueryResult(dict(meta), list(events))
+
+    def put(self, key, generations, result):
+        """
+        Cache the QueryResult for key, evicting the least recently used
+        entries until the cache fits within maxEvents.
+        """
+        events = tuple(result.data)
+        if len(events) > self.maxEvents:
+            return
+        if key in self._entries:
+            self._numEvents -= len(self._entries.pop(key)[2])
+        self._entries[key] = (generations, dict(result.meta), events)
+        self._numEvents += len(events)
+        while self._numEvents > self.maxEvents:
+            key,(_,_,evicted) = self._entries.popitem(last=False)
+            self._numEvents -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+class TailSubscription(object):
+    """
+    A standing tail query.  Events committed to the subscribed indices are
+    matched against the query as they are written, and the matching events are
+    buffered in evid order, so polling the subscription doesn't search the
+    indices.  The buffer holds every matching event after the evid 'since';
+    when the buffer is full, the oldest events are discarded and 'since' moves
+    forward.  If 'since' is None, then the buffer is incomplete and the
+    subscription cannot be polled.
+    """
+
+    def __init__(self, query, indices, fields, since, maxEvents):
+        """
+        :param query: The parsed tail query.
+        :type query: An object implementing :class:`terane.bier.interfaces.IMatcher`
+        :param indices: The names of the subscribed indices.
+        :type indices: tuple
+        :param fields: A list of fields to return in the results, or None to return all fields.
+        :type fields: list
+        :param since: The evid after which every matching event is buffered.
+        :type since: :class:`terane.bier.evid.EVID`
+        :param maxEvents: The maximum number of events to buffer.
+        :type maxEvents: int
+        """
+        self.query = query
+        self.indices = indices
+        self.fields = fields
+        self.since = since
+        self.maxEvents = maxEvents
+        self.lastPoll = time.time()
+        self._evids = []
+        self._events = []
+
+    def covers(self, lastId):
+        """
+        Returns True if the buffer holds every matching event after lastId.
+        """
+        return self.since != None and lastId >= self.since
+
+    def addEvent(self, evid, event):
+        """
+        Buffer the matching event.
+
+        :param evid: The evid of the event.
+        :type evid: :class:`terane.bier.evid.EVID`
+        :param event: The event.
+        :type event: :class:`terane.bier.event.Event`
+        """
+        if self.since == None or evid <= self.since:
+            return
+        fields = dict([(fieldname,value) for fieldname,fieldtype,value in event])
+        defaultfield = u'message'
+        defaultvalue = fields.pop(defaultfield)
+        fieldnames = [defaultfield] + fields.keys()
+        if self.fields != None:
+            fields = dict([(k,v) for k,v in fields.items() if k in self.fields])
+        i = bisect.bisect_right(self._evids, evid)
+        self._evids.insert(i, evid)
+        self._events.insert(i, (((evid.ts,evid.offset), defaultfield, defaultvalue, fields), fieldnames))
+        # if the buffer is full, then discard the oldest event
+        if len(self._evids) > self.maxEvents:
+            self.since = self._evids.pop(0)
+            self._events.pop(0)
+
+    def getEvents(self, lastId, limit):
+        """
+        Returns up to limit buffered events after lastId, and the names of the
+        fields found in them.
+        """
+        i = bisect.bisect_right(self._evids, lastId)
+        events = []
+        fields = []
+        for event,fieldnames in self._events[i:i+limit]:
+            events.append(event)
+            for fieldname in fieldnames:
+                if fieldname not in fields:
+                    fields.append(fieldname)
+        return events, fields
+
 class IQueryManager(Interface):
-    def iterEvents(query, lastId, indices, limit, reverse, fields):
+    def iterEvents(query, lastId, indices, limit, reverse, fields, pageSize):
         """
-        Iterate through indices for events matching the specified query.
+        Iterate through indices for events matching the specified query.  If
+        pageSize is specified, then at most pageSize events are returned, and
+        if there are more results the metadata contains a 'cursor' which is
+        passed to fetchMore() to retrieve the next page.
 
         :param query: The query string.
         :type query: unicode
@@ -66,6 +203,44 @@ class IQueryManager(Interface):
         :type reverse: bool
         :param fields: A list of fields to return in the results, or None to return all fields.
         :type fields: list
+        :param pageSize: The maximum number of events to return in each page, or None.
+        :type pageSize: int, or None
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+    def fetchMore(cursor):
+        """
+        Return the next page of results for the iter query which returned the
+        specified cursor.  If there are more results after this page, then the
+        metadata contains the cursor, otherwise the cursor is None.
+
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+    def closeCursor(cursor):
+        """
+        Discard the specified cursor, releasing the resources held by the
+        search.
+
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+    def countEvents(query, indices, groupBy):
+        """
+        Count the events in the indices matching the specified query, without
+        retrieving the events.
+
+        :param query: The query string.
+        :type query: unicode
+        :param indices: A list of indices to search, or None to search all indices.
+        :type indices: list, or None
+        :param groupBy: The name of a field whose terms the matching events are
+          grouped by, or None.
+        :type groupBy: unicode, or None
         :returns: A Deferred object which receives the results.
         :rtype: :class:`twisted.internet.defer.Deferred`
         """
@@ -118,13 +293,115 @@ class QueryManager(Manager):
         self._indexstore = indexstore
         self.maxResultSize = 10
         self.maxIterations = 5
+        self._cache = None
+        self._tailBufferSize = 1000
+        self._tailTimeout = 60
+        self._subscriptions = {}
+        self._receivers = {}
+        self._cursorTimeout = 60
+        self._cursors = {}
 
     def configure(self, settings):
-        pass
+        section = settings.section('server')
+        cacheSize = section.getInt('query cache size', 10000)
+        if cacheSize < 0:
+            raise ConfigureError("'query cache size' must be greater than or equal to 0")
+        if cacheSize > 0:
+            self._cache = ResultCache(cacheSize)
+        self._tailBufferSize = section.getInt('tail buffer size', 1000)
+        if self._tailBufferSize < 0:
+            raise ConfigureError("'tail buffer size' must be greater than or equal to 0")
+        self._tailTimeout = section.getInt('tail subscription timeout', 60)
+        if self._tailTimeout < 1:
+            raise ConfigureError("'tail subscription timeout' must be greater than 0")
+        self._cursorTimeout = section.getInt('cursor timeout', 60)
+        if self._cursorTimeout < 1:
+            raise ConfigureError("'cursor timeout' must be greater than 0")
+
+    def startService(self):
+        Manager.startService(self)
+        # tail subscriptions are matched against events as they are committed
+        if self._tailBufferSize > 0:
+            for name in self._indexstore.iterSearchableNames():
+                self._scheduleCommittedEvents(name)
+
+    def stopService(self):
+        for name,d in self._receivers.items():
+            self._indexstore.getSearchable(name).getDispatcher().disconnectSignal(d)
+        self._receivers = {}
+        self._subscriptions = {}
+        for result,lastFetch in self._cursors.values():
+            result.close()
+        self._cursors = {}
+        return Manager.stopService(self)
+
+    def _scheduleCommittedEvents(self, name):
+        d = self._indexstore.getSearchable(name).getDispatcher().connectSignal()
+        d.addCallbacks(self._committedEvents, self._errorReceivingEvents, errbackArgs=(name,))
+        self._receivers[name] = d
+
+    def _committedEvents(self, committed):
+        # match the committed events against each subscription to the index
+        try:
+            subscriptions = [s for s in self._subscriptions.values() if committed.name in s.indices]
+            terms = None
+            for subscription in subscriptions:
+                try:
+                    plan = plans.getPlan(subscription.query, committed.index)
+                except NotImplementedError:
+                    plan = None
+                if plan == None:
+                    continue
+                # the terms are only parsed once, for the first subscription
+                if terms == None:
+                    schema = committed.index.getSchema()
+                    terms = [eventTerms(schema, event) for event in committed.events]
+                for i in range(len(committed.events)):
+                    if plan.matchesTerms(terms[i]):
+                        subscription.addEvent(committed.evids[i], committed.events[i])
+        except Exception, e:
+            logger.exception(e)
+        self._scheduleCommittedEvents(committed.name)
+
+    def _errorReceivingEvents(self, failure, name):
+        if not failure.check(SignalCancelled):
+            logger.debug("error receiving events from %s: %s" % (name,str(failure)))
+            self._scheduleCommittedEvents(name)
+
+    def _expireSubscriptions(self, now):
+        for key,subscription in self._subscriptions.items():
+            if now - subscription.lastPoll > self._tailTimeout:
+                del self._subscriptions[key]
+
+    def _expireCursors(self, now):
+        for cursor,(result,lastFetch) in self._cursors.items():
+            if now - lastFetch > self._cursorTimeout:
+                logger.trace("cursor %s expired" % cursor)
+                del self._cursors[cursor]
+                result.close()
+
+    def _returnPage(self, result):
+        """
+        Convert a page of search results into a QueryResult.  If there are more
+        results, then the search is held under a new cursor.
+        """
+        if isinstance(result, Failure):
+            if result.check(SearcherError):
+                raise QueryExecutionError(result.getErrorMessage())
+            result.raiseException()
+        cursor = None
+        if not result.isFinished():
+            cursor = uuid.uuid4().hex
+            self._cursors[cursor] = (result, time.time())
+        meta = {'runtime': result.runtime, 'fields': result.fields, 'cursor': cursor}
+        return QueryResult(meta, result.events)
 
-    def iterEvents(self, query, lastId=None, indices=None, limit=100, reverse=False, fields=None):
+    def iterEvents(self, query, lastId=None, indices=None, limit=100, reverse=False, fields=None, pageSize=None):
         """
         Iterate through the database for events matching the specified query.
+        If pageSize is specified, then at most pageSize events are returned, and
+        if there are more results the metadata contains a 'cursor' which is
+        passed to fetchMore() to retrieve the next page.
 
         :param query: The query string.
         :type query: unicode
@@ -138,6 +415,8 @@ class QueryManager(Manager):
         :type reverse: bool
         :param fields: A list of fields to return in the results, or None to return all fields.
         :type fields: list
+        :param pageSize: The maximum number of events to return in each page, or None.
+        :type pageSize: int, or None
         :returns: A Deferred object which receives the results.
         :rtype: :class:`twisted.internet.defer.Deferred`
         """
@@ -155,9 +434,38 @@ class QueryManager(Manager):
         # check that limit is > 0
         if limit < 1:
             raise QueryExecutionError("limit must be greater than 0")
+        # check that pageSize is > 0.  if the whole result fits in one page,
+        # then there is no need to page.
+        if pageSize != None:
+            if pageSize < 1:
+                raise QueryExecutionError("pageSize must be greater than 0")
+            if pageSize >= limit:
+                pageSize = None
         query,period = parseIterQuery(query)
         logger.trace("iter query: %s" % query)
         logger.trace("iter period: %s" % period)
+        # paged results are not cached
+        if pageSize != None:
+            self._expireCursors(time.time())
+            try:
+                task = searchIndices(indices, query, period, lastId, reverse, fields, limit, pageSize)
+            except SearcherError, e:
+                raise QueryExecutionError(str(e))
+            return task.whenDone().addBoth(self._returnPage)
+        # return the cached result if none of the indices have changed.  the
+        # generations are read before searching, so events written while the
+        # search runs invalidate the cached result.  relative periods move
+        # with the clock rather than the generation, so they are not cached.
+        cache = self._cache if not period.relative else None
+        if cache != None:
+            key = (queryKey(query), indices, period.start, period.end, period.startexcl,
+                period.endexcl, lastId, limit, bool(reverse),
+                tuple(fields) if fields != None else None)
+            generations = tuple(index.getGeneration() for index in indices)
+            cached = cache.get(key, generations)
+            if cached != None:
+                logger.trace("iter query result is cached")
+                return succeed(cached)
         # query each index and return the results
         try:
             task = searchIndices(indices, query, period, lastId, reverse, fields, limit)
@@ -168,9 +476,98 @@ class QueryManager(Manager):
                 if result.check(SearcherError):
                     raise QueryExecutionError(result.getErrorMessage())
                 result.raiseException()
-            return QueryResult({'runtime': result.runtime, 'fields': result.fields}, result.events)
+            result = QueryResult({'runtime': result.runtime, 'fields': result.fields}, result.events)
+            if cache != None:
+                cache.put(key, generations, result)
+            return result
         return task.whenDone().addBoth(_returnIterResult)
 
+    def fetchMore(self, cursor):
+        """
+        Return the next page of results for the iter query which returned the
+        specified cursor.  If there are more results after this page, then the
+        metadata contains a new cursor, otherwise the cursor is None.
+
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+        self._expireCursors(time.time())
+        # the cursor is removed while the page is retrieved, so it can't be
+        # fetched twice concurrently.
+        try:
+            result,lastFetch = self._cursors.pop(cursor)
+        except KeyError:
+            raise QueryExecutionError("unknown cursor '%s'" % cursor)
+        try:
+            task = result.nextPage()
+        except SearcherError, e:
+            raise QueryExecutionError(str(e))
+        return task.whenDone().addBoth(self._returnPage)
+
+    def closeCursor(self, cursor):
+        """
+        Discard the specified cursor, releasing the resources held by the
+        search.
+
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+        try:
+            result,lastFetch = self._cursors.pop(cursor)
+        except KeyError:
+            raise QueryExecutionError("unknown cursor '%s'" % cursor)
+        result.close()
+        return succeed(QueryResult({}, []))
+
+    def countEvents(self, query, indices=None, groupBy=None):
+        """
+        Count the events in the database matching the specified query, without
+        retrieving the events.  The metadata 'count' is the number of matching
+        events.  If groupBy is specified, then the data is a list of (term, count)
+        pairs, one for each term of the groupBy field contained in any matching
+        event, ordered by descending count.
+
+        :param query: The query string.
+        :type query: unicode
+        :param indices: A list of indices to search, or None to search all indices.
+        :type indices: list, or None
+        :param groupBy: The name of a field whose terms the matching events are
+          grouped by, or None.
+        :type groupBy: unicode, or None
+        :returns: A Deferred object which receives the results.
+        :rtype: :class:`twisted.internet.defer.Deferred`
+        """
+        # look up the named indices
+        if indices == None:
+            indices = tuple(self._indexstore.iterSearchableIndices())
+        else:
+            try:
+                indices = tuple(self._indexstore.getSearchableIndex(name) for name in indices)
+            except KeyError, e:
+                raise QueryExecutionError("unknown index '%s'" % e)
+        if groupBy != None:
+            groupBy = unicode(groupBy)
+        query,period = parseIterQuery(query)
+        logger.trace("count query: %s" % query)
+        logger.trace("count period: %s" % period)
+        # count matches in each index and return the results
+        try:
+            task = countIndices(indices, query, period, groupBy)
+        except SearcherError, e:
+            raise QueryExecutionError(str(e))
+        def _returnCountResult(result):
+            if isinstance(result, Failure):
+                if result.check(SearcherError):
+                    raise QueryExecutionError(result.getErrorMessage())
+                result.raiseException()
+            groups = sorted(result.groups.items(), key=lambda group: (-group[1], group[0]))
+            return QueryResult({'runtime': result.runtime, 'count': result.count}, groups)
+        return task.whenDone().addBoth(_returnCountResult)
+
     def tailEvents(self, query, lastId=None, indices=None, limit=100, fields=None):
         """
         Return events newer than the specified 'lastId' event ID matching the
@@ -191,15 +588,17 @@ class QueryManager(Manager):
         """
         # look up the named indices
         if indices == None:
-            indices = tuple(self._indexstore.iterSearchableIndices())
+            names = tuple(self._indexstore.iterSearchableNames())
         else:
-            try:
-                indices = tuple(self._indexstore.getSearchableIndex(name) for name in indices)
-            except KeyError, e:
-                raise QueryExecutionError("unknown index '%s'" % e)
+            names = tuple(indices)
+        try:
+            indices = tuple(self._indexstore.getSearchableIndex(name) for name in names)
+        except KeyError, e:
+            raise QueryExecutionError("unknown index '%s'" % e)
         # if lastId is 0, return the id of the latest document
         if lastId == None:
-            return QueryResult({'runtime': 0.0, 'lastId': str(EVID.fromDatetime())}, [])
+            lastId = EVID.fromDatetime(datetime.datetime.now())
+            return succeed(QueryResult({'runtime': 0.0, 'lastId': str(lastId)}, []))
         try:
             lastId = EVID.fromString(lastId)
         except:
@@ -207,18 +606,49 @@ class QueryManager(Manager):
         # check that limit is > 0
         if limit < 1:
             raise QueryExecutionError("limit must be greater than 0")
+        # if a subscription holds every matching event after lastId, then
+        # return the buffered events without searching
+        start = time.time()
+        self._expireSubscriptions(start)
+        key = (query, names, tuple(fields) if fields != None else None)
+        subscription = self._subscriptions.get(key)
+        if subscription != None and subscription.covers(lastId):
+            subscription.lastPoll = start
+            events,fieldnames = subscription.getEvents(lastId, limit)
+            if len(events) > 0:
+                lastId = EVID(*events[-1][0])
+            metadata = {'runtime': time.time() - start, 'lastId': str(lastId), 'fields': fieldnames}
+            return succeed(QueryResult(metadata, events))
         query = parseTailQuery(query)
         logger.trace("tail query: %s" % query)
-        period = Period(lastId, EVID.fromString(EVID.MAX_ID), True, False)
+        period = Period(lastId, EVID_MAX, True, False)
         logger.trace("tail period: %s" % period)
         # query each index, and return the results
-        task = searchIndices(indices, query, period, None, False, fields, limit)
+        try:
+            task = searchIndices(indices, query, period, None, False, fields, limit)
+        except SearcherError, e:
+            raise QueryExecutionError(str(e))
+        # subscribe before the search task runs, so events committed during
+        # the search are buffered as well
+        if self._tailBufferSize > 0:
+            subscription = TailSubscription(query, names, fields, lastId, self._tailBufferSize)
+            self._subscriptions[key] = subscription
+        else:
+            subscription = None
         def _returnTailResult(result, lastId=None):
-            if isinstance(result, Failure) and result.check(SearcherError):
-                raise QueryExecutionError(str(e))
+            if isinstance(result, Failure):
+                if subscription != None:
+                    self._subscriptions.pop(key, None)
+                if result.check(SearcherError):
+                    raise QueryExecutionError(result.getErrorMessage())
+                result.raiseException()
             events = list(result.events)
+            # if the search stopped at the limit, then there are matching events
+            # after lastId which the subscription doesn't hold
+            if subscription != None and len(events) == limit:
+                subscription.since = None
             if len(events) > 0:
-                lastId = events[-1][0]
+                lastId = EVID(*events[-1][0])
             metadata = {'runtime': result.runtime, 'lastId': str(lastId), 'fields': result.fields}
             return QueryResult(metadata, events)
         return task.whenDone().addBoth(_returnTailResult, lastId)
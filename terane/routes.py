@@ -21,29 +21,27 @@ from twisted.internet.task import cooperate
 from terane.manager import IManager, Manager
 from terane.plugins import IPluginStore
 from terane.bier import IEventFactory, IFieldStore
-from terane.inputs import IInput
+from terane.inputs import IInput, ReceivedEvents
 from terane.outputs import IOutput, ISearchable
 from terane.filters import IFilter, StopFiltering
 from terane.signals import SignalCancelled
 from terane.settings import ConfigureError
-from terane.loggers import getLogger
+from terane.loggers import getLogger, ERROR
 
 logger = getLogger('terane.routes')
 
 class EventProcessor(object):
-    def __init__(self, event, filters, fieldstore):
-        self.event = event
-        self._filters = filters
-        self._fieldstore = fieldstore
+    """
+    EventProcessor runs a batch of events through a route, one event each time
+    next() is called, so a whole batch can be processed by a single cooperative
+    task.
+    """
+    def __init__(self, route, events):
+        self._route = route
+        self._events = iter(events)
 
     def next(self):
-        if len(self._filters) == 0:
-            raise StopIteration()
-        filter = self._filters.pop(0)
-        contract = filter.getContract()
-        contract.validateEventBefore(self.event, self._fieldstore)
-        self.event = filter.filter(self.event)
-        contract.validateEventAfter(self.event, self._fieldstore)
+        self._route._processEvent(self._events.next())
 
 class Route(Service):
     """
@@ -102,13 +100,16 @@ class Route(Service):
         self.d.addCallbacks(self._receivedEvent, lambda failure: failure)
         self.d.addErrback(self._errorReceivingEvent)
 
-    def _receivedEvent(self, event):
-        # run the fields through the filter chain, then reschedule the signal
-        self._input.getContract().validateEventAfter(event, self.parent._fieldstore)
-        task = cooperate(EventProcessor(event, self._filters, self.parent._fieldstore))
+    def _receivedEvent(self, result):
+        # run the batch through the filter chain, then reschedule the signal
+        if isinstance(result, ReceivedEvents):
+            events = result.events
+        else:
+            events = [result]
+        task = cooperate(EventProcessor(self, events))
         d = task.whenDone()
-        d.addCallbacks(self._processedEvent, lambda failure: failure)
-        d.addErrback(self._errorProcessingEvent)
+        d.addCallbacks(self._processedEvents, lambda failure: failure)
+        d.addErrback(self._errorProcessingEvents)
         self._scheduleReceivedEvent()
 
     def _errorReceivingEvent(self, failure):
@@ -117,17 +118,31 @@ class Route(Service):
             self._scheduleReceivedEvent()
             return failure
 
-    def _processedEvent(self, processor):
-        logger.debug("[route:%s] processed event" % self.name)
-        self._output.getContract().validateEventBefore(processor.event, self.parent._fieldstore)
-        event = self._final.finalizeEvent(processor.event)
-        self._output.receiveEvent(event)
+    def _processEvent(self, event):
+        # run the event through each filter, then pass it to the output
+        fieldstore = self.parent._fieldstore
+        try:
+            self._input.getContract().validateEventAfter(event, fieldstore)
+            for filter in self._filters:
+                contract = filter.getContract()
+                contract.validateEventBefore(event, fieldstore)
+                event = filter.filter(event)
+                contract.validateEventAfter(event, fieldstore)
+            self._output.getContract().validateEventBefore(event, fieldstore)
+            self._output.receiveEvent(self._final.finalizeEvent(event))
+        except StopFiltering, e:
+            logger.debug("[route:%s] dropped event: %s" % (self.name,e))
+        except Exception, e:
+            # drop the event, but don't hide the error
+            logger.error("[route:%s] error processing event: %s" % (self.name,e))
+            logger.exception(e, level=ERROR)
 
-    def _errorProcessingEvent(self, failure):
-        if not failure.check(StopFiltering):
-            logger.debug("[route:%s] error processing event: %s" % (self.name,str(failure)))
-            return failure
-        logger.debug("[route:%s] dropped event: %s" % (self.name,e))
+    def _processedEvents(self, processor):
+        logger.debug("[route:%s] processed events" % self.name)
+
+    def _errorProcessingEvents(self, failure):
+        logger.debug("[route:%s] error processing events: %s" % (self.name,str(failure)))
+        return failure
 
 class IIndexStore(Interface):
     def getSearchableIndex(name):
@@ -140,6 +155,16 @@ class IIndexStore(Interface):
         :rtype: An object providing :class:`terane.outputs.ISearchable`
         :raises KeyError: The specified index does not exist.
         """
+    def getSearchable(name):
+        """
+        Return the searchable output specified by name.
+
+        :param name: The name of the index.
+        :type name: str
+        :returns: The searchable output.
+        :rtype: An object providing :class:`terane.outputs.ISearchable`
+        :raises KeyError: The specified index does not exist.
+        """
     def iterSearchableIndices():
         """
         Iterate the searchable indices.
@@ -269,6 +294,18 @@ class RouteManager(Manager):
         :raises KeyError: The specified index does not exist.
         """
         return self._searchables[name].getIndex()
+
+    def getSearchable(self, name):
+        """
+        Return the searchable output specified by name.
+
+        :param name: The name of the index.
+        :type name: str
+        :returns: The searchable output.
+        :rtype: An object providing :class:`terane.outputs.ISearchable`
+        :raises KeyError: The specified index does not exist.
+        """
+        return self._searchables[name]
                                         
     def iterSearchableIndices(self):
         """
@@ -80,7 +80,10 @@ class Signal(object):
 
     def emitSignal(self, result):
         """
-        Signal all registered receivers.
+        Signal all registered receivers.  Each receiver may modify the result
+        it receives, so every receiver except the last is passed a copy, and the
+        last receiver is passed the result itself.  The caller must therefore
+        not use the result after emitting it.
 
         :param result: The data to pass to receivers.
         :type result: object implementing :class:`terane.signals.ICopyable`
@@ -90,8 +93,12 @@ class Signal(object):
             raise TypeError("result does not implement ICopyable")
         receivers = self._receivers
         self._receivers = set()
-        for d in receivers:
-            if self.matchesKeywords(d.kwds):
-                logger.trace("signaling receiver %s" % d)
-                # return a copy of the result, so the receiver can modify it
+        receivers = [d for d in receivers if self.matchesKeywords(d.kwds)]
+        for i in range(len(receivers)):
+            d = receivers[i]
+            logger.trace("signaling receiver %s" % d)
+            # copy the result only if another receiver will be passed it too
+            if i < len(receivers) - 1:
                 d.callback(result.copy())
+            else:
+                d.callback(result)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# Compare merging postings from many posting lists with a linear scan of the
+# posting list heads against the PostingHeap priority queue.  Run from the top
+# of the source tree, with the source tree on the python path:
+#
+#   PYTHONPATH=. python tests/bench_merging.py [postings per list]
+#
+
+import sys, time, random
+from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
+
+class ListPostings(object):
+
+    def __init__(self, evids):
+        self._evids = evids
+        self._i = 0
+
+    def nextPosting(self):
+        if self._i == len(self._evids):
+            return None, None, None
+        evid = self._evids[self._i]
+        self._i += 1
+        return evid, None, self
+
+    def nextPostings(self, count):
+        evids = self._evids[self._i:self._i + count]
+        self._i += len(evids)
+        return [(evid, None, self) for evid in evids]
+
+    def seekPosting(self, targetId):
+        while self._i < len(self._evids) and self._evids[self._i] < targetId:
+            self._i += 1
+        return self.nextPosting()
+
+    def close(self):
+        pass
+
+class LinearMerge(object):
+    """
+    The merge previously used by MergedPostingList and ResultSet, which scans
+    the head of every posting list for each posting returned.
+    """
+
+    def __init__(self, iters):
+        self._iters = iters
+        self._smallestPostings = [(None,None,None) for i in range(len(iters))]
+        self._lastId = None
+        self._cmp = cmp
+
+    def nextPosting(self):
+        curr = 0
+        for i in range(len(self._iters)):
+            if self._smallestPostings[i][0] == None:
+                self._smallestPostings[i] = self._iters[i].nextPosting()
+            if self._smallestPostings[i][0] == None:
+                continue
+            if self._lastId != None and self._smallestPostings[i][0] == self._lastId:
+                self._smallestPostings[i] = (None,None,None)
+                continue
+            if i == 0:
+                continue
+            if self._smallestPostings[curr][0] == None or \
+              self._cmp(self._smallestPostings[i][0], self._smallestPostings[curr][0]) < 0:
+                curr = i
+        posting = self._smallestPostings[curr]
+        self._lastId = posting[0]
+        self._smallestPostings[curr] = (None,None,None)
+        return posting
+
+def makeLists(nlists, npostings):
+    rand = random.Random(nlists)
+    lists = []
+    for i in range(nlists):
+        evids = sorted([EVID(rand.randint(0, 2**31), i + 1) for j in range(npostings)])
+        lists.append(evids)
+    return lists
+
+def run(merger):
+    count = 0
+    start = time.time()
+    while merger.nextPosting()[0] != None:
+        count += 1
+    return count, time.time() - start
+
+if __name__ == '__main__':
+    npostings = 10
+    if len(sys.argv) > 1:
+        npostings = int(sys.argv[1])
+    print "%-10s %-10s %-12s %-12s %s" % ('segments', 'postings', 'linear (s)', 'heap (s)', 'speedup')
+    for nlists in (10, 100, 1000):
+        lists = makeLists(nlists, npostings)
+        count1, linear = run(LinearMerge([ListPostings(l) for l in lists]))
+        count2, heap = run(PostingHeap([ListPostings(l) for l in lists]))
+        assert count1 == count2
+        print "%-10i %-10i %-12.3f %-12.3f %.1fx" % (nlists, count1, linear, heap, linear / heap)
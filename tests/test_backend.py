@@ -104,6 +104,19 @@ class Backend_Segment_Tests(unittest.TestCase):
             if segment: segment.close()
         self.failUnless(sorted(self.index.iter_segments(None)) == [1,2,3])
 
+    def test_posting_termid_out_of_range(self):
+        try:
+            segment = None
+            with self.index.new_txn() as txn:
+                segmentId = self.index.new_segment(txn)
+                segment = Segment(txn, self.index, segmentId)
+            with self.index.new_txn() as txn:
+                # the term id doesn't fit in a posting key
+                self.failUnlessRaises(ValueError, segment.set_posting, txn, [2**32, 1, 1], {})
+                segment.set_posting(txn, [2**32 - 1, 1, 1], {})
+        finally:
+            if segment: segment.close()
+
     def test_delete_Segment(self):
         with self.index.new_txn() as txn:
             segmentId = self.index.new_segment(txn)
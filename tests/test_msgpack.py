@@ -162,3 +162,10 @@ class Msgpack_Tests(unittest.TestCase):
         s = msgpack_dump(v)
         o = msgpack_load(s)
         self.failUnless(o == v, "o=%s, v=%s" % (o,v))
+
+    def test_load_fields(self):
+        v = {u'message': u'hello', u'host': u'localhost', u'list': [1, {u'a': 2}], u'n': 100000}
+        s = msgpack_dump(v)
+        o = msgpack_load(s, [u'message', u'n', u'missing'])
+        self.failUnless(o == {u'message': u'hello', u'n': 100000}, "o=%s" % o)
+        self.failUnlessRaises(ValueError, msgpack_load, msgpack_dump([1, 2]), [u'message'])
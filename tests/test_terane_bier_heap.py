@@ -0,0 +1,128 @@
+from twisted.trial import unittest
+from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
+
+class ListPostings(object):
+    """A posting list over a sorted list of evids."""
+
+    def __init__(self, evids, reverse=False):
+        self.evids = sorted(evids, reverse=reverse)
+        self.reverse = reverse
+        self.closed = False
+
+    def nextPosting(self):
+        if len(self.evids) == 0:
+            return None, None, None
+        return self.evids.pop(0), None, self
+
+    def skipPosting(self, targetId):
+        while len(self.evids) > 0 and cmp(self.evids[0], targetId) == (self.reverse and 1 or -1):
+            self.evids.pop(0)
+        if len(self.evids) == 0 or self.evids[0] != targetId:
+            return None, None, None
+        return self.evids[0], None, self
+
+    def seekPosting(self, targetId):
+        while len(self.evids) > 0 and cmp(self.evids[0], targetId) == (self.reverse and 1 or -1):
+            self.evids.pop(0)
+        return self.nextPosting()
+
+    def nextPostings(self, count):
+        postings = [(evid, None, self) for evid in self.evids[:count]]
+        del self.evids[:count]
+        return postings
+
+    def skipPostings(self, targetIds):
+        postings = []
+        for targetId in targetIds:
+            posting = self.skipPosting(targetId)
+            if posting[0] != None:
+                postings.append(posting)
+        return postings
+
+    def close(self):
+        self.closed = True
+
+def evids(*pairs):
+    return [EVID(ts, offset) for ts,offset in pairs]
+
+class PostingHeap_Tests(unittest.TestCase):
+    """PostingHeap tests."""
+
+    def drain(self, heap):
+        postings = []
+        while True:
+            evid,value,store = heap.nextPosting()
+            if evid == None:
+                return postings
+            postings.append(evid)
+
+    def test_merge_forward(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1))),
+            ListPostings(evids((2,1),(5,1))),
+            ListPostings([]),
+            ListPostings(evids((3,1),(6,1),(8,1))),
+            ])
+        self.failUnlessEqual(self.drain(heap), evids((1,1),(2,1),(3,1),(4,1),(5,1),(6,1),(7,1),(8,1)))
+
+    def test_merge_reverse(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1)), reverse=True),
+            ListPostings(evids((2,1),(5,1)), reverse=True),
+            ], reverse=True)
+        self.failUnlessEqual(self.drain(heap), evids((7,1),(5,1),(4,1),(2,1),(1,1)))
+
+    def test_merge_duplicates(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(2,1),(3,1))),
+            ListPostings(evids((2,1),(3,1))),
+            ListPostings(evids((3,1),(3,2))),
+            ])
+        self.failUnlessEqual(self.drain(heap), evids((1,1),(2,1),(3,1),(3,2)))
+
+    def test_skip_posting(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1))),
+            ListPostings(evids((2,1),(5,1),(8,1))),
+            ])
+        self.failUnlessEqual(heap.nextPosting()[0], EVID(1,1))
+        self.failUnlessEqual(heap.skipPosting(EVID(5,1))[0], EVID(5,1))
+        self.failUnlessEqual(heap.skipPosting(EVID(6,1))[0], None)
+        self.failUnlessEqual(self.drain(heap), evids((7,1),(8,1)))
+
+    def test_next_postings(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1))),
+            ListPostings(evids((2,1),(5,1),(8,1))),
+            ], blockSize=2)
+        postings = heap.nextPostings(4)
+        self.failUnlessEqual([p[0] for p in postings], evids((1,1),(2,1),(4,1),(5,1)))
+        postings = heap.nextPostings(4)
+        self.failUnlessEqual([p[0] for p in postings], evids((7,1),(8,1)))
+        self.failUnlessEqual(heap.nextPostings(4), [])
+
+    def test_skip_postings(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1),(9,1))),
+            ListPostings(evids((2,1),(5,1),(8,1),(9,1))),
+            ], blockSize=2)
+        self.failUnlessEqual(heap.nextPosting()[0], EVID(1,1))
+        postings = heap.skipPostings(evids((2,1),(3,1),(7,1),(9,1)))
+        self.failUnlessEqual([p[0] for p in postings], evids((2,1),(7,1),(9,1)))
+        self.failUnlessEqual(heap.skipPostings([]), [])
+
+    def test_seek_posting(self):
+        heap = PostingHeap([
+            ListPostings(evids((1,1),(4,1),(7,1))),
+            ListPostings(evids((2,1),(5,1),(8,1))),
+            ], blockSize=2)
+        self.failUnlessEqual(heap.seekPosting(EVID(3,1))[0], EVID(4,1))
+        self.failUnlessEqual(heap.seekPosting(EVID(5,1))[0], EVID(5,1))
+        self.failUnlessEqual(heap.seekPosting(EVID(9,1))[0], None)
+
+    def test_close(self):
+        postingLists = [ListPostings(evids((1,1))), ListPostings(evids((2,1)))]
+        heap = PostingHeap(postingLists)
+        heap.close()
+        self.failUnless(all([p.closed for p in postingLists]))
@@ -0,0 +1,40 @@
+from twisted.trial import unittest
+from terane.bier.evid import EVID
+from terane.bier.heap import PostingHeap
+from terane.bier.matching import Intersection, ANDPostings, SievePostings
+from test_terane_bier_heap import ListPostings, evids
+
+def makeAND(*lists):
+    return ANDPostings(None, Intersection([ListPostings(l) for l in lists], False))
+
+class ANDPostings_Tests(unittest.TestCase):
+    """ANDPostings tests."""
+
+    def test_next_posting(self):
+        postings = makeAND(evids((1,1),(3,1),(5,1),(9,1)), evids((3,1),(4,1),(9,1)))
+        self.failUnless(postings.nextPosting()[0] == EVID(3,1))
+        self.failUnless(postings.nextPosting()[0] == EVID(9,1))
+        self.failUnless(postings.nextPosting()[0] == None)
+
+    def test_skip_miss_then_hit(self):
+        postings = makeAND(evids((3,1),(5,1),(9,1)), evids((3,1),(5,1),(9,1)))
+        # the skip to 4 finds 5, which must not be used up by the failed skip
+        self.failUnless(postings.skipPosting(EVID(4,1))[0] == None)
+        self.failUnless(postings.skipPosting(EVID(5,1))[0] == EVID(5,1))
+        self.failUnless(postings.skipPosting(EVID(7,1))[0] == None)
+        self.failUnless(postings.seekPosting(EVID(8,1))[0] == EVID(9,1))
+        self.failUnless(postings.skipPosting(EVID(9,1))[0] == EVID(9,1))
+        self.failUnless(postings.nextPosting()[0] == None)
+
+    def test_not_over_and(self):
+        # the source matches 1 through 6, and the filter AND matches only 5
+        source = ListPostings(evids((1,1),(2,1),(3,1),(4,1),(5,1),(6,1)))
+        filter = PostingHeap([makeAND(evids((2,1),(5,1)), evids((1,1),(5,1)))])
+        postings = SievePostings(None, source, filter)
+        matched = []
+        while True:
+            evid = postings.nextPosting()[0]
+            if evid == None:
+                break
+            matched.append(evid)
+        self.failUnless(matched == evids((1,1),(2,1),(3,1),(4,1),(6,1)))
@@ -23,6 +23,15 @@ class iter_Tests(unittest.TestCase):
     def test_term_function(self):
         q = parseIterQuery('foo:text:in(hello world)')
 
+    def test_parsed_query_cached(self):
+        q1,p1 = parseIterQuery('foo AND bar')
+        q2,p2 = parseIterQuery('foo AND bar')
+        self.failUnless(q1 is q2)
+        q1,p1 = parseIterQuery('foo WHERE DATE FROM 1 HOUR AGO')
+        q2,p2 = parseIterQuery('foo WHERE DATE FROM 1 HOUR AGO')
+        self.failIf(q1 is q2)
+        self.failUnless(parseTailQuery('foo') is parseTailQuery('foo'))
+
 class DATE_Tests(unittest.TestCase):
     """DATE clause tests."""
 
@@ -60,3 +69,17 @@ class DATE_Tests(unittest.TestCase):
     def test_DATE_relative_date_seconds(self):
         q = parseIterQuery("WHERE DATE FROM 1 SECOND AGO")
         q = parseIterQuery("WHERE DATE FROM 1 SECONDS AGO")
+
+    def test_DATE_relative_period(self):
+        q,p = parseIterQuery("foo")
+        self.failUnless(p.relative)
+        q,p = parseIterQuery("foo WHERE DATE FROM 1 HOUR AGO TO 2010/1/1")
+        self.failUnless(p.relative)
+        q,p = parseIterQuery("foo WHERE DATE FROM 2000/1/1 TO 1 HOUR AGO")
+        self.failUnless(p.relative)
+        q,p = parseIterQuery("foo WHERE DATE FROM 2000/1/1")
+        self.failUnless(p.relative)
+        q,p = parseIterQuery("foo WHERE DATE FROM 2000/1/1 TO 2010/1/1")
+        self.failIf(p.relative)
+        q,p = parseIterQuery("foo WHERE DATE TO 2010/1/1 FROM 2000/1/1 EXCLUSIVE")
+        self.failIf(p.relative)
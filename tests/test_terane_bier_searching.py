@@ -0,0 +1,183 @@
+from zope.interface import implements
+from twisted.internet.task import cooperate
+from twisted.trial import unittest
+from terane.bier.interfaces import IEventStore
+from terane.bier.evid import EVID, EVID_MIN, EVID_MAX
+from terane.bier.fields import QualifiedField
+from terane.bier.matching import QueryTerm, Term, Every, AND, OR
+from terane.bier.searching import ResultSet, CountSet, PlanCache, queryKey
+from test_terane_bier_heap import ListPostings
+
+class StorePostings(ListPostings):
+
+    implements(IEventStore)
+
+    def getEvent(self, evid, fields=None):
+        event = {u'host': u'localhost', u'pid': evid.ts}
+        if fields != None:
+            event = dict([(k,v) for k,v in event.items() if k in fields])
+        return u'message', u'event %i' % evid.ts, event
+
+class Searcher(object):
+    closed = False
+    def close(self):
+        self.closed = True
+
+class ResultSet_Tests(unittest.TestCase):
+
+    def test_paged_results(self):
+        postings = StorePostings([EVID(ts, 1) for ts in range(1, 6)])
+        searcher = Searcher()
+        result = ResultSet([searcher], [postings], 0.0, False, None, 100, 2)
+        pages = []
+        def _getPage(result):
+            pages.append([e[0] for e in result.events])
+            if result.isFinished():
+                return result
+            return result.nextPage().whenDone().addCallback(_getPage)
+        def _checkPages(result):
+            self.failUnless(pages == [[(1, 1), (2, 1)], [(3, 1), (4, 1)], [(5, 1)]])
+            self.failUnless(result.fields == [u'message', u'host', u'pid'] or
+                            result.fields == [u'message', u'pid', u'host'])
+            self.failUnless(searcher.closed)
+        # the first page is retrieved without starting a task
+        for event in result: pass
+        self.failIf(result.isFinished())
+        self.failIf(searcher.closed)
+        return _getPage(result).addCallback(_checkPages)
+
+    def test_batch_stops_at_limit(self):
+        postings = StorePostings([EVID(ts, 1) for ts in range(1, 6)])
+        result = ResultSet([Searcher()], [postings], 0.0, False, [u'pid'], 3)
+        for event in result: pass
+        self.failUnless([e[0] for e in result.events] == [(1, 1), (2, 1), (3, 1)])
+        self.failUnless([e[3] for e in result.events] == [{u'pid': 1}, {u'pid': 2}, {u'pid': 3}])
+        self.failUnless(result.fields == [u'message', u'pid'])
+        self.failUnless(result.isFinished())
+
+    def test_same_evid_in_two_stores(self):
+        class HostPostings(StorePostings):
+            def getEvent(self, evid, fields=None):
+                return u'message', u'event %i' % evid.ts, {u'host': self.host}
+        class BatchPostings(object):
+            def __init__(self, postings):
+                self.postings = postings
+            def nextPostings(self, count):
+                postings = self.postings[:count]
+                del self.postings[:count]
+                return postings
+            def close(self):
+                pass
+        first = HostPostings([])
+        first.host = u'first'
+        second = HostPostings([])
+        second.host = u'second'
+        result = ResultSet([Searcher()], [], 0.0, False, None, 100)
+        # the batch holds the same evid from two stores
+        result._postings = BatchPostings([(EVID(1, 1), None, first), (EVID(1, 1), None, second)])
+        for event in result: pass
+        hosts = sorted([e[3][u'host'] for e in result.events])
+        self.failUnless(hosts == [u'first', u'second'])
+
+class CountSearcher(object):
+    """A searcher over events which each contain a host and a level term."""
+
+    def __init__(self, events):
+        self.events = events
+        self.counted = []
+
+    def _evids(self, field, term):
+        if field == None:
+            return self.events.keys()
+        return [evid for evid,event in self.events.items() if event[field.fieldname] == term]
+
+    def postingsLength(self, field, term, startId, endId):
+        return len(self._evids(field, term))
+
+    def iterPostings(self, field, term, startId, endId):
+        return ListPostings(self._evids(field, term))
+
+    def countPostings(self, field, term, startId, endId):
+        self.counted.append(term)
+        return len(self._evids(field, term))
+
+    def iterTerms(self, field, startId, endId):
+        return iter(sorted(set([event[field.fieldname] for event in self.events.values()])))
+
+    def close(self):
+        pass
+
+class CountSet_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.host = QualifiedField(u'host', u'literal', None)
+        self.level = QualifiedField(u'level', u'literal', None)
+        events = [(u'a', u'error'), (u'a', u'info'), (u'b', u'error'), (u'a', u'error'), (u'c', u'info')]
+        self.searcher = CountSearcher(dict([(EVID(ts, 1), {u'host': host, u'level': level})
+            for ts,(host,level) in enumerate(events, 1)]))
+
+    def _count(self, plan, groupField):
+        counts = CountSet([(self.searcher, plan, groupField)], EVID_MIN, EVID_MAX, 0.0)
+        return cooperate(counts).whenDone()
+
+    def test_count_term(self):
+        def _checkCount(counts):
+            self.failUnless(counts.count == 3)
+            self.failUnless(counts.groups == {})
+            # a single term is counted by the searcher, not by iterating
+            self.failUnless(self.searcher.counted == [u'error'])
+        return self._count(Term(self.level, u'error'), None).addCallback(_checkCount)
+
+    def test_count_grouped(self):
+        def _checkCount(counts):
+            self.failUnless(counts.count == 3)
+            self.failUnless(counts.groups == {u'a': 2, u'b': 1})
+        plan = AND([Term(self.level, u'error')])
+        return self._count(plan, self.host).addCallback(_checkCount)
+
+    def test_count_every_grouped(self):
+        def _checkCount(counts):
+            self.failUnless(counts.count == 5)
+            self.failUnless(counts.groups == {u'a': 3, u'b': 1, u'c': 1})
+            self.failUnless(self.searcher.counted == [None, u'a', u'b', u'c'])
+        return self._count(Every(), self.host).addCallback(_checkCount)
+
+class PlanSchema(object):
+    """A schema which records each field lookup."""
+
+    def __init__(self):
+        self.lookups = []
+
+    def getVersion(self):
+        return 1
+
+    def getField(self, fieldname, fieldtype):
+        self.lookups.append((fieldname, fieldtype))
+        raise KeyError(fieldname)
+
+class PlanIndex(object):
+
+    def __init__(self):
+        self.schema = PlanSchema()
+
+    def getSchema(self):
+        return self.schema
+
+class PlanCache_Tests(unittest.TestCase):
+
+    def test_query_key_includes_fieldtype(self):
+        text = QueryTerm(u'message', u'text', None, u'foo')
+        literal = QueryTerm(u'message', u'literal', None, u'foo')
+        self.failUnless(str(text) == str(literal))
+        self.failIf(queryKey(text) == queryKey(literal))
+        self.failIf(queryKey(AND([text])) == queryKey(AND([literal])))
+        self.failIf(queryKey(AND([text])) == queryKey(OR([text])))
+        self.failUnless(queryKey(AND([text])) == queryKey(AND([QueryTerm(u'message', u'text', None, u'foo')])))
+
+    def test_plan_per_fieldtype(self):
+        cache = PlanCache()
+        index = PlanIndex()
+        cache.getPlan(QueryTerm(u'message', u'text', None, u'foo'), index)
+        cache.getPlan(QueryTerm(u'message', u'literal', None, u'foo'), index)
+        cache.getPlan(QueryTerm(u'message', u'text', None, u'foo'), index)
+        self.failUnless(index.schema.lookups == [(u'message', u'text'), (u'message', u'literal')])
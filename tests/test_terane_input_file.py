@@ -1,10 +1,11 @@
-import os, sys
+import os, sys, time
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred
 from twisted.trial import unittest
 from terane.loggers import StdoutHandler, startLogging, TRACE
 from terane.settings import _UnittestSettings
-from terane.inputs.file import FileInput, FileInputPlugin
+from terane.inputs import file as file_module
+from terane.inputs.file import FileInput, GlobInput, FileInputPlugin, TailedFile, Checkpoints, FileNotifier
 
 class FileInput_Tests(unittest.TestCase):
     """FileInput tests."""
@@ -55,3 +56,248 @@ class FileInput_Tests(unittest.TestCase):
         d = dispatcher.connect().addCallback(self.receiveEvent)
         reactor.callLater(1, self.writeLine, "hello world!")
         return d
+
+    def test_inotify_fallback(self):
+        # without inotify the watch fails, so the input polls the file
+        self.patch(file_module, 'inotify', None)
+        self.file_input = FileInput(None, 'test_inotify_fallback', None)
+        settings = _UnittestSettings()
+        settings.load({
+            'input:tempfile': {
+                'file path': self.filename,
+                'polling interval': 1,
+                'use inotify': 'true'
+                }
+            })
+        self.file_input.configure(settings.section('input:tempfile'))
+        self.file_input.startService()
+        self.failIf(self.file_input._watching)
+        self.failIf(self.file_input._watched)
+        d = Deferred()
+        def _checkPolling(unused):
+            self.failUnless(self.file_input._delayed.active())
+            self.file_input.stopService()
+            self.failIf(self.file_input.running)
+            self.file_input = None
+        d.addCallback(_checkPolling)
+        reactor.callLater(0.1, d.callback, None)
+        return d
+
+class FileNotifier_Tests(unittest.TestCase):
+    """FileNotifier tests."""
+
+    def test_unwatch_without_inotify(self):
+        self.patch(file_module, 'inotify', None)
+        notifier = FileNotifier()
+        self.failUnlessRaises(Exception, notifier.watch, '/nonexistent', None)
+        notifier.unwatch('/nonexistent', None)
+
+class TailedFile_Tests(unittest.TestCase):
+    """TailedFile tests."""
+
+    def setUp(self):
+        self.filename = os.path.abspath(self.mktemp())
+        self.lines = []
+
+    def writeFile(self, data, mode='a'):
+        f = open(self.filename, mode)
+        f.write(data)
+        f.close()
+
+    def test_resume_after_close(self):
+        self.writeFile('one\ntwo\nthr', 'w')
+        tailed = TailedFile('test', self.filename, 1024, self.lines.extend, fromEnd=False)
+        self.failUnless(tailed.open())
+        self.failIf(tailed.tail(1024 * 1024))
+        self.failUnless(self.lines == ['one\n', 'two\n'])
+        # the position survives closing the file
+        tailed.close()
+        self.writeFile('ee\n')
+        self.failUnless(tailed.open())
+        tailed.tail(1024 * 1024)
+        self.failUnless(self.lines == ['one\n', 'two\n', 'three\n'])
+
+    def test_rotation(self):
+        self.writeFile('old\n', 'w')
+        tailed = TailedFile('test', self.filename, 1024, self.lines.extend)
+        self.failUnless(tailed.open())
+        self.writeFile('last\n')
+        os.rename(self.filename, self.filename + '.1')
+        self.writeFile('new\n', 'w')
+        # the rest of the rotated file is read, then the new file is opened
+        tailed.tail(1024 * 1024)
+        self.failUnless(tailed.file == None)
+        self.failUnless(self.lines == ['last\n'])
+        self.failUnless(tailed.open())
+        tailed.tail(1024 * 1024)
+        self.failUnless(self.lines == ['last\n', 'new\n'])
+
+    def test_long_lines(self):
+        self.writeFile('short\n' + 'x' * 20 + '\nafter\n' + 'y' * 12, 'w')
+        tailed = TailedFile('test', self.filename, 8, self.lines.extend, fromEnd=False)
+        self.failUnless(tailed.open())
+        # the chunk ends inside a line, so there is more to read immediately
+        self.failUnless(tailed.tail(16))
+        self.failUnless(self.lines == ['short\n'])
+        self.failIf(tailed.tail(1024))
+        # the long lines are dropped, up to and including the newline
+        self.failUnless(self.lines == ['short\n', 'after\n'])
+        self.writeFile('\n')
+        tailed.tail(1024)
+        self.failUnless(self.lines == ['short\n', 'after\n'])
+
+class GlobInput_Tests(unittest.TestCase):
+    """GlobInput tests."""
+
+    def setUp(self):
+        self.dirname = os.path.abspath(self.mktemp())
+        os.mkdir(self.dirname)
+        self.lines = []
+        self.glob_input = None
+
+    def tearDown(self):
+        if self.glob_input:
+            for tailed in self.glob_input._files.values():
+                tailed.close()
+
+    def makeInput(self, maxopen=64):
+        self.glob_input = GlobInput(None, 'test', None)
+        settings = _UnittestSettings()
+        settings.load({
+            'input:glob': {
+                'file glob': os.path.join(self.dirname, '*.log'),
+                'maximum open files': maxopen
+                }
+            })
+        self.glob_input.configure(settings.section('input:glob'))
+        self.glob_input._write = lambda lines, path: self.lines.extend([(os.path.basename(path), line) for line in lines])
+        return self.glob_input
+
+    def writeFile(self, name, data, mode='a'):
+        f = open(os.path.join(self.dirname, name), mode)
+        f.write(data)
+        f.close()
+
+    def scan(self):
+        self.glob_input._scan()
+        self.glob_input._lastscan = time.time()
+
+    def tail(self):
+        for unused in self.glob_input._tailFiles():
+            pass
+
+    def test_maximum_open_files(self):
+        self.writeFile('a.log', 'old\n', 'w')
+        self.writeFile('b.log', 'old\n', 'w')
+        glob_input = self.makeInput(maxopen=1)
+        self.scan()
+        self.tail()
+        self.failUnless(self.lines == [])
+        self.failUnless(glob_input._opened.keys() == [os.path.join(self.dirname, 'b.log')])
+        # both files grow, so each is reopened in turn, closing the other
+        self.writeFile('a.log', 'a1\n')
+        self.writeFile('b.log', 'b1\n')
+        self.tail()
+        self.failUnless(self.lines == [('a.log', 'a1\n'), ('b.log', 'b1\n')])
+        self.failUnless(len(glob_input._opened) == 1)
+        self.failUnless(glob_input._files[os.path.join(self.dirname, 'a.log')].file == None)
+        self.writeFile('a.log', 'a2\n')
+        self.tail()
+        self.failUnless(self.lines[2:] == [('a.log', 'a2\n')])
+        self.failUnless(len(glob_input._opened) == 1)
+
+    def test_new_file_read_from_start(self):
+        self.writeFile('a.log', 'old\n', 'w')
+        self.makeInput()
+        self.scan()
+        self.tail()
+        # a file appearing after the first scan is read from the beginning
+        self.writeFile('b.log', 'one\n', 'w')
+        self.scan()
+        self.tail()
+        self.failUnless(self.lines == [('b.log', 'one\n')])
+
+    def test_removed_file_forgotten(self):
+        self.writeFile('a.log', 'old\n', 'w')
+        self.writeFile('b.log', 'old\n', 'w')
+        glob_input = self.makeInput()
+        self.scan()
+        self.tail()
+        path = os.path.join(self.dirname, 'b.log')
+        tailed = glob_input._files[path]
+        self.failUnless(path in glob_input._opened)
+        os.unlink(path)
+        self.scan()
+        self.failIf(path in glob_input._files)
+        self.failIf(path in glob_input._opened)
+        self.failUnless(tailed.file == None)
+
+    def test_rotation(self):
+        self.writeFile('a.log', 'old\n', 'w')
+        glob_input = self.makeInput()
+        self.scan()
+        self.tail()
+        path = os.path.join(self.dirname, 'a.log')
+        self.writeFile('a.log', 'last\n')
+        os.rename(path, path + '.1')
+        self.writeFile('a.log', 'new\n', 'w')
+        # the rest of the rotated file is read, and the file is closed
+        self.tail()
+        self.failUnless(self.lines == [('a.log', 'last\n')])
+        self.failIf(path in glob_input._opened)
+        # the new file is opened on the next pass
+        self.tail()
+        self.failUnless(self.lines == [('a.log', 'last\n'), ('a.log', 'new\n')])
+        self.failUnless(path in glob_input._opened)
+
+class Checkpoints_Tests(unittest.TestCase):
+    """Checkpoints tests."""
+
+    def setUp(self):
+        self.filename = os.path.abspath(self.mktemp())
+        self.checkpointfile = os.path.abspath(self.mktemp())
+        self.lines = []
+
+    def test_resume_from_checkpoint(self):
+        f = open(self.filename, 'w')
+        f.write('one\n')
+        f.close()
+        checkpoints = Checkpoints('test', self.checkpointfile)
+        checkpoints.load()
+        self.failIf(checkpoints.loaded)
+        tailed = TailedFile('test', self.filename, 1024, self.lines.extend, checkpoints=checkpoints)
+        self.failUnless(tailed.open())
+        checkpoints.save([tailed])
+        tailed.close()
+        f = open(self.filename, 'a')
+        f.write('two\n')
+        f.close()
+        # a new TailedFile resumes from the checkpoint rather than the end
+        checkpoints = Checkpoints('test', self.checkpointfile)
+        checkpoints.load()
+        self.failUnless(checkpoints.loaded)
+        tailed = TailedFile('test', self.filename, 1024, self.lines.extend, checkpoints=checkpoints)
+        self.failUnless(tailed.open())
+        tailed.tail(1024)
+        self.failUnless(self.lines == ['two\n'])
+
+    def test_replaced_file(self):
+        f = open(self.filename, 'w')
+        f.write('one\n')
+        f.close()
+        checkpoints = Checkpoints('test', self.checkpointfile)
+        tailed = TailedFile('test', self.filename, 1024, self.lines.extend, checkpoints=checkpoints)
+        self.failUnless(tailed.open())
+        checkpoints.save([tailed])
+        tailed.close()
+        os.rename(self.filename, self.filename + '.1')
+        f = open(self.filename, 'w')
+        f.write('new\n')
+        f.close()
+        # the file was replaced, so the new file is read from the beginning
+        checkpoints = Checkpoints('test', self.checkpointfile)
+        checkpoints.load()
+        self.failUnless(checkpoints.getPosition(self.filename, os.stat(self.filename)) == 0)
+        # the checkpoint for the old file is discarded on the next save
+        checkpoints.save([])
+        self.failUnless(open(self.checkpointfile).read() == '')
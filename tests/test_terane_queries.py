@@ -0,0 +1,75 @@
+import datetime
+from twisted.trial import unittest
+from terane.bier.evid import EVID
+from terane.bier.event import Event
+from terane.queries import ResultCache, QueryResult, TailSubscription
+
+class ResultCache_Tests(unittest.TestCase):
+
+    def test_cache_hit(self):
+        cache = ResultCache(10)
+        cache.put('q', (1,), QueryResult({'runtime': 0.5}, [1, 2, 3]))
+        result = cache.get('q', (1,))
+        self.failUnless(result != None)
+        self.failUnless(result.meta == {'runtime': 0.5})
+        self.failUnless(result.data == [1, 2, 3])
+        # the cached result is not modified through a returned result
+        result.data.append(4)
+        self.failUnless(cache.get('q', (1,)).data == [1, 2, 3])
+
+    def test_cache_invalidate(self):
+        cache = ResultCache(10)
+        cache.put('q', (1,2), QueryResult({}, [1]))
+        self.failUnless(cache.get('q', (1,3)) == None)
+        self.failUnless(cache.get('q', (1,2)) == None)
+        self.failUnless(len(cache) == 0)
+
+    def test_cache_evict(self):
+        cache = ResultCache(4)
+        cache.put('a', (1,), QueryResult({}, [1, 2]))
+        cache.put('b', (1,), QueryResult({}, [1, 2]))
+        # using 'a' makes 'b' the least recently used entry
+        self.failUnless(cache.get('a', (1,)) != None)
+        cache.put('c', (1,), QueryResult({}, [1]))
+        self.failUnless(cache.get('b', (1,)) == None)
+        self.failUnless(cache.get('a', (1,)) != None)
+        self.failUnless(cache.get('c', (1,)) != None)
+        # results larger than the cache are not cached
+        cache.put('d', (1,), QueryResult({}, [1, 2, 3, 4, 5]))
+        self.failUnless(cache.get('d', (1,)) == None)
+
+def makeEvent(message):
+    event = Event(datetime.datetime.now(), 1)
+    event._values[u'message'] = (u'text', message)
+    event._values[u'host'] = (u'literal', u'localhost')
+    return event
+
+class TailSubscription_Tests(unittest.TestCase):
+
+    def test_get_events(self):
+        sub = TailSubscription(None, ('main',), None, EVID(10, 1), 10)
+        self.failIf(sub.covers(EVID(9, 1)))
+        self.failUnless(sub.covers(EVID(10, 1)))
+        # events at or before 'since' are not buffered
+        sub.addEvent(EVID(10, 1), makeEvent(u'a'))
+        sub.addEvent(EVID(13, 1), makeEvent(u'c'))
+        sub.addEvent(EVID(12, 1), makeEvent(u'b'))
+        events,fields = sub.getEvents(EVID(10, 1), 100)
+        self.failUnless([e[0] for e in events] == [(12, 1), (13, 1)])
+        self.failUnless([e[2] for e in events] == [u'b', u'c'])
+        self.failUnless(sorted(fields) == [u'host', u'message'])
+        events,fields = sub.getEvents(EVID(12, 1), 100)
+        self.failUnless([e[0] for e in events] == [(13, 1)])
+        events,fields = sub.getEvents(EVID(10, 1), 1)
+        self.failUnless([e[0] for e in events] == [(12, 1)])
+
+    def test_buffer_full(self):
+        sub = TailSubscription(None, ('main',), [u'message'], EVID(10, 1), 2)
+        for ts in (11, 12, 13):
+            sub.addEvent(EVID(ts, 1), makeEvent(u'x'))
+        # the oldest event was discarded, so polling before it must search
+        self.failIf(sub.covers(EVID(10, 1)))
+        self.failUnless(sub.covers(EVID(11, 1)))
+        events,fields = sub.getEvents(EVID(11, 1), 100)
+        self.failUnless([e[0] for e in events] == [(12, 1), (13, 1)])
+        self.failUnless(events[0][3] == {})
@@ -0,0 +1,44 @@
+import datetime
+from twisted.trial import unittest
+from terane.signals import Signal
+from terane.bier.event import Event, Contract
+from terane.inputs import ReceivedEvents
+
+def makeEvents(*messages):
+    contract = Contract().sign()
+    events = []
+    for message in messages:
+        event = Event(datetime.datetime.now(), 1)
+        event[contract.field_message] = message
+        events.append(event)
+    return ReceivedEvents(events)
+
+class Signal_Tests(unittest.TestCase):
+
+    def test_single_receiver(self):
+        signal = Signal()
+        received = []
+        signal.connectSignal().addCallback(received.append)
+        batch = makeEvents(u'a', u'b')
+        signal.emitSignal(batch)
+        # a single receiver is passed the result without copying it
+        self.failUnless(received == [batch])
+        # receivers must reconnect to receive the next signal
+        signal.emitSignal(makeEvents(u'c'))
+        self.failUnless(len(received) == 1)
+
+    def test_multiple_receivers(self):
+        signal = Signal()
+        received = []
+        def modify(result):
+            result.events.pop()
+            received.append(result)
+        signal.connectSignal().addCallback(modify)
+        signal.connectSignal().addCallback(modify)
+        batch = makeEvents(u'a', u'b')
+        signal.emitSignal(batch)
+        # each receiver gets its own copy, which it is free to modify
+        self.failUnless(len(received) == 2)
+        self.failIf(received[0] is received[1])
+        self.failIf(received[0].events[0] is received[1].events[0])
+        self.failUnless([len(r.events) for r in received] == [1, 1])